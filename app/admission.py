@@ -0,0 +1,209 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+from fastapi import HTTPException, status
+
+from .metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUED, ADMISSION_QUEUE_WAIT_SECONDS, ADMISSION_SHED
+
+
+@dataclass(frozen=True)
+class AdmissionConfig:
+    # Requests of this kind running at once in a worker.
+    concurrency: int
+    # Requests allowed to wait for a slot; beyond that they are shed.
+    max_queue: int
+    # Longest a pro request may wait. Other plans are shed once the
+    # expected wait passes `ADMISSION_FREE_WAIT_FRACTION` of it.
+    max_wait_seconds: float
+
+
+def _pool_config(pool: str, concurrency: int, max_queue: int, max_wait_seconds: float) -> AdmissionConfig:
+    prefix = f"ADMISSION_{pool.upper()}"
+    return AdmissionConfig(
+        concurrency=int(os.getenv(f"{prefix}_CONCURRENCY", str(concurrency))),
+        max_queue=int(os.getenv(f"{prefix}_MAX_QUEUE", str(max_queue))),
+        max_wait_seconds=float(os.getenv(f"{prefix}_MAX_WAIT_SECONDS", str(max_wait_seconds))),
+    )
+
+
+# Sync endpoints run on the framework's threadpool (40 threads by default);
+# together the pools should stay within it, so admitted requests never
+# queue again for a thread.
+AI_ADMISSION = _pool_config("ai", concurrency=8, max_queue=32, max_wait_seconds=10.0)
+BASIC_ADMISSION = _pool_config("basic", concurrency=28, max_queue=128, max_wait_seconds=2.0)
+UPLOAD_ADMISSION = _pool_config("upload", concurrency=2, max_queue=8, max_wait_seconds=30.0)
+
+ADMISSION_FREE_WAIT_FRACTION = float(os.getenv("ADMISSION_FREE_WAIT_FRACTION", "0.5"))
+
+# Lower is served first.
+PLAN_PRIORITY = {"pro": 0, "free": 1}
+_DEFAULT_PRIORITY = 1
+
+# Weight of the newest sample in the moving averages.
+_EWMA_ALPHA = 0.2
+
+
+class Shed(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    sequence: int
+    future: asyncio.Future = field(compare=False)
+
+
+class AdmissionPool:
+    """
+    Per-worker concurrency limit with a bounded priority queue. All state is
+    touched from the event loop only, so it needs no locks.
+    """
+
+    def __init__(self, name: str, cfg: AdmissionConfig):
+        self.name = name
+        self.cfg = cfg
+        self.active = 0
+        self._waiters: list[_Waiter] = []
+        self._sequence = itertools.count()
+        # Moving averages, in seconds: how long a request holds its slot and
+        # how long admitted requests waited for one.
+        self.service_seconds: float | None = None
+        self.queue_wait_seconds = 0.0
+
+        # Read from the metrics threads, so without pruning the heap.
+        ADMISSION_IN_FLIGHT.set_function(lambda: self.active, pool=name)
+        ADMISSION_QUEUED.set_function(
+            lambda: sum(1 for waiter in list(self._waiters) if not waiter.future.done()),
+            pool=name,
+        )
+
+    def _live_waiters(self) -> list[_Waiter]:
+        self._waiters = [waiter for waiter in self._waiters if not waiter.future.done()]
+        heapq.heapify(self._waiters)
+        return self._waiters
+
+    def expected_wait(self, ahead: int) -> float:
+        """Queue wait for a request with `ahead` live waiters in front of it."""
+        drained = (ahead + 1) * (self.service_seconds or 0.0) / self.cfg.concurrency
+        # The measured wait keeps the estimate honest when service times lag.
+        return max(drained, self.queue_wait_seconds)
+
+    def _max_wait(self, priority: int) -> float:
+        if priority == PLAN_PRIORITY["pro"]:
+            return self.cfg.max_wait_seconds
+        return self.cfg.max_wait_seconds * ADMISSION_FREE_WAIT_FRACTION
+
+    def _record_wait(self, waited: float) -> None:
+        self.queue_wait_seconds += _EWMA_ALPHA * (waited - self.queue_wait_seconds)
+
+    async def acquire(self, priority: int) -> None:
+        waiters = self._live_waiters()
+        if self.active < self.cfg.concurrency and not waiters:
+            self.active += 1
+            self._record_wait(0.0)
+            return
+
+        ahead = sum(1 for waiter in waiters if waiter.priority <= priority)
+        expected = self.expected_wait(ahead)
+        max_wait = self._max_wait(priority)
+        if expected > max_wait:
+            raise Shed("latency", expected)
+
+        if len(waiters) >= self.cfg.max_queue:
+            # A full queue makes room for a higher-priority request by
+            # shedding its newest lowest-priority waiter.
+            victim = max(waiters)
+            if victim.priority <= priority:
+                raise Shed("queue_full", expected)
+            victim.future.set_exception(Shed("displaced", self.expected_wait(len(waiters))))
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(priority, next(self._sequence), loop.create_future())
+        heapq.heappush(self._waiters, waiter)
+        timer = loop.call_later(max_wait, self._expire, waiter)
+        queued_at = time.monotonic()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            # The client went away; give back a slot handed over meanwhile.
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                self.release(0.0)
+            raise
+        finally:
+            timer.cancel()
+
+        self._record_wait(time.monotonic() - queued_at)
+
+    def _expire(self, waiter: _Waiter) -> None:
+        if not waiter.future.done():
+            waiter.future.set_exception(Shed("timeout", self.expected_wait(len(self._live_waiters()))))
+
+    def release(self, held_seconds: float) -> None:
+        if held_seconds > 0:
+            if self.service_seconds is None:
+                self.service_seconds = held_seconds
+            else:
+                self.service_seconds += _EWMA_ALPHA * (held_seconds - self.service_seconds)
+
+        # The slot passes straight to the next waiter.
+        while self._waiters:
+            waiter = heapq.heappop(self._waiters)
+            if not waiter.future.done():
+                waiter.future.set_result(None)
+                return
+        self.active -= 1
+
+
+POOLS = {
+    "ai": AdmissionPool("ai", AI_ADMISSION),
+    "basic": AdmissionPool("basic", BASIC_ADMISSION),
+    "upload": AdmissionPool("upload", UPLOAD_ADMISSION),
+}
+
+
+@asynccontextmanager
+async def admit(pool_name: str, plan: str | None = None):
+    """
+    Hold a slot of `pool_name` for the duration of the block. Requests that
+    would wait too long are refused up front with 503 and `Retry-After`
+    rather than piling up on the threadpool; `pro` callers are queued ahead
+    of everyone else.
+    """
+    pool = POOLS[pool_name]
+    plan_label = plan or "none"
+    started = time.monotonic()
+
+    try:
+        await pool.acquire(PLAN_PRIORITY.get(plan, _DEFAULT_PRIORITY))
+    except Shed as e:
+        ADMISSION_SHED.inc(pool=pool_name, plan=plan_label, reason=e.reason)
+        retry_after = max(1, math.ceil(e.retry_after))
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Server is busy. Try again in ~{retry_after}s.",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    admitted = time.monotonic()
+    ADMISSION_QUEUE_WAIT_SECONDS.observe(admitted - started, pool=pool_name, plan=plan_label)
+    try:
+        yield
+    finally:
+        pool.release(time.monotonic() - admitted)
+
+
+async def admit_upload():
+    """Dependency for dataset uploads."""
+    async with admit("upload"):
+        yield
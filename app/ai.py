@@ -1,13 +1,16 @@
 import json
 import os
 from openai import OpenAI
-import re
 from dataclasses import dataclass
 from typing import Protocol
 from urllib import request
 
+from .logs import get_logger
 from .models import AIEnhancement, TranslateRequest, TranslateResponse
-from .partner_catalog import impacted_partners_for_scopes
+from .partner_catalog import impacted_partners_for_workspace
+from .scope_index import SCOPE_PATTERN
+
+log = get_logger(__name__)
 
 
 PROMPT_TEMPLATE = """You are a release communication assistant.
@@ -34,7 +37,7 @@ class AIProvider(Protocol):
 
 
 def _extract_scopes(text: str) -> list[str]:
-    found = re.findall(r"\b[a-z][a-z0-9_-]*:[a-z0-9_.*-]+\b", text.lower())
+    found = SCOPE_PATTERN.findall(text.lower())
     seen = set()
     ordered: list[str] = []
     for scope in found:
@@ -52,7 +55,7 @@ class MockAIProvider:
         raw = req.raw_text
         lower = raw.lower()
         scopes = _extract_scopes(raw)
-        impacted_partners = impacted_partners_for_scopes(scopes)
+        impacted_partners = impacted_partners_for_workspace(req.workspace_id, scopes)
 
         oauth_context = any(token in lower for token in ["oauth", "token", "sso", "auth"])
 
@@ -119,6 +122,7 @@ class OpenAIProvider:
         self.model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
         self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         self.prompt_version = "v1"
+        self.last_usage: dict | None = None
 
     def enhance(self, req: TranslateRequest, base: TranslateResponse) -> AIEnhancement:
         prompt = self._build_prompt(req, base)
@@ -128,8 +132,17 @@ class OpenAIProvider:
             input=prompt,
         )
 
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.last_usage = {
+                "input_tokens": getattr(usage, "input_tokens", None),
+                "output_tokens": getattr(usage, "output_tokens", None),
+                "total_tokens": getattr(usage, "total_tokens", None),
+            }
+
         content = response.output[0].content[0].text
-        print("[AI RAW CONTENT]", content)
+        # The content echoes customer changelog text, so only its size is logged.
+        log.debug("ai.response", provider=self.name, model=self.model, content_chars=len(content))
 
         enhancement = AIEnhancement.model_validate_json(content)
 
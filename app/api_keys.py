@@ -0,0 +1,223 @@
+import hashlib
+import os
+import secrets
+import select
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from app.db import get_db_connection
+from app.logs import get_logger
+from app.metrics import CACHE_ENTRIES, record_cache_lookup
+
+log = get_logger(__name__)
+
+NOTIFY_CHANNEL = "api_keys_changed"
+
+API_KEY_PREFIX = "ctk_"
+# `generate_api_key`: the prefix and 32 random bytes in unpadded base64url.
+API_KEY_LENGTH = len(API_KEY_PREFIX) + 43
+
+API_KEY_CACHE_SIZE = int(os.getenv("API_KEY_CACHE_SIZE", "10000"))
+# Revocations are pushed to every worker; the TTL is a safety net for a
+# missed notification.
+API_KEY_CACHE_TTL_SECONDS = float(os.getenv("API_KEY_CACHE_TTL_SECONDS", "60"))
+# Unknown keys are remembered briefly so guessing does not hit the database.
+API_KEY_NEGATIVE_TTL_SECONDS = float(os.getenv("API_KEY_NEGATIVE_TTL_SECONDS", "10"))
+
+
+@dataclass(frozen=True)
+class StoredApiKey:
+    id: int
+    workspace_id: int
+    plan: str
+
+
+@dataclass
+class _CacheEntry:
+    key: StoredApiKey | None
+    expires_at: float
+
+
+# key hash -> entry, least recently used first.
+_CACHE: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+_LOCK = threading.Lock()
+CACHE_ENTRIES.set_function(lambda: len(_CACHE), cache="api_keys")
+# Bumped by every invalidation, so a lookup that raced with one does not
+# cache what it read.
+_GENERATION = 0
+_LISTENER_STARTED = False
+
+
+class ApiKeyStoreUnavailable(Exception):
+    pass
+
+
+def hash_api_key(raw_key: str) -> str:
+    # Keys are 256-bit random tokens, so a fast unsalted hash is enough and
+    # keeps lookups indexable.
+    return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
+
+def generate_api_key() -> str:
+    return API_KEY_PREFIX + secrets.token_urlsafe(32)
+
+
+# Applied by `python -m app.maintenance migrate`.
+API_KEYS_DDL = """
+    CREATE TABLE IF NOT EXISTS api_keys (
+        id SERIAL PRIMARY KEY,
+        workspace_id INTEGER NOT NULL,
+        name TEXT,
+        plan TEXT NOT NULL DEFAULT 'free',
+        key_hash TEXT NOT NULL UNIQUE,
+        key_prefix TEXT NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        revoked_at TIMESTAMPTZ
+    );
+"""
+
+# Built with CREATE INDEX CONCURRENTLY by `python -m app.maintenance migrate`.
+API_KEYS_INDEXES = {
+    "api_keys_workspace_id_idx": "(workspace_id, id)",
+}
+
+
+def _load_api_key(key_hash: str) -> StoredApiKey | None:
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT k.id, k.workspace_id, w.plan
+            FROM api_keys k
+            JOIN workspaces w ON w.id = k.workspace_id
+            WHERE k.key_hash = %s AND k.revoked_at IS NULL;
+            """,
+            (key_hash,),
+        )
+        row = cur.fetchone()
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+    if row is None:
+        return None
+    return StoredApiKey(id=row["id"], workspace_id=row["workspace_id"], plan=row["plan"])
+
+
+def lookup_api_key(raw_key: str) -> StoredApiKey | None:
+    """
+    Resolve an API key through the in-process cache. Hits (including
+    remembered misses) never touch the database. If the database is down,
+    a known key whose entry has expired is still accepted; anything else
+    raises `ApiKeyStoreUnavailable`. Strings that cannot be a generated key
+    are refused without a lookup.
+    """
+    if len(raw_key) != API_KEY_LENGTH or not raw_key.startswith(API_KEY_PREFIX):
+        return None
+
+    _ensure_listener()
+
+    key_hash = hash_api_key(raw_key)
+    now = time.monotonic()
+    with _LOCK:
+        cached = _CACHE.get(key_hash)
+        if cached is not None and cached.expires_at > now:
+            _CACHE.move_to_end(key_hash)
+            record_cache_lookup("api_keys", True)
+            return cached.key
+        generation = _GENERATION
+
+    record_cache_lookup("api_keys", False)
+
+    try:
+        loaded = _load_api_key(key_hash)
+    except Exception as e:
+        if cached is not None and cached.key is not None:
+            return cached.key
+        raise ApiKeyStoreUnavailable(str(e)) from e
+
+    ttl = API_KEY_CACHE_TTL_SECONDS if loaded is not None else API_KEY_NEGATIVE_TTL_SECONDS
+    with _LOCK:
+        if _GENERATION == generation:
+            _CACHE[key_hash] = _CacheEntry(key=loaded, expires_at=now + ttl)
+            _CACHE.move_to_end(key_hash)
+            while len(_CACHE) > API_KEY_CACHE_SIZE:
+                _CACHE.popitem(last=False)
+
+    return loaded
+
+
+def invalidate_api_key(key_hash: str) -> None:
+    global _GENERATION
+
+    with _LOCK:
+        _GENERATION += 1
+        _CACHE.pop(key_hash, None)
+
+
+def clear_api_key_cache() -> None:
+    global _GENERATION
+
+    with _LOCK:
+        _GENERATION += 1
+        _CACHE.clear()
+
+
+def notify_api_key_changed(cur, key_hash: str) -> None:
+    """
+    Queue a cache invalidation inside the caller's transaction; every
+    listening worker drops the key once the transaction commits.
+    """
+    cur.execute("SELECT pg_notify(%s, %s);", (NOTIFY_CHANNEL, key_hash))
+
+
+def _ensure_listener() -> None:
+    global _LISTENER_STARTED
+
+    with _LOCK:
+        if _LISTENER_STARTED:
+            return
+        _LISTENER_STARTED = True
+
+    threading.Thread(
+        target=_listen_for_changes,
+        name="api-key-listener",
+        daemon=True,
+    ).start()
+
+
+def _listen_for_changes() -> None:
+    while True:
+        conn = None
+        try:
+            conn = get_db_connection()
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {NOTIFY_CHANNEL};")
+
+            # Revocations sent while disconnected are lost.
+            clear_api_key_cache()
+
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    invalidate_api_key(conn.notifies.pop(0).payload)
+
+        except Exception as e:
+            log.warning("api_keys.listener_failed", error=f"{type(e).__name__}: {e}")
+            time.sleep(5)
+
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
@@ -0,0 +1,147 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+
+from app.api_keys import (
+    generate_api_key,
+    hash_api_key,
+    invalidate_api_key,
+    notify_api_key_changed,
+)
+from app.db import get_db_connection
+from app.sessions import SessionClaims, authorize_workspace, require_session
+
+router = APIRouter(prefix="/api-keys", tags=["api-keys"])
+
+# Shown in listings so owners can tell keys apart.
+KEY_PREFIX_LENGTH = 12
+
+
+class CreateApiKeyRequest(BaseModel):
+    workspace_id: int
+    name: Optional[str] = None
+
+
+@router.post("/create")
+def create_api_key(req: CreateApiKeyRequest, session: SessionClaims = Depends(require_session)):
+    authorize_workspace(session, req.workspace_id)
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        api_key = generate_api_key()
+        key_hash = hash_api_key(api_key)
+
+        # The plan is the workspace's; callers cannot choose it.
+        cur.execute(
+            """
+            INSERT INTO api_keys (workspace_id, name, plan, key_hash, key_prefix)
+            SELECT w.id, %s, w.plan, %s, %s
+            FROM workspaces w
+            WHERE w.id = %s
+            RETURNING id, workspace_id, name, plan, key_prefix, created_at;
+            """,
+            (req.name, key_hash, api_key[:KEY_PREFIX_LENGTH], req.workspace_id),
+        )
+        row = cur.fetchone()
+
+        if not row:
+            conn.rollback()
+            raise HTTPException(status_code=404, detail="Workspace not found")
+
+        # Workers may have cached this key as unknown.
+        notify_api_key_changed(cur, key_hash)
+        conn.commit()
+        invalidate_api_key(key_hash)
+
+        # The raw key is only ever returned here.
+        return {"success": True, "api_key": api_key, "key": row}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    finally:
+        cur.close()
+        conn.close()
+
+
+@router.get("/list/{workspace_id}")
+def list_api_keys(workspace_id: int, session: SessionClaims = Depends(require_session)):
+    authorize_workspace(session, workspace_id)
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        cur.execute(
+            """
+            SELECT id, workspace_id, name, plan, key_prefix, created_at, revoked_at
+            FROM api_keys
+            WHERE workspace_id = %s
+            ORDER BY id;
+            """,
+            (workspace_id,),
+        )
+        keys = cur.fetchall()
+        conn.commit()
+
+        return {"success": True, "keys": keys}
+
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    finally:
+        cur.close()
+        conn.close()
+
+
+@router.post("/revoke/{key_id}")
+def revoke_api_key(key_id: int, session: SessionClaims = Depends(require_session)):
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        cur.execute(
+            """
+            UPDATE api_keys
+            SET revoked_at = NOW()
+            WHERE id = %s AND revoked_at IS NULL
+            RETURNING workspace_id, key_hash;
+            """,
+            (key_id,),
+        )
+        row = cur.fetchone()
+
+        if not row:
+            conn.rollback()
+            raise HTTPException(status_code=404, detail="Active API key not found")
+
+        # Keys are addressed by id; undo the revocation if the caller may
+        # not touch that workspace.
+        try:
+            authorize_workspace(session, row["workspace_id"])
+        except HTTPException:
+            conn.rollback()
+            raise
+
+        notify_api_key_changed(cur, row["key_hash"])
+        conn.commit()
+        invalidate_api_key(row["key_hash"])
+
+        return {"success": True}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    finally:
+        cur.close()
+        conn.close()
@@ -0,0 +1,139 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.db import get_db_connection
+from app.metrics import CACHE_ENTRIES, record_cache_lookup
+from app.sessions import app_session_id, is_session_revoked
+
+APP_TOKEN_TTL_SECONDS = int(os.getenv("APP_TOKEN_TTL_SECONDS", "900"))
+
+APP_CREDENTIAL_CACHE_SIZE = int(os.getenv("APP_CREDENTIAL_CACHE_SIZE", "10000"))
+APP_CREDENTIAL_CACHE_TTL_SECONDS = float(os.getenv("APP_CREDENTIAL_CACHE_TTL_SECONDS", "300"))
+# Wrong secrets are remembered briefly so retries do not hit the database.
+APP_CREDENTIAL_NEGATIVE_TTL_SECONDS = float(os.getenv("APP_CREDENTIAL_NEGATIVE_TTL_SECONDS", "10"))
+
+# Cache keys hold a fingerprint under this per-process key rather than the
+# secret or its stored hash, so a memory dump reveals neither.
+_FINGERPRINT_KEY = secrets.token_bytes(32)
+
+
+@dataclass(frozen=True)
+class VerifiedApp:
+    app_id: int
+    workspace_id: int
+    secret_version: int
+
+
+@dataclass
+class _CacheEntry:
+    app: VerifiedApp | None
+    expires_at: float
+
+
+# (client_id, secret fingerprint) -> entry, least recently used first.
+_CACHE: "OrderedDict[tuple[str, bytes], _CacheEntry]" = OrderedDict()
+_LOCK = threading.Lock()
+CACHE_ENTRIES.set_function(lambda: len(_CACHE), cache="app_credentials")
+
+
+def hash_client_secret(client_secret: str) -> str:
+    # Secrets are 192-bit random tokens, so a fast hash is enough.
+    return hashlib.sha256(client_secret.encode("utf-8")).hexdigest()
+
+
+def generate_client_secret() -> str:
+    return secrets.token_hex(24)
+
+
+# Columns added when secrets moved to hashes. Applied by
+# `python -m app.maintenance migrate` together with the one-way hashing of
+# older plaintext secrets; requests assume both are in place.
+APPS_DDL = """
+    ALTER TABLE apps ADD COLUMN IF NOT EXISTS client_secret_hash TEXT;
+    ALTER TABLE apps ADD COLUMN IF NOT EXISTS secret_version INTEGER NOT NULL DEFAULT 1;
+    ALTER TABLE apps ALTER COLUMN client_secret DROP NOT NULL;
+"""
+
+
+def _fingerprint(client_id: str, client_secret: str) -> bytes:
+    return hmac.new(_FINGERPRINT_KEY, f"{client_id}\0{client_secret}".encode("utf-8"), hashlib.sha256).digest()
+
+
+def _load_app(client_id: str) -> dict | None:
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT id, workspace_id, client_secret_hash, secret_version
+            FROM apps
+            WHERE client_id = %s;
+            """,
+            (client_id,),
+        )
+        row = cur.fetchone()
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+    return row
+
+
+def verify_client_credentials(client_id: str, client_secret: str) -> VerifiedApp | None:
+    """
+    Check a client_id/client_secret pair. Repeated checks of the same pair
+    are answered from memory; rotating the secret revokes the cached
+    verification on every worker through the session revocation list.
+    """
+    cache_key = (client_id, _fingerprint(client_id, client_secret))
+    now = time.monotonic()
+
+    with _LOCK:
+        cached = _CACHE.get(cache_key)
+        if cached is not None and cached.expires_at > now:
+            _CACHE.move_to_end(cache_key)
+        else:
+            cached = None
+
+    if cached is not None:
+        app = cached.app
+        if app is None or not is_session_revoked(app_session_id(app.app_id, app.secret_version)):
+            record_cache_lookup("app_credentials", True)
+            return app
+
+    record_cache_lookup("app_credentials", False)
+    row = _load_app(client_id)
+    app = None
+    if row is not None and row["client_secret_hash"] and hmac.compare_digest(
+        hash_client_secret(client_secret), row["client_secret_hash"]
+    ):
+        app = VerifiedApp(app_id=row["id"], workspace_id=row["workspace_id"], secret_version=row["secret_version"])
+
+    ttl = APP_CREDENTIAL_CACHE_TTL_SECONDS if app is not None else APP_CREDENTIAL_NEGATIVE_TTL_SECONDS
+    with _LOCK:
+        _CACHE[cache_key] = _CacheEntry(app=app, expires_at=now + ttl)
+        _CACHE.move_to_end(cache_key)
+        while len(_CACHE) > APP_CREDENTIAL_CACHE_SIZE:
+            _CACHE.popitem(last=False)
+
+    return app
+
+
+def forget_client(client_id: str) -> None:
+    """Drop this worker's cached verifications for `client_id`."""
+    with _LOCK:
+        for cache_key in [key for key in _CACHE if key[0] == client_id]:
+            del _CACHE[cache_key]
+
+
+def revocation_ttl_seconds() -> float:
+    # A revoked secret version must stay on the list while tokens or cache
+    # entries for it may still exist.
+    return max(APP_TOKEN_TTL_SECONDS, APP_CREDENTIAL_CACHE_TTL_SECONDS)
@@ -1,7 +1,25 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, Form, Header, HTTPException
 from pydantic import BaseModel
 from typing import Optional
+from app.app_credentials import (
+    APP_TOKEN_TTL_SECONDS,
+    forget_client,
+    generate_client_secret,
+    hash_client_secret,
+    revocation_ttl_seconds,
+    verify_client_credentials,
+)
 from app.db import get_db_connection
+from app.sessions import (
+    SessionClaims,
+    app_session_id,
+    authorize_workspace,
+    issue_app_token,
+    optional_session,
+    queue_session_revocation,
+    remember_revoked_session,
+)
+import base64
 import secrets
 
 router = APIRouter(prefix="/apps", tags=["apps"])
@@ -24,12 +42,20 @@ def generate_client_id():
     return "cli_" + secrets.token_hex(8)
 
 
-def generate_client_secret():
-    return secrets.token_hex(24)
+def _authorize_app_change(conn, session: Optional[SessionClaims], workspace_id: int) -> None:
+    # Apps are addressed by id, so the workspace is only known once the
+    # statement has run; undo it if the caller may not touch that workspace.
+    try:
+        authorize_workspace(session, workspace_id)
+    except HTTPException:
+        conn.rollback()
+        raise
 
 
 @router.post("/create")
-def create_app(req: CreateAppRequest):
+def create_app(req: CreateAppRequest, session: Optional[SessionClaims] = Depends(optional_session)):
+    authorize_workspace(session, req.workspace_id)
+
     conn = get_db_connection()
     cur = conn.cursor()
 
@@ -37,8 +63,9 @@ def create_app(req: CreateAppRequest):
         client_id = generate_client_id()
         client_secret = generate_client_secret()
 
+        # Only the hash is stored; the secret is returned this once.
         cur.execute("""
-            INSERT INTO apps (workspace_id, name, description, status, client_id, client_secret, redirect_uri)
+            INSERT INTO apps (workspace_id, name, description, status, client_id, client_secret_hash, redirect_uri)
             VALUES (%s, %s, %s, %s, %s, %s, %s)
             RETURNING id;
         """, (
@@ -47,7 +74,7 @@ def create_app(req: CreateAppRequest):
             req.description,
             "sandbox",
             client_id,
-            client_secret,
+            hash_client_secret(client_secret),
             req.redirect_uri
         ))
 
@@ -77,13 +104,15 @@ def create_app(req: CreateAppRequest):
 
 
 @router.get("/list/{workspace_id}")
-def list_apps(workspace_id: int):
+def list_apps(workspace_id: int, session: Optional[SessionClaims] = Depends(optional_session)):
+    authorize_workspace(session, workspace_id)
+
     conn = get_db_connection()
     cur = conn.cursor()
 
     try:
         cur.execute("""
-            SELECT id, name, description, status, client_id, client_secret, redirect_uri
+            SELECT id, name, description, status, client_id, redirect_uri
             FROM apps
             WHERE workspace_id = %s
             ORDER BY created_at DESC;
@@ -105,7 +134,7 @@ def list_apps(workspace_id: int):
 
 
 @router.put("/update/{app_id}")
-def update_app(app_id: int, req: UpdateAppRequest):
+def update_app(app_id: int, req: UpdateAppRequest, session: Optional[SessionClaims] = Depends(optional_session)):
     conn = get_db_connection()
     cur = conn.cursor()
 
@@ -116,7 +145,7 @@ def update_app(app_id: int, req: UpdateAppRequest):
                 description = %s,
                 redirect_uri = %s
             WHERE id = %s
-            RETURNING id, name, description, status, client_id, client_secret, redirect_uri;
+            RETURNING id, workspace_id, name, description, status, client_id, redirect_uri;
         """, (
             req.name,
             req.description,
@@ -130,6 +159,7 @@ def update_app(app_id: int, req: UpdateAppRequest):
             conn.rollback()
             raise HTTPException(status_code=404, detail="App not found")
 
+        _authorize_app_change(conn, session, result.pop("workspace_id"))
         conn.commit()
 
         return {
@@ -149,7 +179,7 @@ def update_app(app_id: int, req: UpdateAppRequest):
 
 
 @router.delete("/delete/{app_id}")
-def delete_app(app_id: int):
+def delete_app(app_id: int, session: Optional[SessionClaims] = Depends(optional_session)):
     conn = get_db_connection()
     cur = conn.cursor()
 
@@ -157,7 +187,7 @@ def delete_app(app_id: int):
         cur.execute("""
             DELETE FROM apps
             WHERE id = %s
-            RETURNING id;
+            RETURNING id, workspace_id, client_id, secret_version;
         """, (app_id,))
 
         result = cur.fetchone()
@@ -166,8 +196,17 @@ def delete_app(app_id: int):
             conn.rollback()
             raise HTTPException(status_code=404, detail="App not found")
 
+        _authorize_app_change(conn, session, result["workspace_id"])
+
+        # Ends the app's outstanding tokens and cached verifications on
+        # every worker once this commits.
+        revoked_session_id = app_session_id(app_id, result["secret_version"])
+        revoked_until = queue_session_revocation(cur, revoked_session_id, revocation_ttl_seconds())
         conn.commit()
 
+        remember_revoked_session(revoked_session_id, revoked_until)
+        forget_client(result["client_id"])
+
         return {"success": True}
 
     except HTTPException:
@@ -178,4 +217,103 @@ def delete_app(app_id: int):
 
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+@router.post("/rotate-secret/{app_id}")
+def rotate_app_secret(app_id: int, session: Optional[SessionClaims] = Depends(optional_session)):
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        client_secret = generate_client_secret()
+        cur.execute("""
+            UPDATE apps
+            SET client_secret_hash = %s,
+                secret_version = secret_version + 1
+            WHERE id = %s
+            RETURNING id, workspace_id, client_id, secret_version;
+        """, (hash_client_secret(client_secret), app_id))
+
+        result = cur.fetchone()
+
+        if not result:
+            conn.rollback()
+            raise HTTPException(status_code=404, detail="App not found")
+
+        _authorize_app_change(conn, session, result["workspace_id"])
+
+        # Ends tokens and cached verifications of the previous secret on
+        # every worker once this commits.
+        revoked_session_id = app_session_id(app_id, result["secret_version"] - 1)
+        revoked_until = queue_session_revocation(cur, revoked_session_id, revocation_ttl_seconds())
+        conn.commit()
+
+        remember_revoked_session(revoked_session_id, revoked_until)
+        forget_client(result["client_id"])
+
+        return {
+            "success": True,
+            "client_id": result["client_id"],
+            "client_secret": client_secret,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _basic_credentials(authorization: Optional[str]) -> tuple[Optional[str], Optional[str]]:
+    scheme, _, encoded = (authorization or "").partition(" ")
+    if scheme.lower() != "basic":
+        return None, None
+    try:
+        client_id, _, client_secret = base64.b64decode(encoded.strip()).decode("utf-8").partition(":")
+    except ValueError:
+        # Not base64, non-ASCII input or not UTF-8 underneath.
+        raise HTTPException(
+            status_code=401,
+            detail="invalid_client",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+    return client_id, client_secret
+
+
+@router.post("/token")
+def issue_token(
+    grant_type: str = Form(...),
+    client_id: Optional[str] = Form(None),
+    client_secret: Optional[str] = Form(None),
+    authorization: Optional[str] = Header(default=None, alias="Authorization"),
+):
+    """
+    OAuth2 client-credentials grant. Credentials come as form fields or HTTP
+    Basic auth; the returned bearer token is accepted by workspace-scoped
+    endpoints for the app's workspace.
+    """
+    if grant_type != "client_credentials":
+        raise HTTPException(status_code=400, detail="unsupported_grant_type")
+
+    if not client_id or not client_secret:
+        client_id, client_secret = _basic_credentials(authorization)
+    if not client_id or not client_secret:
+        raise HTTPException(status_code=400, detail="client_id and client_secret required")
+
+    try:
+        app = verify_client_credentials(client_id, client_secret)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if app is None:
+        raise HTTPException(
+            status_code=401,
+            detail="invalid_client",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+
+    return issue_app_token(app.app_id, app.workspace_id, app.secret_version, APP_TOKEN_TTL_SECONDS)
@@ -5,6 +5,8 @@ from pathlib import Path
 from dotenv import load_dotenv
 from fastapi import Header, HTTPException, status
 
+from .api_keys import ApiKeyStoreUnavailable, lookup_api_key
+
 ENV_PATH = Path(__file__).resolve().parents[1] / ".env"  # project-root/.env
 load_dotenv(dotenv_path=ENV_PATH)
 
@@ -14,6 +16,9 @@ load_dotenv(dotenv_path=ENV_PATH)
 class ApiCaller:
     api_key: str
     plan: str  # "free" or "pro"
+    # Set for keys stored in `api_keys`; env keys belong to no workspace.
+    workspace_id: int | None = None
+    key_id: int | None = None
 
 
 def _parse_keys(env_value: str | None) -> Set[str]:
@@ -25,9 +30,6 @@ def _parse_keys(env_value: str | None) -> Set[str]:
 FREE_KEYS = _parse_keys(os.getenv("FREE_API_KEYS"))
 PRO_KEYS = _parse_keys(os.getenv("PRO_API_KEYS"))
 
-#print("DEBUG FREE_KEYS =", FREE_KEYS)
-#print("DEBUG PRO_KEYS  =", PRO_KEYS)
-
 
 def require_api_key(x_api_key: str | None = Header(default=None, alias="X-API-Key")) -> ApiCaller:
     if not x_api_key:
@@ -42,6 +44,22 @@ def require_api_key(x_api_key: str | None = Header(default=None, alias="X-API-Ke
     if x_api_key in FREE_KEYS:
         return ApiCaller(api_key=x_api_key, plan="free")
 
+    try:
+        stored = lookup_api_key(x_api_key)
+    except ApiKeyStoreUnavailable:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="API key store unavailable",
+        )
+
+    if stored is not None:
+        return ApiCaller(
+            api_key=x_api_key,
+            plan=stored.plan,
+            workspace_id=stored.workspace_id,
+            key_id=stored.id,
+        )
+
     raise HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid API key",
@@ -0,0 +1,243 @@
+import bisect
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Iterable
+
+from .scope_index import WILDCARD, normalize_scope, scope_segments
+
+# Binary layout (little-endian), all sections fixed-width except the
+# trailing string blob:
+#
+#   header         magic, format version, source sha256/mtime/size, counts
+#   partner table  partner_count x (name_offset u32, name_length u32)
+#   scope table    scope_count x (key_offset, key_length, exact_offset,
+#                  exact_count, wildcard_offset, wildcard_count) u32 each,
+#                  sorted by key bytes
+#   postings       posting_count x u32 partner positions
+#   strings        UTF-8 partner names and scope keys
+#
+# A scope key is the scope's segments joined by KEY_SEPARATOR, so every
+# scope below a prefix sorts into one contiguous run of the scope table.
+MAGIC = b"PCIX"
+FORMAT_VERSION = 1
+KEY_SEPARATOR = b"\x1f"
+_KEY_SEPARATOR_END = b"\x20"
+
+_HEADER = struct.Struct("<4sHH32sqqIIIII")
+_PARTNER = struct.Struct("<II")
+_SCOPE = struct.Struct("<IIIIII")
+_POSTING = struct.Struct("<I")
+
+
+def _scope_key(segments: list[str]) -> bytes:
+    return KEY_SEPARATOR.join(segment.encode("utf-8") for segment in segments)
+
+
+def compile_catalog_index(
+    partners: list[dict],
+    target: Path,
+    source_sha256: bytes,
+    source_mtime_ns: int,
+    source_size: int,
+) -> None:
+    """
+    Write the binary index for `partners` to `target`. The file is written
+    next to the target, fsynced and renamed into place, so readers only
+    ever map a complete index.
+    """
+    started = time.perf_counter()
+
+    exact: dict[bytes, list[int]] = {}
+    wildcard: dict[bytes, list[int]] = {}
+
+    for position, partner in enumerate(partners):
+        seen: set[str] = set()
+        for scope in partner.get("scopes", []):
+            normalized = normalize_scope(scope)
+            if not normalized or normalized in seen:
+                continue
+            seen.add(normalized)
+
+            segments = scope_segments(normalized)
+            if not segments:
+                continue
+            if segments[-1] == WILDCARD:
+                wildcard.setdefault(_scope_key(segments[:-1]), []).append(position)
+            else:
+                exact.setdefault(_scope_key(segments), []).append(position)
+
+    keys = sorted(set(exact) | set(wildcard))
+
+    strings = bytearray()
+    partner_table = bytearray()
+    for partner in partners:
+        name = str(partner.get("name", "Unknown Partner")).encode("utf-8")
+        partner_table += _PARTNER.pack(len(strings), len(name))
+        strings += name
+
+    scope_table = bytearray()
+    postings = bytearray()
+    posting_count = 0
+    for key in keys:
+        key_offset = len(strings)
+        strings += key
+
+        entry = [key_offset, len(key)]
+        for positions in (exact.get(key, []), wildcard.get(key, [])):
+            entry.extend((posting_count, len(positions)))
+            for position in positions:
+                postings += _POSTING.pack(position)
+            posting_count += len(positions)
+        scope_table += _SCOPE.pack(*entry)
+
+    build_us = int((time.perf_counter() - started) * 1_000_000)
+    header = _HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        0,
+        source_sha256,
+        source_mtime_ns,
+        source_size,
+        len(partners),
+        len(keys),
+        posting_count,
+        min(build_us, 0xFFFFFFFF),
+        len(exact) + len(wildcard),
+    )
+
+    tmp_target = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    # Left over by a crashed worker that had the same pid.
+    tmp_target.unlink(missing_ok=True)
+    try:
+        # O_EXCL: never write through a file or symlink someone else created.
+        with os.fdopen(os.open(tmp_target, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644), "wb") as f:
+            f.write(header)
+            f.write(partner_table)
+            f.write(scope_table)
+            f.write(postings)
+            f.write(strings)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_target, target)
+    finally:
+        if tmp_target.exists():
+            tmp_target.unlink()
+
+
+class CatalogIndex:
+    """
+    Read-only view over a compiled catalog index file.
+
+    The file is memory-mapped, so every worker on a host shares one copy
+    through the page cache and opening it costs the same regardless of
+    catalog size. Lookups binary-search the sorted scope table and follow
+    the same hierarchical rules as `ScopeIndex`.
+    """
+
+    def __init__(self, path: Path):
+        with path.open("rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (
+            magic,
+            format_version,
+            _,
+            self.source_sha256,
+            self.source_mtime_ns,
+            self.source_size,
+            self.entry_count,
+            self.scope_count,
+            self.posting_count,
+            build_us,
+            self.distinct_scope_count,
+        ) = _HEADER.unpack_from(self._map, 0)
+
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a catalog index (format {FORMAT_VERSION})")
+
+        self.path = path
+        self.build_ms = build_us / 1000
+        self._partners_offset = _HEADER.size
+        self._scopes_offset = self._partners_offset + self.entry_count * _PARTNER.size
+        self._postings_offset = self._scopes_offset + self.scope_count * _SCOPE.size
+        self._strings_offset = self._postings_offset + self.posting_count * _POSTING.size
+
+    def _scope(self, index: int) -> tuple[int, int, int, int, int, int]:
+        return _SCOPE.unpack_from(self._map, self._scopes_offset + index * _SCOPE.size)
+
+    def _key(self, index: int) -> bytes:
+        key_offset, key_length, *_ = self._scope(index)
+        start = self._strings_offset + key_offset
+        return self._map[start:start + key_length]
+
+    def _bisect(self, key: bytes) -> int:
+        return bisect.bisect_left(range(self.scope_count), key, key=self._key)
+
+    def _find(self, key: bytes) -> int | None:
+        index = self._bisect(key)
+        if index < self.scope_count and self._key(index) == key:
+            return index
+        return None
+
+    def _postings(self, offset: int, count: int) -> tuple[int, ...]:
+        if not count:
+            return ()
+        return struct.unpack_from(f"<{count}I", self._map, self._postings_offset + offset * _POSTING.size)
+
+    def lookup(self, scopes: Iterable[str]) -> list[int]:
+        matched: set[int] = set()
+
+        for scope in scopes:
+            segments = scope_segments(scope)
+            if not segments:
+                continue
+
+            is_wildcard = segments[-1] == WILDCARD
+            if is_wildcard:
+                segments = segments[:-1]
+
+            # Entry wildcards on the queried scope or any of its ancestors
+            # cover it.
+            for depth in range(1, len(segments) + 1):
+                index = self._find(_scope_key(segments[:depth]))
+                if index is not None:
+                    _, _, _, _, wildcard_offset, wildcard_count = self._scope(index)
+                    matched.update(self._postings(wildcard_offset, wildcard_count))
+
+            if is_wildcard:
+                # Everything strictly below the queried prefix.
+                if segments:
+                    prefix = _scope_key(segments)
+                    start = self._bisect(prefix + KEY_SEPARATOR)
+                    end = self._bisect(prefix + _KEY_SEPARATOR_END)
+                else:
+                    start, end = 0, self.scope_count
+                for index in range(start, end):
+                    _, _, exact_offset, exact_count, wildcard_offset, wildcard_count = self._scope(index)
+                    matched.update(self._postings(exact_offset, exact_count))
+                    matched.update(self._postings(wildcard_offset, wildcard_count))
+            else:
+                index = self._find(_scope_key(segments))
+                if index is not None:
+                    _, _, exact_offset, exact_count, _, _ = self._scope(index)
+                    matched.update(self._postings(exact_offset, exact_count))
+
+        return sorted(matched)
+
+    def partner_name(self, position: int) -> str:
+        name_offset, name_length = _PARTNER.unpack_from(self._map, self._partners_offset + position * _PARTNER.size)
+        start = self._strings_offset + name_offset
+        return self._map[start:start + name_length].decode("utf-8")
+
+    def stats(self) -> dict:
+        return {
+            "entries": self.entry_count,
+            "scopes": self.distinct_scope_count,
+            "postings": self.posting_count,
+            "build_ms": round(self.build_ms, 3),
+            "index_bytes": len(self._map),
+            "source_sha256": self.source_sha256.hex(),
+        }
@@ -1,32 +1,165 @@
 import os
+import time
+import hashlib
+import zlib
 import psycopg2
 import json
+import threading
+from datetime import timezone
 from dotenv import load_dotenv
+from psycopg2.extensions import connection as _PgConnection
+from psycopg2 import sql
 from psycopg2.extras import RealDictCursor
 
+from app.metrics import DB_CONNECT_SECONDS, DB_CONNECTIONS, DB_CONNECTIONS_OPEN, TRANSLATE_STAGE_SECONDS
+
 
 load_dotenv()
 
+_OPEN_CONNECTIONS = 0
+_OPEN_CONNECTIONS_LOCK = threading.Lock()
+
+
+def _count_open_connections(delta: int) -> None:
+    global _OPEN_CONNECTIONS
+    with _OPEN_CONNECTIONS_LOCK:
+        _OPEN_CONNECTIONS += delta
+
+
+DB_CONNECTIONS_OPEN.set_function(lambda: _OPEN_CONNECTIONS)
+
+
+class _CountedConnection(_PgConnection):
+    def close(self):
+        if not self.closed:
+            _count_open_connections(-1)
+        super().close()
+
+
 def get_db_connection():
-    return psycopg2.connect(
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT"),
-        dbname=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        cursor_factory=RealDictCursor
-    )
+    started = time.perf_counter()
+    try:
+        conn = psycopg2.connect(
+            host=os.getenv("DB_HOST"),
+            port=os.getenv("DB_PORT"),
+            dbname=os.getenv("DB_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            cursor_factory=RealDictCursor,
+            connection_factory=_CountedConnection,
+        )
+    except Exception:
+        DB_CONNECTIONS.inc(outcome="error")
+        raise
+
+    DB_CONNECT_SECONDS.observe(time.perf_counter() - started)
+    DB_CONNECTIONS.inc(outcome="opened")
+    _count_open_connections(1)
+    return conn
+
+ROLLUP_GRANULARITIES = ("hour", "day")
+
+# Tables and columns added since `translation_runs` was created. Catalog-only
+# changes; applied by `python -m app.maintenance migrate`, never by requests.
+TRANSLATION_RUNS_DDL = """
+    CREATE TABLE IF NOT EXISTS translation_run_rollups (
+        granularity TEXT NOT NULL,
+        bucket_start TIMESTAMP NOT NULL,
+        mode TEXT NOT NULL,
+        plan TEXT NOT NULL,
+        impact_level TEXT NOT NULL,
+        ai_fallback_used BOOLEAN NOT NULL,
+        run_count BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (granularity, bucket_start, mode, plan, impact_level, ai_fallback_used)
+    );
+
+    ALTER TABLE translation_runs
+        ADD COLUMN IF NOT EXISTS translate_ms DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS ai_ms DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS ai_input_tokens INTEGER,
+        ADD COLUMN IF NOT EXISTS ai_output_tokens INTEGER,
+        ADD COLUMN IF NOT EXISTS ai_total_tokens INTEGER;
+
+    CREATE TABLE IF NOT EXISTS translation_payloads (
+        hash BYTEA PRIMARY KEY,
+        codec TEXT NOT NULL,
+        data BYTEA NOT NULL,
+        size_bytes INTEGER NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    -- Payloads are compressed client-side; skip TOAST recompression.
+    ALTER TABLE translation_payloads ALTER COLUMN data SET STORAGE EXTERNAL;
+
+    ALTER TABLE translation_runs
+        ADD COLUMN IF NOT EXISTS raw_text_hash BYTEA,
+        ADD COLUMN IF NOT EXISTS response_hash BYTEA,
+        ALTER COLUMN raw_text DROP NOT NULL,
+        ALTER COLUMN response_json DROP NOT NULL;
+
+    -- Write latency is a metric rather than a column; see DATABASE_SCHEMA.md.
+    ALTER TABLE translation_runs DROP COLUMN IF EXISTS db_write_ms;
+"""
+
+# Secondary indexes of `translation_runs`: name -> column list. The migration
+# builds them with CREATE INDEX CONCURRENTLY.
+TRANSLATION_RUNS_INDEXES = {
+    "translation_runs_mode_id_idx": "(mode, id DESC)",
+    "translation_runs_plan_id_idx": "(plan, id DESC)",
+    "translation_runs_impact_level_id_idx": "(impact_level, id DESC)",
+    "translation_runs_created_at_idx": "(created_at)",
+}
+
+
+def create_translation_runs_indexes(cur) -> None:
+    """Plain index builds, only for a `translation_runs` that is still empty."""
+    for name, columns in TRANSLATION_RUNS_INDEXES.items():
+        cur.execute(
+            sql.SQL("CREATE INDEX IF NOT EXISTS {name} ON translation_runs {columns};").format(
+                name=sql.Identifier(name),
+                columns=sql.SQL(columns),
+            )
+        )
+
+
+PAYLOAD_CODEC = "zlib"
+
+
+def _encode_payload(text: str) -> tuple[bytes, bytes, int]:
+    raw = text.encode("utf-8")
+    return hashlib.sha256(raw).digest(), zlib.compress(raw, 6), len(raw)
+
+
+def _decode_payload(codec: str, data) -> str:
+    if codec != PAYLOAD_CODEC:
+        raise ValueError(f"Unsupported payload codec: {codec}")
+    return zlib.decompress(bytes(data)).decode("utf-8")
+
 
 def insert_translation_run(data: dict):
+    started = time.perf_counter()
+
     conn = get_db_connection()
     cur = conn.cursor()
 
+    raw_hash, raw_data, raw_size = _encode_payload(data.get("raw_text") or "")
+    response_hash, response_data, response_size = _encode_payload(
+        json.dumps(data.get("response_json"), sort_keys=True, separators=(",", ":"))
+    )
+
     query = """
+    WITH payloads AS (
+    INSERT INTO translation_payloads (hash, codec, data, size_bytes)
+    VALUES
+        (%(raw_text_hash)s, %(payload_codec)s, %(raw_text_data)s, %(raw_text_size)s),
+        (%(response_hash)s, %(payload_codec)s, %(response_data)s, %(response_size)s)
+    ON CONFLICT (hash) DO NOTHING
+    ),
+    run AS (
     INSERT INTO translation_runs (
         status,
         mode,
         plan,
-        raw_text,
+        raw_text_hash,
         product_area,
         tone,
         impact_level,
@@ -37,14 +170,19 @@ def insert_translation_run(data: dict):
         ai_model,
         ai_prompt_version,
         ai_error_message,
-        response_json,
-        error_message
+        response_hash,
+        error_message,
+        translate_ms,
+        ai_ms,
+        ai_input_tokens,
+        ai_output_tokens,
+        ai_total_tokens
     )
     VALUES (
         %(status)s,
         %(mode)s,
         %(plan)s,
-        %(raw_text)s,
+        %(raw_text_hash)s,
         %(product_area)s,
         %(tone)s,
         %(impact_level)s,
@@ -55,16 +193,50 @@ def insert_translation_run(data: dict):
         %(ai_model)s,
         %(ai_prompt_version)s,
         %(ai_error_message)s,
-        %(response_json)s,
-        %(error_message)s
-    );
+        %(response_hash)s,
+        %(error_message)s,
+        %(translate_ms)s,
+        %(ai_ms)s,
+        %(ai_input_tokens)s,
+        %(ai_output_tokens)s,
+        %(ai_total_tokens)s
+    )
+    RETURNING id, created_at, mode, plan, impact_level, ai_fallback_used
+    ),
+    rollup AS (
+    INSERT INTO translation_run_rollups AS r (
+        granularity,
+        bucket_start,
+        mode,
+        plan,
+        impact_level,
+        ai_fallback_used,
+        run_count
+    )
+    SELECT
+        g.granularity,
+        date_trunc(g.granularity, run.created_at AT TIME ZONE 'UTC'),
+        COALESCE(run.mode, ''),
+        COALESCE(run.plan, ''),
+        COALESCE(run.impact_level, ''),
+        COALESCE(run.ai_fallback_used, FALSE),
+        1
+    FROM run
+    CROSS JOIN (VALUES ('hour'), ('day')) AS g (granularity)
+    ON CONFLICT (granularity, bucket_start, mode, plan, impact_level, ai_fallback_used)
+    DO UPDATE SET run_count = r.run_count + 1
+    )
+    SELECT id, created_at FROM run;
     """
 
     cur.execute(query, {
         "status": data.get("status"),
         "mode": data.get("mode"),
         "plan": data.get("plan"),
-        "raw_text": data.get("raw_text"),
+        "payload_codec": PAYLOAD_CODEC,
+        "raw_text_hash": psycopg2.Binary(raw_hash),
+        "raw_text_data": psycopg2.Binary(raw_data),
+        "raw_text_size": raw_size,
         "product_area": data.get("product_area"),
         "tone": data.get("tone"),
         "impact_level": data.get("impact_level"),
@@ -75,75 +247,420 @@ def insert_translation_run(data: dict):
         "ai_model": data.get("ai_model"),
         "ai_prompt_version": data.get("ai_prompt_version"),
         "ai_error_message": data.get("ai_error_message"),
-        "response_json": json.dumps(data.get("response_json")),
+        "response_hash": psycopg2.Binary(response_hash),
+        "response_data": psycopg2.Binary(response_data),
+        "response_size": response_size,
         "error_message": data.get("error_message"),
+        "translate_ms": data.get("translate_ms"),
+        "ai_ms": data.get("ai_ms"),
+        "ai_input_tokens": data.get("ai_input_tokens"),
+        "ai_output_tokens": data.get("ai_output_tokens"),
+        "ai_total_tokens": data.get("ai_total_tokens"),
     })
 
     conn.commit()
     cur.close()
     conn.close()
 
+    # Only known once the insert has run, so it goes to the metrics rather
+    # than a second write to the row.
+    TRANSLATE_STAGE_SECONDS.observe(time.perf_counter() - started, stage="db_write")
+
+
+
+HISTORY_FIELDS = (
+    "id",
+    "created_at",
+    "status",
+    "mode",
+    "plan",
+    "raw_text",
+    "product_area",
+    "tone",
+    "impact_level",
+    "risk_flags",
+    "detected_scopes",
+    "ai_provider",
+    "ai_fallback_used",
+    "response_json",
+    "error_message",
+)
+
+HISTORY_DETAIL_FIELDS = HISTORY_FIELDS + (
+    "ai_model",
+    "ai_prompt_version",
+    "ai_error_message",
+    "translate_ms",
+    "ai_ms",
+    "ai_input_tokens",
+    "ai_output_tokens",
+    "ai_total_tokens",
+)
+
+HISTORY_MAX_LIMIT = 100
+
+# Payload fields live in `translation_payloads` for new rows and inline on
+# rows written before content-addressed storage.
+_PAYLOAD_FIELDS = {
+    "raw_text": "raw_text_hash",
+    "response_json": "response_hash",
+}
+
+
+def _select_run_fields(fields) -> tuple[str, str]:
+    columns: list[str] = []
+    joins: list[str] = []
+
+    for field in fields:
+        if field in _PAYLOAD_FIELDS:
+            alias = f"{field}_payload"
+            columns.extend([
+                f"t.{field}",
+                f"{alias}.codec AS {field}_codec",
+                f"{alias}.data AS {field}_data",
+            ])
+            joins.append(
+                f"LEFT JOIN translation_payloads {alias} ON {alias}.hash = t.{_PAYLOAD_FIELDS[field]}"
+            )
+        else:
+            columns.append(f"t.{field}")
 
+    return ", ".join(columns), " ".join(joins)
+
+
+def _hydrate_payloads(row: dict) -> dict:
+    for field in _PAYLOAD_FIELDS:
+        if f"{field}_data" not in row:
+            continue
+
+        codec = row.pop(f"{field}_codec")
+        blob = row.pop(f"{field}_data")
+        if blob is None:
+            continue
+
+        text = _decode_payload(codec, blob)
+        row[field] = json.loads(text) if field == "response_json" else text
+
+    return row
+
+
+def fetch_translation_history(
+    limit: int = 10,
+    cursor: int | None = None,
+    mode: str | None = None,
+    plan: str | None = None,
+    impact_level: str | None = None,
+    created_after=None,
+    created_before=None,
+    fields: list[str] | None = None,
+):
+    """
+    Keyset-paginated history, newest first.
+
+    `cursor` is the `id` of the last row from the previous page; only rows
+    with a smaller id are returned. `fields` restricts the selected columns
+    (`id` is always included so the next cursor can be taken from the page).
+    """
+    selected = [field for field in HISTORY_FIELDS if fields is None or field in fields or field == "id"]
+    select_list, joins = _select_run_fields(selected)
+    limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+
+    conditions: list[str] = []
+    params: list = []
+
+    if cursor is not None:
+        conditions.append("t.id < %s")
+        params.append(cursor)
+    if mode:
+        conditions.append("t.mode = %s")
+        params.append(mode)
+    if plan:
+        conditions.append("t.plan = %s")
+        params.append(plan)
+    if impact_level:
+        conditions.append("t.impact_level = %s")
+        params.append(impact_level)
+    if created_after is not None:
+        conditions.append("t.created_at >= %s")
+        params.append(created_after)
+    if created_before is not None:
+        conditions.append("t.created_at < %s")
+        params.append(created_before)
+
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
 
-def fetch_translation_history(limit: int = 10):
     conn = get_db_connection()
     cur = conn.cursor()
 
-    query = """
-    SELECT
-        id,
-        created_at,
-        status,
-        mode,
-        plan,
-        raw_text,
-        product_area,
-        tone,
-        impact_level,
-        risk_flags,
-        detected_scopes,
-        ai_provider,
-        ai_fallback_used,
-        response_json,
-        error_message
-    FROM translation_runs
-    ORDER BY id DESC
-    LIMIT %s;
+    try:
+        query = f"""
+        SELECT {select_list}
+        FROM translation_runs t
+        {joins}
+        {where_clause}
+        ORDER BY t.id DESC
+        LIMIT %s;
+        """
+
+        cur.execute(query, (*params, limit))
+        rows = [_hydrate_payloads(row) for row in cur.fetchall()]
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+    return rows
+
+
+def fetch_translation_run(run_id: int):
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    select_list, joins = _select_run_fields(HISTORY_DETAIL_FIELDS)
+
+    try:
+        cur.execute(
+            f"""
+            SELECT {select_list}
+            FROM translation_runs t
+            {joins}
+            WHERE t.id = %s
+            LIMIT 1;
+            """,
+            (run_id,),
+        )
+        row = cur.fetchone()
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+    return _hydrate_payloads(row) if row else None
+
+
+def _validate_granularity(granularity: str) -> str:
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+    return granularity
+
+
+def fetch_metrics_summary(
+    start=None,
+    end=None,
+    granularity: str | None = None,
+):
     """
+    Aggregate metrics read from `translation_run_rollups`.
 
-    cur.execute(query, (limit,))
-    rows = cur.fetchall()
+    Cost depends on the number of buckets in the requested range, not on the
+    size of `translation_runs`. `start`/`end` are rounded down to the bucket
+    boundary. When `granularity` is given, per-bucket series are included.
+    """
+    summary_granularity = _validate_granularity(granularity or "day")
+    if granularity is None and (
+        (start is not None and _is_sub_day(start)) or (end is not None and _is_sub_day(end))
+    ):
+        summary_granularity = "hour"
 
-    cur.close()
-    conn.close()
+    conditions = ["granularity = %s"]
+    params: list = [summary_granularity]
 
-    return rows
+    if start is not None:
+        conditions.append("bucket_start >= date_trunc(%s, %s::timestamptz AT TIME ZONE 'UTC')")
+        params.extend([summary_granularity, start])
+    if end is not None:
+        conditions.append("bucket_start < %s::timestamptz AT TIME ZONE 'UTC'")
+        params.append(end)
+
+    where_clause = " AND ".join(conditions)
+
+    counters = """
+        COALESCE(SUM(run_count), 0)::bigint AS total_runs,
 
+        COALESCE(SUM(run_count) FILTER (WHERE mode = 'basic'), 0)::bigint AS basic_runs,
+        COALESCE(SUM(run_count) FILTER (WHERE mode = 'ai'), 0)::bigint AS ai_runs,
+
+        COALESCE(SUM(run_count) FILTER (WHERE ai_fallback_used = TRUE), 0)::bigint AS ai_fallbacks,
+
+        COALESCE(SUM(run_count) FILTER (WHERE impact_level = 'high'), 0)::bigint AS high_impact,
+        COALESCE(SUM(run_count) FILTER (WHERE impact_level = 'medium'), 0)::bigint AS medium_impact,
+        COALESCE(SUM(run_count) FILTER (WHERE impact_level = 'low'), 0)::bigint AS low_impact
+    """
 
-def fetch_metrics_summary():
     conn = get_db_connection()
     cur = conn.cursor()
 
-    query = """
-    SELECT
-        COUNT(*) AS total_runs,
+    try:
+        cur.execute(
+            f"""
+            SELECT {counters}
+            FROM translation_run_rollups
+            WHERE {where_clause};
+            """,
+            params,
+        )
+        result = dict(cur.fetchone())
+
+        if granularity is not None:
+            cur.execute(
+                f"""
+                SELECT bucket_start, {counters}
+                FROM translation_run_rollups
+                WHERE {where_clause}
+                GROUP BY bucket_start
+                ORDER BY bucket_start ASC;
+                """,
+                params,
+            )
+            result["granularity"] = granularity
+            result["buckets"] = cur.fetchall()
+
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+    return result
 
-        COUNT(*) FILTER (WHERE mode = 'basic') AS basic_runs,
-        COUNT(*) FILTER (WHERE mode = 'ai') AS ai_runs,
 
-        COUNT(*) FILTER (WHERE ai_fallback_used = TRUE) AS ai_fallbacks,
+def _is_sub_day(value) -> bool:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return (value.hour, value.minute, value.second, value.microsecond) != (0, 0, 0, 0)
 
-        COUNT(*) FILTER (WHERE impact_level = 'high') AS high_impact,
-        COUNT(*) FILTER (WHERE impact_level = 'medium') AS medium_impact,
-        COUNT(*) FILTER (WHERE impact_level = 'low') AS low_impact
 
-    FROM translation_runs;
+def rebuild_translation_run_rollups() -> int:
     """
+    Recompute `translation_run_rollups` from `translation_runs`.
 
-    cur.execute(query)
-    result = cur.fetchone()
+    Used once to backfill rollups for history written before rollups existed,
+    or to repair drift. Writers are blocked for the duration so no run is
+    counted twice or missed.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
 
-    cur.close()
-    conn.close()
+    try:
+        cur.execute("LOCK TABLE translation_run_rollups IN EXCLUSIVE MODE;")
+        cur.execute("DELETE FROM translation_run_rollups;")
+        cur.execute(
+            """
+            INSERT INTO translation_run_rollups (
+                granularity,
+                bucket_start,
+                mode,
+                plan,
+                impact_level,
+                ai_fallback_used,
+                run_count
+            )
+            SELECT
+                g.granularity,
+                date_trunc(g.granularity, t.created_at AT TIME ZONE 'UTC'),
+                COALESCE(t.mode, ''),
+                COALESCE(t.plan, ''),
+                COALESCE(t.impact_level, ''),
+                COALESCE(t.ai_fallback_used, FALSE),
+                COUNT(*)
+            FROM translation_runs t
+            CROSS JOIN (VALUES ('hour'), ('day')) AS g (granularity)
+            GROUP BY 1, 2, 3, 4, 5, 6;
+            """
+        )
+        row_count = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+    return row_count
+
+
+LATENCY_MAX_WINDOW_DAYS = 31
+
+
+def fetch_latency_summary(start, end, granularity: str = "hour"):
+    """
+    p50/p95/p99 per stage and token spend, grouped by time bucket, mode,
+    plan, model and prompt version. Scans only rows in [start, end) through
+    the `created_at` index.
+    """
+    granularity = _validate_granularity(granularity)
+
+    percentiles = ",\n".join(
+        f"percentile_cont({fraction}) WITHIN GROUP (ORDER BY {column}) AS {column}_p{label}"
+        for column in ("translate_ms", "ai_ms")
+        for fraction, label in ((0.5, "50"), (0.95, "95"), (0.99, "99"))
+    )
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        cur.execute(
+            f"""
+            SELECT
+                date_trunc(%s, created_at AT TIME ZONE 'UTC') AS bucket_start,
+                mode,
+                plan,
+                ai_model,
+                ai_prompt_version,
+                COUNT(*) AS runs,
+                {percentiles},
+                COALESCE(SUM(ai_input_tokens), 0)::bigint AS ai_input_tokens,
+                COALESCE(SUM(ai_output_tokens), 0)::bigint AS ai_output_tokens,
+                COALESCE(SUM(ai_total_tokens), 0)::bigint AS ai_total_tokens
+            FROM translation_runs
+            WHERE created_at >= %s
+              AND created_at < %s
+              AND translate_ms IS NOT NULL
+            GROUP BY 1, 2, 3, 4, 5
+            ORDER BY 1 ASC, 2, 3, 4, 5;
+            """,
+            (granularity, start, end),
+        )
+        rows = cur.fetchall()
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+    return rows
+
+
+def prune_unreferenced_payloads() -> int:
+    """
+    Delete payloads no longer referenced by any run (e.g. after archival).
+
+    New inserts are blocked while the prune runs so a payload that a
+    concurrent insert just deduplicated against cannot be removed underneath it.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        cur.execute("LOCK TABLE translation_payloads IN SHARE ROW EXCLUSIVE MODE;")
+        cur.execute(
+            """
+            DELETE FROM translation_payloads p
+            WHERE NOT EXISTS (
+                SELECT 1 FROM translation_runs t WHERE t.raw_text_hash = p.hash
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM translation_runs t WHERE t.response_hash = p.hash
+            );
+            """
+        )
+        deleted = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
 
-    return result
\ No newline at end of file
+    return deleted
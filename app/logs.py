@@ -0,0 +1,213 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from fastapi import Request
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+# Records waiting for the writer thread. When it is full, new records are
+# dropped rather than blocking the request that logs them.
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+
+def _parse_sample_rates(value: str) -> dict[str, float]:
+    # "event=rate,...": keep that fraction of the event's records.
+    rates = {}
+    for item in value.split(","):
+        event, _, rate = item.partition("=")
+        if event.strip() and rate.strip():
+            rates[event.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+# Warnings and errors are always kept.
+LOG_SAMPLE_RATES = _parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", "http.request=0.1"))
+
+# Field names whose values never reach the log output.
+_REDACTED_FIELDS = {"password", "authorization", "cookie", "api_key", "raw_key", "token"}
+_REDACTED_SUFFIXES = ("password", "secret", "_hash", "_token")
+REDACTED = "[redacted]"
+
+_REQUEST_ID: ContextVar[str | None] = ContextVar("request_id", default=None)
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+_STANDARD_KWARGS = {"exc_info", "stack_info", "stacklevel", "extra"}
+
+_CONFIGURED = False
+_CONFIGURE_LOCK = threading.Lock()
+
+
+def _redact(value, key: str = ""):
+    lowered = key.lower()
+    if lowered in _REDACTED_FIELDS or lowered.endswith(_REDACTED_SUFFIXES):
+        return REDACTED
+    if isinstance(value, dict):
+        return {k: _redact(v, str(k)) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_redact(item) for item in value]
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "sample_rate", None) is not None:
+            entry["sample_rate"] = record.sample_rate
+        for key, value in _redact(getattr(record, "fields", {})).items():
+            entry.setdefault(key, value)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _RequestFilter(logging.Filter):
+    """
+    Runs on the logging thread: drops sampled-out records before they are
+    queued and stamps the request id, which the writer thread cannot see.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            rate = LOG_SAMPLE_RATES.get(record.msg)
+            if rate is not None:
+                if random.random() >= rate:
+                    return False
+                record.sample_rate = rate
+        record.request_id = _REQUEST_ID.get()
+        return True
+
+
+class _StdoutHandler(logging.StreamHandler):
+    # Looked up per record, so a replaced sys.stdout is followed.
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens on the writer thread.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_HANDLER: _QueueHandler | None = None
+
+
+def configure_logging() -> None:
+    """Route the `app.*` loggers through a queue to a JSON writer thread."""
+    global _CONFIGURED, _HANDLER
+
+    with _CONFIGURE_LOCK:
+        if _CONFIGURED:
+            return
+        _CONFIGURED = True
+
+    stream_handler = _StdoutHandler()
+    stream_handler.setFormatter(JsonFormatter())
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _HANDLER = _QueueHandler(log_queue)
+    _HANDLER.addFilter(_RequestFilter())
+
+    logger = logging.getLogger("app")
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(_HANDLER)
+    logger.propagate = False
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    # Drains what is still queued.
+    atexit.register(listener.stop)
+
+
+def dropped_records() -> int:
+    return _HANDLER.dropped if _HANDLER is not None else 0
+
+
+class EventLogger(logging.LoggerAdapter):
+    """`log.info("event.name", key=value, ...)`: keyword arguments become JSON fields."""
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in _STANDARD_KWARGS}
+        kwargs["extra"] = {**kwargs.get("extra", {}), "fields": fields}
+        return msg, kwargs
+
+
+def get_logger(name: str) -> EventLogger:
+    configure_logging()
+    return EventLogger(logging.getLogger(name), {})
+
+
+def current_request_id() -> str | None:
+    return _REQUEST_ID.get()
+
+
+log = get_logger(__name__)
+
+
+async def request_context_middleware(request: Request, call_next):
+    """
+    Tags everything logged while handling a request with its id, taken from
+    `X-Request-ID` when the caller sends a usable one, and logs the request.
+    """
+    incoming = request.headers.get("X-Request-ID", "")
+    request_id = incoming if _REQUEST_ID_PATTERN.match(incoming) else secrets.token_hex(8)
+    token = _REQUEST_ID.set(request_id)
+
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        log.exception(
+            "http.request",
+            method=request.method,
+            path=request.url.path,
+            status=500,
+            duration_ms=round((time.perf_counter() - started) * 1000, 2),
+        )
+        raise
+    else:
+        route = request.scope.get("route")
+        log.log(
+            logging.WARNING if response.status_code >= 500 else logging.INFO,
+            "http.request",
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=response.status_code,
+            duration_ms=round((time.perf_counter() - started) * 1000, 2),
+        )
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        _REQUEST_ID.reset(token)
@@ -1,25 +1,67 @@
+import hmac
 import os
-from fastapi import FastAPI, Body, HTTPException, Depends, status
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Literal
+from fastapi import FastAPI, Body, HTTPException, Depends, Header, Query, Request, status
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 
+from .admission import admit
 from .auth import require_api_key, ApiCaller
-from .models import TranslateRequest, TranslateResponse
-from .translator import translate, detect_scopes
-from .db import insert_translation_run, fetch_translation_history, fetch_metrics_summary
-from .rate_limit import enforce_rate_limit
+from .models import TranslateRequest, TranslateResponse, Mode, ImpactLevel
+from .translator import translate, detect_scopes, TranslationTimings
+from .db import (
+    HISTORY_FIELDS,
+    HISTORY_MAX_LIMIT,
+    insert_translation_run,
+    fetch_translation_history,
+    fetch_translation_run,
+    fetch_metrics_summary,
+    fetch_latency_summary,
+    LATENCY_MAX_WINDOW_DAYS,
+)
+from .logs import get_logger, request_context_middleware
+from .metrics import CONTENT_TYPE, METRICS_TOKEN, REGISTRY, metrics_middleware, render_text
+from .quotas import request_cost
+from .passwords import PasswordHasherBusy
+from .sessions import (
+    InvalidToken,
+    SessionClaims,
+    decode_token,
+    issue_tokens,
+    refresh_session,
+    require_session,
+    revoke_session,
+    start_revocation_listener,
+)
+from .rate_limit import enforce_login_throttle, enforce_rate_limit, rate_limit_headers_middleware, record_ai_usage
+from .partner_catalog import catalog_index_stats
 
 from app.user_auth import create_user, login_user
 from app.apps_api import router as apps_router
+from app.api_keys_api import router as api_keys_router
 from app.partners_api import router as partners_router
 
 load_dotenv()
 
+log = get_logger(__name__)
+
 APP_VERSION = os.getenv("APP_VERSION", "0.1.0")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Revoked sessions must be known before the first token is checked.
+    await run_in_threadpool(start_revocation_listener)
+    yield
+
+
 app = FastAPI(
     title="Changelog Translator API",
     version=APP_VERSION,
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -31,9 +73,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "X-RateLimit-Limit",
+        "X-RateLimit-Remaining",
+        "X-RateLimit-Reset",
+        "X-Quota-Limit",
+        "X-Quota-Remaining",
+        "X-Quota-Reset",
+        "X-AI-Tokens-Remaining",
+        "Retry-After",
+        "X-Request-ID",
+    ],
 )
+app.middleware("http")(rate_limit_headers_middleware)
+app.middleware("http")(metrics_middleware)
+# Outermost, so the request id covers the other middleware too.
+app.middleware("http")(request_context_middleware)
 
 app.include_router(apps_router)
+app.include_router(api_keys_router)
 app.include_router(partners_router)
 
 
@@ -49,17 +107,56 @@ def version(caller: ApiCaller = Depends(require_api_key)):
     return {"version": APP_VERSION}
 
 
-@app.post("/v1/translate", response_model=TranslateResponse)
-def translate_v1(req: TranslateRequest, caller: ApiCaller = Depends(require_api_key)):
+@app.get("/metrics", include_in_schema=False)
+def metrics(authorization: str | None = Header(default=None, alias="Authorization")):
+    if METRICS_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return PlainTextResponse(render_text(REGISTRY.collect()), media_type=CONTENT_TYPE)
+
+
+@app.get("/v1/catalog/stats")
+def catalog_stats(caller: ApiCaller = Depends(require_api_key)):
     enforce_rate_limit(caller.api_key, caller.plan)
+    return catalog_index_stats()
 
+
+@app.post("/v1/translate", response_model=TranslateResponse)
+async def translate_v1(req: TranslateRequest, caller: ApiCaller = Depends(require_api_key)):
     if req.mode == "ai" and caller.plan != "pro":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="AI mode requires a PRO API key",
         )
 
-    response = translate(req)
+    # A workspace's partner dataset is only readable with one of its own
+    # keys. Env keys belong to no workspace, so they cannot name one.
+    if req.workspace_id is not None and req.workspace_id != caller.workspace_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No access to this workspace",
+        )
+
+    # Rate limits and quotas come first: a caller over them gets its 429
+    # without taking an admission slot from compliant traffic.
+    # Each requested audience is generated separately, so it counts as one
+    # item of the batch.
+    cost = request_cost(req.mode, len(req.raw_text.encode("utf-8")), len(req.audience))
+    await run_in_threadpool(enforce_rate_limit, caller.api_key, caller.plan, cost, req.mode == "ai")
+
+    # Admitted on the event loop, so a request that has to wait does not
+    # hold a threadpool thread while it does.
+    async with admit("ai" if req.mode == "ai" else "basic", caller.plan):
+        return await run_in_threadpool(_run_translation, req, caller)
+
+
+def _run_translation(req: TranslateRequest, caller: ApiCaller) -> TranslateResponse:
+    timings = TranslationTimings()
+    response = translate(req, timings)
+    record_ai_usage(caller.api_key, caller.plan, timings.ai_total_tokens)
 
     try:
         insert_translation_run({
@@ -79,27 +176,124 @@ def translate_v1(req: TranslateRequest, caller: ApiCaller = Depends(require_api_
             "ai_model": getattr(response, "ai_model", None),
             "ai_prompt_version": getattr(response, "ai_prompt_version", None),
             "ai_error_message": getattr(response, "ai_error_message", None),
+            "translate_ms": timings.translate_ms,
+            "ai_ms": timings.ai_ms,
+            "ai_input_tokens": timings.ai_input_tokens,
+            "ai_output_tokens": timings.ai_output_tokens,
+            "ai_total_tokens": timings.ai_total_tokens,
         })
     except Exception as e:
-        print(f"[DB LOGGING ERROR] {e}")
+        log.warning("translation_run.insert_failed", error=f"{type(e).__name__}: {e}")
 
     return response
 
 
+def _parse_history_fields(fields: str | None) -> list[str] | None:
+    if not fields:
+        return None
+
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in HISTORY_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown history fields: {', '.join(unknown)}",
+        )
+
+    return requested
+
+
 @app.get("/v1/history")
-def get_history(limit: int = 10, caller: ApiCaller = Depends(require_api_key)):
+def get_history(
+    limit: int = Query(10, ge=1, le=HISTORY_MAX_LIMIT),
+    cursor: int | None = Query(None, description="Return runs with an id lower than this (last id of the previous page)."),
+    mode: Mode | None = None,
+    plan: str | None = None,
+    impact_level: ImpactLevel | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    fields: str | None = Query(None, description="Comma-separated columns to return, e.g. id,created_at,mode,impact_level."),
+    caller: ApiCaller = Depends(require_api_key),
+):
+    enforce_rate_limit(caller.api_key, caller.plan)
+    return fetch_translation_history(
+        limit=limit,
+        cursor=cursor,
+        mode=mode,
+        plan=plan,
+        impact_level=impact_level,
+        created_after=created_after,
+        created_before=created_before,
+        fields=_parse_history_fields(fields),
+    )
+
+
+@app.get("/v1/history/{run_id}")
+def get_history_run(run_id: int, caller: ApiCaller = Depends(require_api_key)):
     enforce_rate_limit(caller.api_key, caller.plan)
-    return fetch_translation_history(limit)
+
+    run = fetch_translation_run(run_id)
+    if not run:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Translation run not found")
+
+    return run
 
 
 @app.get("/v1/metrics/summary")
-def get_metrics_summary(caller: ApiCaller = Depends(require_api_key)):
+def get_metrics_summary(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    granularity: Literal["hour", "day"] | None = None,
+    caller: ApiCaller = Depends(require_api_key),
+):
+    enforce_rate_limit(caller.api_key, caller.plan)
+    return fetch_metrics_summary(start=start, end=end, granularity=granularity)
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+@app.get("/v1/metrics/latency")
+def get_latency_metrics(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    granularity: Literal["hour", "day"] = "hour",
+    caller: ApiCaller = Depends(require_api_key),
+):
     enforce_rate_limit(caller.api_key, caller.plan)
-    return fetch_metrics_summary()
+
+    end = _as_utc(end) if end else datetime.now(timezone.utc)
+    start = _as_utc(start) if start else end - timedelta(days=1)
+
+    if start >= end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must be before end")
+    if end - start > timedelta(days=LATENCY_MAX_WINDOW_DAYS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Latency window cannot exceed {LATENCY_MAX_WINDOW_DAYS} days",
+        )
+
+    return {
+        "start": start,
+        "end": end,
+        "granularity": granularity,
+        "buckets": fetch_latency_summary(start, end, granularity),
+    }
+
+
+def _password_hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-ins in progress. Try again shortly.",
+        headers={"Retry-After": "1"},
+    )
 
 
 @app.post("/app-auth/signup")
-def signup(payload: dict = Body(...)):
+async def signup(payload: dict = Body(...)):
     try:
         email = payload.get("email")
         password = payload.get("password")
@@ -113,7 +307,7 @@ def signup(payload: dict = Body(...)):
         if business_type == "business" and not business_name:
             raise HTTPException(status_code=400, detail="Business name required")
 
-        result = create_user(email, password, full_name, business_name)
+        result = await create_user(email, password, full_name, business_name)
 
         return {
             "success": True,
@@ -122,12 +316,14 @@ def signup(payload: dict = Body(...)):
 
     except HTTPException:
         raise
+    except PasswordHasherBusy:
+        raise _password_hasher_busy()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/app-auth/login")
-def login(payload: dict = Body(...)):
+async def login(request: Request, payload: dict = Body(...)):
     try:
         email = payload.get("email")
         password = payload.get("password")
@@ -135,15 +331,21 @@ def login(payload: dict = Body(...)):
         if not email or not password:
             raise HTTPException(status_code=400, detail="Email and password required")
 
-        result = login_user(email, password)
+        client_ip = request.client.host if request.client else None
+        await run_in_threadpool(enforce_login_throttle, client_ip, email)
+
+        result = await login_user(email, password)
 
         return {
             "success": True,
-            "user": result
+            "user": result,
+            **issue_tokens(result["user_id"], result["email"], result["workspace_ids"]),
         }
 
     except HTTPException:
         raise
+    except PasswordHasherBusy:
+        raise _password_hasher_busy()
     except Exception as e:
         message = str(e)
         if message == "Invalid email or password":
@@ -164,8 +366,35 @@ def forgot_password(payload: dict = Body(...)):
     }
 
 
+@app.post("/app-auth/refresh")
+def refresh(payload: dict = Body(...)):
+    refresh_token = payload.get("refresh_token")
+    if not refresh_token:
+        raise HTTPException(status_code=400, detail="refresh_token required")
+
+    try:
+        return {"success": True, **refresh_session(refresh_token)}
+    except InvalidToken as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+
 @app.post("/app-auth/logout")
-def logout():
+def logout(
+    payload: dict = Body(default={}),
+    authorization: str | None = Header(default=None, alias="Authorization"),
+):
+    # Either token of a session ends it; the refresh token still works once
+    # the access token has expired.
+    try:
+        if payload.get("refresh_token"):
+            session = decode_token(payload["refresh_token"], "refresh")
+        else:
+            session = require_session(authorization)
+    except InvalidToken as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+    revoke_session(session.session_id)
+
     return {
         "success": True,
         "message": "Logged out"
@@ -173,8 +402,13 @@ def logout():
 
 
 @app.get("/app-auth/me")
-def get_current_user():
+def get_current_user(session: SessionClaims = Depends(require_session)):
     return {
         "success": True,
-        "message": "Temporary /me route not wired to sessions yet"
-    }
\ No newline at end of file
+        "user": {
+            "user_id": session.user_id,
+            "email": session.email,
+            "workspace_id": session.workspace_id,
+            "workspace_ids": list(session.workspace_ids),
+        },
+    }
@@ -0,0 +1,116 @@
+import argparse
+import os
+
+from .db import prune_unreferenced_payloads, rebuild_translation_run_rollups
+from .migrations import run_migrations
+from .partner_catalog import CATALOG_INDEX_PATH, catalog_index_stats
+from .partners_api import prune_partner_tombstones
+from .partitions import (
+    archive_expired_partitions,
+    convert_translation_runs_to_partitioned,
+    ensure_future_partitions,
+)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser(
+        "migrate",
+        help="Apply schema migrations (run at every deploy, before starting the API).",
+    )
+
+    commands.add_parser(
+        "rebuild-rollups",
+        help="Recompute translation_run_rollups from translation_runs (backfill or repair).",
+    )
+
+    partition_runs = commands.add_parser(
+        "partition-runs",
+        help="One-time migration of translation_runs to monthly partitions.",
+    )
+    partition_runs.add_argument("--months-ahead", type=int, default=3)
+
+    manage_partitions = commands.add_parser(
+        "manage-partitions",
+        help="Create upcoming monthly partitions (run daily from cron).",
+    )
+    manage_partitions.add_argument("--months-ahead", type=int, default=3)
+
+    archive_partitions = commands.add_parser(
+        "archive-partitions",
+        help="Export partitions past retention to compressed NDJSON and drop them.",
+    )
+    archive_partitions.add_argument(
+        "--retention-months",
+        type=int,
+        default=int(os.getenv("RUNS_RETENTION_MONTHS", "12")),
+    )
+    archive_partitions.add_argument(
+        "--archive-dir",
+        default=os.getenv("RUNS_ARCHIVE_DIR", "archive/translation_runs"),
+    )
+
+    commands.add_parser(
+        "prune-payloads",
+        help="Delete stored payloads no longer referenced by any translation run.",
+    )
+
+    prune_tombstones = commands.add_parser(
+        "prune-tombstones",
+        help="Delete partner row tombstones past retention (run daily from cron).",
+    )
+    prune_tombstones.add_argument(
+        "--retention-days",
+        type=int,
+        default=int(os.getenv("PARTNER_TOMBSTONE_RETENTION_DAYS", "30")),
+    )
+
+    commands.add_parser(
+        "compile-catalog",
+        help="Compile the static partner catalog into its shared binary index (run at deploy).",
+    )
+
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        applied = run_migrations()
+        print(f"Applied: {', '.join(applied) or 'nothing to do'}")
+
+    elif args.command == "rebuild-rollups":
+        row_count = rebuild_translation_run_rollups()
+        print(f"Rebuilt {row_count} rollup rows")
+
+    elif args.command == "partition-runs":
+        result = convert_translation_runs_to_partitioned(args.months_ahead)
+        if result["converted"]:
+            print(
+                f"Copied {result['rows_copied']} runs into {result['partitions_created']} partitions; "
+                "verify and then DROP TABLE translation_runs_legacy"
+            )
+        else:
+            print(result["reason"])
+
+    elif args.command == "manage-partitions":
+        created = ensure_future_partitions(args.months_ahead)
+        print(f"Created partitions: {', '.join(created) or 'none'}")
+
+    elif args.command == "archive-partitions":
+        for item in archive_expired_partitions(args.retention_months, args.archive_dir):
+            print(f"Archived {item['partition']} ({item['rows']} rows) -> {item['file']}")
+
+    elif args.command == "prune-payloads":
+        print(f"Deleted {prune_unreferenced_payloads()} unreferenced payloads")
+
+    elif args.command == "prune-tombstones":
+        deleted = prune_partner_tombstones(args.retention_days)
+        print(f"Deleted {deleted} tombstones older than {args.retention_days} days")
+
+    elif args.command == "compile-catalog":
+        stats = catalog_index_stats()
+        print(f"Catalog index {CATALOG_INDEX_PATH}: {stats['entries']} partners, {stats['index_bytes']} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from fastapi import Request
+
+from app.logs import dropped_records, get_logger
+
+# Latency buckets in seconds, from cache hits to slow AI calls.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# With several workers, each one writes its samples here and `/metrics`
+# merges every file, so any worker can answer a scrape. Clear the directory
+# when the service is restarted.
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+METRICS_WRITE_INTERVAL_SECONDS = float(os.getenv("METRICS_WRITE_INTERVAL_SECONDS", "5"))
+# When set, scrapes must send `Authorization: Bearer <token>`.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "").strip()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+log = get_logger(__name__)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._samples: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: dict[str, object]) -> tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = [[list(key), value] for key, value in self._samples.items()]
+        return {"type": self.type, "help": self.help, "labels": list(self.label_names), "samples": samples}
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._samples[key] = self._samples.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    A per-worker value. Merged across workers by summing the workers that
+    are still running.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._functions: dict[tuple[str, ...], object] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._samples[self._key(labels)] = value
+
+    def set_function(self, function, **labels) -> None:
+        """Read the value from `function()` at collection time."""
+        with self._lock:
+            self._functions[self._key(labels)] = function
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            functions = list(self._functions.items())
+        for key, function in functions:
+            try:
+                value = function()
+            except Exception:
+                continue
+            with self._lock:
+                self._samples[key] = value
+        return super().snapshot()
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            sample = self._samples.get(key)
+            if sample is None:
+                sample = self._samples[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample["buckets"][index] += 1
+                    break
+            sample["sum"] += value
+            sample["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = [
+                [list(key), {"buckets": list(value["buckets"]), "sum": value["sum"], "count": value["count"]}]
+                for key, value in self._samples.items()
+            ]
+        return {
+            "type": self.type,
+            "help": self.help,
+            "labels": list(self.label_names),
+            "buckets": list(self.buckets),
+            "samples": samples,
+        }
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self._writer_started = False
+
+    def register(self, metric: _Metric) -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def write_snapshot(self) -> None:
+        """Publish this worker's samples for the other workers' scrapes."""
+        directory = Path(METRICS_MULTIPROC_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        target = directory / f"metrics_{os.getpid()}.json"
+        tmp_target = directory / f".metrics_{os.getpid()}.json.tmp"
+        tmp_target.write_text(json.dumps({"pid": os.getpid(), "metrics": self.snapshot()}))
+        os.replace(tmp_target, target)
+
+    def ensure_writer(self) -> None:
+        if not METRICS_MULTIPROC_DIR:
+            return
+
+        with self._lock:
+            if self._writer_started:
+                return
+            self._writer_started = True
+
+        threading.Thread(target=self._write_periodically, name="metrics-writer", daemon=True).start()
+        atexit.register(self.write_snapshot)
+
+    def _write_periodically(self) -> None:
+        while True:
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                log.warning("metrics.write_failed", error=f"{type(e).__name__}: {e}")
+            time.sleep(METRICS_WRITE_INTERVAL_SECONDS)
+
+    def collect(self) -> dict:
+        """Samples of this worker, or of every worker in multi-process mode."""
+        if not METRICS_MULTIPROC_DIR:
+            return self.snapshot()
+
+        self.write_snapshot()
+        snapshots = []
+        for path in sorted(Path(METRICS_MULTIPROC_DIR).glob("metrics_*.json")):
+            try:
+                snapshots.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                # Being replaced or removed right now.
+                continue
+        return merge_snapshots(snapshots)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge_snapshots(snapshots: list[dict]) -> dict:
+    """
+    Sum counters and histograms over every worker that ever wrote samples,
+    so totals stay monotonic across worker restarts. Gauges only count
+    workers that are still running.
+    """
+    merged: dict[str, dict] = {}
+
+    for snapshot in snapshots:
+        alive = _pid_alive(int(snapshot["pid"]))
+
+        for name, metric in snapshot["metrics"].items():
+            if metric["type"] == "gauge" and not alive:
+                continue
+
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for labels, value in metric["samples"]:
+                key = tuple(labels)
+                if metric["type"] == "histogram":
+                    current = target["samples"].setdefault(
+                        key, {"buckets": [0] * len(metric["buckets"]), "sum": 0.0, "count": 0}
+                    )
+                    current["buckets"] = [a + b for a, b in zip(current["buckets"], value["buckets"])]
+                    current["sum"] += value["sum"]
+                    current["count"] += value["count"]
+                else:
+                    target["samples"][key] = target["samples"].get(key, 0) + value
+
+    for metric in merged.values():
+        metric["samples"] = [[list(key), value] for key, value in metric["samples"].items()]
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: list[str], values: list[str], extra: tuple[str, str] | None = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render_text(metrics: dict) -> str:
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines: list[str] = []
+
+    for name in sorted(metrics):
+        metric = metrics[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        names = metric["labels"]
+
+        for values, value in sorted(metric["samples"], key=lambda sample: sample[0]):
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_labels(names, values)} {_number(value)}")
+                continue
+
+            cumulative = 0
+            for bound, count in zip(metric["buckets"], value["buckets"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(names, values, ('le', _number(bound)))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(names, values, ('le', '+Inf'))} {value['count']}")
+            lines.append(f"{name}_sum{_labels(names, values)} {_number(value['sum'])}")
+            lines.append(f"{name}_count{_labels(names, values)} {value['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template and status.",
+    ("method", "route", "status"),
+)
+TRANSLATE_STAGE_SECONDS = Histogram(
+    "translate_stage_duration_seconds",
+    "Time spent in each stage of a translation.",
+    ("stage",),
+)
+AI_REQUEST_SECONDS = Histogram(
+    "ai_request_duration_seconds",
+    "AI provider call latency.",
+    ("provider", "outcome"),
+)
+AI_FALLBACKS = Counter(
+    "ai_fallbacks_total",
+    "AI calls that failed and fell back to the rule-based output.",
+    ("provider", "reason"),
+)
+AI_TOKENS = Counter(
+    "ai_tokens_total",
+    "LLM tokens reported by the AI provider.",
+    ("provider", "kind"),
+)
+DB_CONNECT_SECONDS = Histogram(
+    "db_connect_duration_seconds",
+    "Time to open a Postgres connection.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+DB_CONNECTIONS = Counter(
+    "db_connections_total",
+    "Postgres connections opened, by outcome.",
+    ("outcome",),
+)
+DB_CONNECTIONS_OPEN = Gauge(
+    "db_connections_open",
+    "Postgres connections currently open in this worker.",
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections_total",
+    "Requests refused by rate limits, quotas or login throttling.",
+    ("plan", "reason"),
+)
+RATE_LIMIT_BACKEND_ERRORS = Counter(
+    "rate_limit_backend_errors_total",
+    "Rate-limit backend failures (requests were allowed).",
+    ("backend",),
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "In-process cache lookups by cache and result (hit or miss).",
+    ("cache", "result"),
+)
+CACHE_ENTRIES = Gauge(
+    "cache_entries",
+    "Entries held by in-process caches.",
+    ("cache",),
+)
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "admission_in_flight",
+    "Requests holding an admission slot in this worker.",
+    ("pool",),
+)
+ADMISSION_QUEUED = Gauge(
+    "admission_queued",
+    "Requests waiting for an admission slot in this worker.",
+    ("pool",),
+)
+ADMISSION_QUEUE_WAIT_SECONDS = Histogram(
+    "admission_queue_wait_seconds",
+    "Time admitted requests waited for a slot.",
+    ("pool", "plan"),
+)
+ADMISSION_SHED = Counter(
+    "admission_shed_total",
+    "Requests refused with 503 by admission control.",
+    ("pool", "plan", "reason"),
+)
+LOG_RECORDS_DROPPED = Gauge(
+    "log_records_dropped",
+    "Log records dropped by this worker because the log queue was full.",
+)
+LOG_RECORDS_DROPPED.set_function(dropped_records)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+async def metrics_middleware(request: Request, call_next):
+    """Records `http_request_duration_seconds` under the matched route template."""
+    REGISTRY.ensure_writer()
+
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        # Templates such as /v1/history/{run_id} keep the label set bounded.
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status_code,
+        )
@@ -0,0 +1,218 @@
+import os
+
+from psycopg2 import sql
+
+from app.api_keys import API_KEYS_DDL, API_KEYS_INDEXES
+from app.app_credentials import APPS_DDL
+from app.db import TRANSLATION_RUNS_DDL, TRANSLATION_RUNS_INDEXES, get_db_connection
+from app.partitions import _is_partitioned
+from app.partners_api import PARTNER_MAPPINGS_DDL, PARTNER_MAPPINGS_INDEXES, PARTNER_MAPPINGS_OBSOLETE_INDEXES
+from app.quotas import USAGE_DDL
+from app.rate_limit_backends import RATE_LIMIT_BUCKETS_DDL
+from app.sessions import REVOKED_SESSIONS_DDL
+from app.user_auth import WORKSPACES_DDL
+
+# Schema changes wait at most this long for a table lock instead of queueing
+# every other query on the table behind them; rerun the migration if it
+# times out.
+MIGRATION_LOCK_TIMEOUT = os.getenv("MIGRATION_LOCK_TIMEOUT", "5s")
+
+# Held for the whole run, so two deploys cannot migrate at the same time.
+_ADVISORY_LOCK_KEY = "app.migrations"
+
+
+def _index_state(cur, name: str) -> dict | None:
+    cur.execute(
+        """
+        SELECT c.oid, i.indisvalid
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_index i ON i.indexrelid = c.oid
+        WHERE c.relname = %s AND n.nspname = current_schema();
+        """,
+        (name,),
+    )
+    return cur.fetchone()
+
+
+def _build_index_concurrently(cur, name: str, table: str, columns: str) -> bool:
+    state = _index_state(cur, name)
+    if state is not None and state["indisvalid"]:
+        return False
+    if state is not None:
+        # Left behind by an interrupted concurrent build.
+        cur.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {name};").format(name=sql.Identifier(name)))
+
+    cur.execute(
+        sql.SQL("CREATE INDEX CONCURRENTLY {name} ON {table} {columns};").format(
+            name=sql.Identifier(name),
+            table=sql.Identifier(table),
+            columns=sql.SQL(columns),
+        )
+    )
+    return True
+
+
+def _build_partitioned_index(cur, name: str, columns: str) -> bool:
+    """
+    Partitioned tables cannot build an index concurrently: create it on the
+    parent only, build one per partition concurrently and attach them.
+    """
+    state = _index_state(cur, name)
+    if state is not None and state["indisvalid"]:
+        return False
+
+    cur.execute(
+        sql.SQL("CREATE INDEX IF NOT EXISTS {name} ON ONLY translation_runs {columns};").format(
+            name=sql.Identifier(name),
+            columns=sql.SQL(columns),
+        )
+    )
+    cur.execute(
+        """
+        SELECT child.relname AS partition
+        FROM pg_inherits inh
+        JOIN pg_class child ON child.oid = inh.inhrelid
+        WHERE inh.inhparent = 'translation_runs'::regclass
+          AND NOT EXISTS (
+              SELECT 1
+              FROM pg_inherits idx
+              JOIN pg_index i ON i.indexrelid = idx.inhrelid
+              WHERE idx.inhparent = %s::regclass AND i.indrelid = child.oid
+          )
+        ORDER BY child.relname;
+        """,
+        (name,),
+    )
+    for row in cur.fetchall():
+        partition_index = f"{row['partition']}_{name.removeprefix('translation_runs_')}"[:63]
+        _build_index_concurrently(cur, partition_index, row["partition"], columns)
+        cur.execute(
+            sql.SQL("ALTER INDEX {parent} ATTACH PARTITION {child};").format(
+                parent=sql.Identifier(name),
+                child=sql.Identifier(partition_index),
+            )
+        )
+    return True
+
+
+def _apply_ddl(conn, ddl: str) -> None:
+    cur = conn.cursor()
+    try:
+        conn.autocommit = False
+        cur.execute("SET LOCAL lock_timeout = %s;", (MIGRATION_LOCK_TIMEOUT,))
+        cur.execute(ddl)
+        conn.commit()
+    finally:
+        cur.close()
+        conn.autocommit = True
+
+
+def _migrate_table(
+    conn,
+    table: str,
+    ddl: str,
+    indexes: dict[str, str],
+    obsolete_indexes: tuple[str, ...] = (),
+) -> list[str]:
+    """
+    Apply `ddl` under the lock timeout, then build `indexes` and drop
+    `obsolete_indexes` concurrently.
+    """
+    _apply_ddl(conn, ddl)
+
+    cur = conn.cursor()
+    try:
+        applied = [
+            f"index {name}"
+            for name, columns in indexes.items()
+            if _build_index_concurrently(cur, name, table, columns)
+        ]
+        for name in obsolete_indexes:
+            if _index_state(cur, name) is not None:
+                cur.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {name};").format(name=sql.Identifier(name)))
+                applied.append(f"dropped index {name}")
+        return applied
+    finally:
+        cur.close()
+
+
+def migrate_translation_runs(conn) -> list[str]:
+    cur = conn.cursor()
+    try:
+        conn.autocommit = False
+        cur.execute("SET LOCAL lock_timeout = %s;", (MIGRATION_LOCK_TIMEOUT,))
+        cur.execute(TRANSLATION_RUNS_DDL)
+        conn.commit()
+
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+        conn.autocommit = True
+        partitioned = _is_partitioned(cur)
+        built = []
+        for name, columns in TRANSLATION_RUNS_INDEXES.items():
+            if partitioned:
+                changed = _build_partitioned_index(cur, name, columns)
+            else:
+                changed = _build_index_concurrently(cur, name, "translation_runs", columns)
+            if changed:
+                built.append(name)
+        return built
+    finally:
+        cur.close()
+
+
+def migrate_app_secrets(conn) -> list[str]:
+    cur = conn.cursor()
+    try:
+        conn.autocommit = False
+        cur.execute("SET LOCAL lock_timeout = %s;", (MIGRATION_LOCK_TIMEOUT,))
+        cur.execute(APPS_DDL)
+        # One-way: plaintext secrets from older rows are hashed and cleared.
+        cur.execute(
+            """
+            UPDATE apps
+            SET client_secret_hash = encode(sha256(convert_to(client_secret, 'UTF8')), 'hex'),
+                client_secret = NULL
+            WHERE client_secret IS NOT NULL;
+            """
+        )
+        hashed = cur.rowcount
+        conn.commit()
+
+        conn.autocommit = True
+        applied = [f"hashed {hashed} app secrets"] if hashed else []
+        if _build_index_concurrently(cur, "apps_client_id_idx", "apps", "(client_id)"):
+            applied.append("index apps_client_id_idx")
+        return applied
+    finally:
+        cur.close()
+
+
+def run_migrations() -> list[str]:
+    """
+    Apply schema changes that must not run on request paths. Safe to rerun;
+    run it at deploy before the new code starts serving.
+    """
+    conn = get_db_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT pg_advisory_lock(hashtext(%s));", (_ADVISORY_LOCK_KEY,))
+        applied = [f"index {name}" for name in migrate_translation_runs(conn)]
+        applied += migrate_app_secrets(conn)
+        applied += _migrate_table(
+            conn,
+            "partner_mappings",
+            PARTNER_MAPPINGS_DDL,
+            PARTNER_MAPPINGS_INDEXES,
+            PARTNER_MAPPINGS_OBSOLETE_INDEXES,
+        )
+        applied += _migrate_table(conn, "workspaces", WORKSPACES_DDL, {})
+        applied += _migrate_table(conn, "api_keys", API_KEYS_DDL, API_KEYS_INDEXES)
+        applied += _migrate_table(conn, "api_key_usage", USAGE_DDL, {})
+        applied += _migrate_table(conn, "rate_limit_buckets", RATE_LIMIT_BUCKETS_DDL, {})
+        applied += _migrate_table(conn, "revoked_sessions", REVOKED_SESSIONS_DDL, {})
+        return applied
+    finally:
+        cur.close()
+        conn.close()
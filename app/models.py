@@ -17,6 +17,13 @@ class TranslateRequest(BaseModel):
     constraints: Optional[str] = Field(None, description="Optional constraints (e.g., 'no jargon', 'bullet points').")
     mode: Mode = Field("basic", description="basic = rule-based, ai = AI-enhanced (pro only)")
     persona: Optional[Persona] = Field(None, description="Persona targeting (used by AI mode)")
+    workspace_id: Optional[int] = Field(
+        None,
+        description=(
+            "Workspace whose uploaded partner dataset is used for impact mapping. "
+            "Must be the workspace of the calling API key."
+        ),
+    )
     partner_accounts: List["PartnerAccount"] = Field(
         default_factory=list,
         description="Optional partner catalog with known OAuth/API scopes for impact mapping.",
@@ -51,6 +58,7 @@ class TranslateResponse(BaseModel):
     follow_up_questions: List[str] = Field(default_factory=list)
     extracted_changes: List[ExtractedChange] = Field(default_factory=list)
     impact_level: ImpactLevel = "low"
+    impacted_partners: List[str] = Field(default_factory=list)
     ai_enhancement: Optional[AIEnhancement] = None
     ai_provider: Optional[str] = None
     ai_fallback_used: bool = False
@@ -0,0 +1,347 @@
+import gzip
+import json
+import os
+import re
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+from psycopg2 import sql
+
+from app.db import get_db_connection, create_translation_runs_indexes, _hydrate_payloads
+
+PARTITION_NAME_PATTERN = re.compile(r"^translation_runs_y(\d{4})m(\d{2})$")
+
+
+def _month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(value: date, months: int) -> date:
+    index = value.year * 12 + (value.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_name(month: date) -> str:
+    return f"translation_runs_y{month.year:04d}m{month.month:02d}"
+
+
+def _partition_month(name: str) -> date | None:
+    match = PARTITION_NAME_PATTERN.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def _utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def _is_partitioned(cur) -> bool:
+    cur.execute(
+        """
+        SELECT c.relkind
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relname = 'translation_runs' AND n.nspname = current_schema();
+        """
+    )
+    row = cur.fetchone()
+    return bool(row) and row["relkind"] == "p"
+
+
+def _create_month_partition(cur, month: date) -> bool:
+    name = _partition_name(month)
+    cur.execute("SELECT to_regclass(%s) AS existing;", (name,))
+    if cur.fetchone()["existing"]:
+        return False
+
+    cur.execute(
+        sql.SQL(
+            """
+            CREATE TABLE {name}
+            PARTITION OF translation_runs
+            FOR VALUES FROM (%s) TO (%s);
+            """
+        ).format(name=sql.Identifier(name)),
+        (
+            datetime.combine(month, datetime.min.time(), tzinfo=timezone.utc),
+            datetime.combine(_add_months(month, 1), datetime.min.time(), tzinfo=timezone.utc),
+        ),
+    )
+    return True
+
+
+def convert_translation_runs_to_partitioned(months_ahead: int = 3) -> dict:
+    """
+    One-time migration of `translation_runs` to a table partitioned by month
+    on `created_at`.
+
+    The existing table is renamed to `translation_runs_legacy` and its rows
+    are copied into the new layout in the same transaction. The legacy table
+    is kept so it can be verified and dropped by an operator.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        if _is_partitioned(cur):
+            return {"converted": False, "reason": "translation_runs is already partitioned"}
+
+        cur.execute("LOCK TABLE translation_runs IN ACCESS EXCLUSIVE MODE;")
+
+        # Index names (including the primary key's) are schema-wide, so the
+        # legacy ones must move out of the way before the partitioned table
+        # recreates them.
+        cur.execute(
+            """
+            SELECT indexname
+            FROM pg_indexes
+            WHERE tablename = 'translation_runs' AND schemaname = current_schema();
+            """
+        )
+        for row in cur.fetchall():
+            cur.execute(
+                sql.SQL("ALTER INDEX {old} RENAME TO {new};").format(
+                    old=sql.Identifier(row["indexname"]),
+                    new=sql.Identifier(f"{row['indexname'][:55]}_legacy"),
+                )
+            )
+        cur.execute("ALTER TABLE translation_runs RENAME TO translation_runs_legacy;")
+        cur.execute(
+            """
+            CREATE TABLE translation_runs (
+                LIKE translation_runs_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+            ) PARTITION BY RANGE (created_at);
+
+            ALTER TABLE translation_runs ALTER COLUMN created_at SET DEFAULT now();
+            ALTER TABLE translation_runs ALTER COLUMN created_at SET NOT NULL;
+            ALTER TABLE translation_runs ADD PRIMARY KEY (id, created_at);
+
+            CREATE SEQUENCE translation_runs_partitioned_id_seq OWNED BY translation_runs.id;
+            ALTER TABLE translation_runs
+                ALTER COLUMN id SET DEFAULT nextval('translation_runs_partitioned_id_seq');
+
+            CREATE TABLE translation_runs_default PARTITION OF translation_runs DEFAULT;
+            """
+        )
+
+        cur.execute(
+            """
+            SELECT
+                MIN(created_at) AS first_created_at,
+                COALESCE(MAX(id), 0) AS max_id
+            FROM translation_runs_legacy;
+            """
+        )
+        bounds = cur.fetchone()
+
+        first_month = _month_start(
+            bounds["first_created_at"].astimezone(timezone.utc).date()
+            if bounds["first_created_at"]
+            else _utc_today()
+        )
+        last_month = _add_months(_month_start(_utc_today()), months_ahead)
+
+        month = first_month
+        created = 0
+        while month <= last_month:
+            created += int(_create_month_partition(cur, month))
+            month = _add_months(month, 1)
+
+        create_translation_runs_indexes(cur)
+
+        cur.execute("INSERT INTO translation_runs SELECT * FROM translation_runs_legacy;")
+        copied = cur.rowcount
+
+        if bounds["max_id"]:
+            cur.execute(
+                "SELECT setval('translation_runs_partitioned_id_seq', %s);",
+                (bounds["max_id"],),
+            )
+
+        conn.commit()
+
+        return {"converted": True, "partitions_created": created, "rows_copied": copied}
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        cur.close()
+        conn.close()
+
+
+def ensure_future_partitions(months_ahead: int = 3) -> list[str]:
+    """
+    Create monthly partitions from the current month through `months_ahead`
+    months ahead so inserts never land in the default partition.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        if not _is_partitioned(cur):
+            raise RuntimeError(
+                "translation_runs is not partitioned; run `python -m app.maintenance partition-runs` first"
+            )
+
+        created: list[str] = []
+        month = _month_start(_utc_today())
+        for _ in range(months_ahead + 1):
+            if _create_month_partition(cur, month):
+                created.append(_partition_name(month))
+            month = _add_months(month, 1)
+
+        conn.commit()
+        return created
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _list_month_partitions(cur) -> list[tuple[str, date]]:
+    cur.execute(
+        """
+        SELECT child.relname AS name
+        FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE parent.relname = 'translation_runs';
+        """
+    )
+
+    partitions: list[tuple[str, date]] = []
+    for row in cur.fetchall():
+        month = _partition_month(row["name"])
+        if month:
+            partitions.append((row["name"], month))
+
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def _export_partition(conn, name: str, target: Path) -> int:
+    export_cur = conn.cursor(name=f"export_{name}")
+    export_cur.itersize = 5000
+
+    tmp_target = target.with_name(target.name + ".tmp")
+    exported = 0
+
+    try:
+        export_cur.execute(
+            sql.SQL(
+                """
+                SELECT
+                    (to_jsonb(t) - 'raw_text_hash' - 'response_hash')::text AS line,
+                    raw_text_payload.codec AS raw_text_codec,
+                    raw_text_payload.data AS raw_text_data,
+                    response_json_payload.codec AS response_json_codec,
+                    response_json_payload.data AS response_json_data
+                FROM {name} t
+                LEFT JOIN translation_payloads raw_text_payload
+                    ON raw_text_payload.hash = t.raw_text_hash
+                LEFT JOIN translation_payloads response_json_payload
+                    ON response_json_payload.hash = t.response_hash
+                ORDER BY t.id;
+                """
+            ).format(name=sql.Identifier(name))
+        )
+
+        with gzip.open(tmp_target, "wt", encoding="utf-8") as f:
+            for row in export_cur:
+                line = row["line"]
+                if row["raw_text_data"] is not None or row["response_json_data"] is not None:
+                    record = json.loads(line)
+                    payloads = _hydrate_payloads({
+                        "raw_text": record.get("raw_text"),
+                        "raw_text_codec": row["raw_text_codec"],
+                        "raw_text_data": row["raw_text_data"],
+                        "response_json": record.get("response_json"),
+                        "response_json_codec": row["response_json_codec"],
+                        "response_json_data": row["response_json_data"],
+                    })
+                    record.update(payloads)
+                    line = json.dumps(record)
+
+                f.write(line)
+                f.write("\n")
+                exported += 1
+
+        with tmp_target.open("rb") as f:
+            os.fsync(f.fileno())
+
+        tmp_target.replace(target)
+
+    finally:
+        export_cur.close()
+        if tmp_target.exists():
+            tmp_target.unlink()
+
+    return exported
+
+
+def archive_expired_partitions(retention_months: int, archive_dir: str) -> list[dict]:
+    """
+    Export monthly partitions older than `retention_months` to
+    `<archive_dir>/<partition>.ndjson.gz` and drop them.
+
+    Each partition is exported, fsynced and atomically renamed into place
+    before it is detached and dropped, so a failure never loses rows.
+    Payloads are inlined into the exported rows. Rollups in
+    `translation_run_rollups` are kept, so metrics history survives archival.
+    """
+    if retention_months < 1:
+        raise ValueError("retention_months must be at least 1")
+
+    target_dir = Path(archive_dir)
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    cutoff = _add_months(_month_start(_utc_today()), -retention_months)
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    archived: list[dict] = []
+
+    try:
+        if not _is_partitioned(cur):
+            raise RuntimeError(
+                "translation_runs is not partitioned; run `python -m app.maintenance partition-runs` first"
+            )
+
+        expired = [(name, month) for name, month in _list_month_partitions(cur) if month < cutoff]
+        conn.commit()
+
+        for name, month in expired:
+            target = target_dir / f"{name}.ndjson.gz"
+            exported = _export_partition(conn, name, target)
+
+            cur.execute(
+                sql.SQL("ALTER TABLE translation_runs DETACH PARTITION {name};").format(
+                    name=sql.Identifier(name)
+                )
+            )
+            cur.execute(sql.SQL("DROP TABLE {name};").format(name=sql.Identifier(name)))
+            conn.commit()
+
+            archived.append({
+                "partition": name,
+                "month": month.isoformat(),
+                "rows": exported,
+                "file": str(target),
+            })
+
+        return archived
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        cur.close()
+        conn.close()
@@ -1,27 +1,165 @@
+import hashlib
 import json
-from functools import lru_cache
+import os
+import stat
+import struct
+import tempfile
+import threading
+import time
 from pathlib import Path
 from typing import List
 
+from .catalog_index import CatalogIndex, compile_catalog_index
+from .logs import get_logger
+from .workspace_index import get_workspace_index
 
-@lru_cache(maxsize=1)
-def _load_catalog() -> list[dict]:
-    catalog_path = Path(__file__).resolve().parent / "data" / "partners_by_scope.json"
-    with catalog_path.open("r", encoding="utf-8") as f:
-        payload = json.load(f)
-    return payload.get("partners", [])
+log = get_logger(__name__)
+
+CATALOG_PATH = Path(
+    os.getenv("PARTNER_CATALOG_PATH", str(Path(__file__).resolve().parent / "data" / "partners_by_scope.json"))
+)
+
+
+def _private_index_dir() -> Path:
+    """
+    A directory under the system temp dir that only this user can write to,
+    shared by the user's workers. If the name is taken by someone else, a
+    fresh per-process directory is used instead, so nobody else can plant
+    or swap the index.
+    """
+    path = Path(tempfile.gettempdir()) / f"partner-catalog-{os.getuid()}"
+    try:
+        path.mkdir(mode=0o700)
+    except FileExistsError:
+        pass
+
+    st = os.lstat(path)
+    if stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid() and not st.st_mode & 0o077:
+        return path
+
+    fallback = Path(tempfile.mkdtemp(prefix="partner-catalog-", dir=tempfile.gettempdir()))
+    log.warning("catalog.index_dir_untrusted", path=str(path), fallback=str(fallback))
+    return fallback
+
+
+# Shared by every worker on the host; keyed by the source path so several
+# deployments on one machine do not collide.
+CATALOG_INDEX_PATH = Path(
+    os.getenv("PARTNER_CATALOG_INDEX_PATH")
+    or _private_index_dir() / f"partners_by_scope.{hashlib.sha256(str(CATALOG_PATH).encode()).hexdigest()[:12]}.pcidx"
+)
+CATALOG_CHECK_INTERVAL_SECONDS = float(os.getenv("PARTNER_CATALOG_CHECK_INTERVAL_SECONDS", "5"))
+
+_INDEX: CatalogIndex | None = None
+_SOURCE_STAT: tuple[int, int] | None = None
+_CHECKED_AT = 0.0
+_LOCK = threading.Lock()
+
+
+def _source_sha256(path: Path) -> bytes:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+def _open_catalog_index(source_stat: os.stat_result) -> CatalogIndex:
+    """
+    Map the compiled index for the current catalog source, compiling it
+    first when it is missing or was built from different content.
+    """
+    try:
+        index = CatalogIndex(CATALOG_INDEX_PATH)
+    except (OSError, ValueError, struct.error):
+        index = None
+
+    if index is not None and (index.source_mtime_ns, index.source_size) == (
+        source_stat.st_mtime_ns,
+        source_stat.st_size,
+    ):
+        return index
+
+    source_sha256 = _source_sha256(CATALOG_PATH)
+    if index is not None and index.source_sha256 == source_sha256:
+        return index
+
+    with CATALOG_PATH.open("r", encoding="utf-8") as f:
+        partners = json.load(f).get("partners", [])
+
+    compile_catalog_index(
+        partners,
+        CATALOG_INDEX_PATH,
+        source_sha256=source_sha256,
+        source_mtime_ns=source_stat.st_mtime_ns,
+        source_size=source_stat.st_size,
+    )
+    return CatalogIndex(CATALOG_INDEX_PATH)
+
+
+def _get_catalog_index() -> CatalogIndex:
+    """
+    Current catalog index. The source file is checked at most every
+    `CATALOG_CHECK_INTERVAL_SECONDS`; when it changed, the new index is
+    swapped in atomically. Lookups already holding the previous index finish
+    on it, and its mapping is released once they drop it.
+    """
+    global _INDEX, _SOURCE_STAT, _CHECKED_AT
+
+    index = _INDEX
+    now = time.monotonic()
+    if index is not None and now - _CHECKED_AT < CATALOG_CHECK_INTERVAL_SECONDS:
+        return index
+
+    with _LOCK:
+        if _INDEX is not None and now - _CHECKED_AT < CATALOG_CHECK_INTERVAL_SECONDS:
+            return _INDEX
+
+        try:
+            source_stat = CATALOG_PATH.stat()
+            stat_key = (source_stat.st_mtime_ns, source_stat.st_size)
+            if _INDEX is None or stat_key != _SOURCE_STAT:
+                _INDEX = _open_catalog_index(source_stat)
+                _SOURCE_STAT = stat_key
+        except Exception as e:
+            if _INDEX is None:
+                raise
+            # Keep serving the last good catalog, e.g. while the source is
+            # being rewritten.
+            log.warning("catalog.reload_failed", error=f"{type(e).__name__}: {e}")
+
+        _CHECKED_AT = now
+        return _INDEX
 
 
 def impacted_partners_for_scopes(scopes: List[str]) -> List[str]:
     if not scopes:
         return []
 
-    scope_set = {s.strip().lower() for s in scopes if s.strip()}
-    impacted: list[str] = []
+    index = _get_catalog_index()
+    return [index.partner_name(position) for position in index.lookup(scopes)]
+
+
+def catalog_index_stats() -> dict:
+    return _get_catalog_index().stats()
+
+
+def impacted_partners_for_workspace(workspace_id: int | None, scopes: List[str]) -> List[str]:
+    """
+    Impacted partners from the workspace's uploaded dataset when one exists,
+    otherwise from the static catalog.
+    """
+    if not scopes:
+        return []
+
+    if workspace_id is not None:
+        try:
+            workspace_index = get_workspace_index(workspace_id)
+        except Exception as e:
+            log.warning("workspace_index.load_failed", workspace_id=workspace_id, error=f"{type(e).__name__}: {e}")
+            return []
 
-    for partner in _load_catalog():
-        partner_scopes = {s.strip().lower() for s in partner.get("scopes", []) if s.strip()}
-        if scope_set.intersection(partner_scopes):
-            impacted.append(partner.get("name", "Unknown Partner"))
+        if workspace_index.rows:
+            return workspace_index.impacted_partner_names(scopes)
 
-    return impacted
+    return impacted_partners_for_scopes(scopes)
@@ -1,24 +1,49 @@
+import base64
 import csv
+import hashlib
 import io
 import json
-from typing import Any, Optional
-
-from fastapi import APIRouter, HTTPException
+from bisect import bisect_right
+from datetime import datetime
+from itertools import groupby
+from typing import Any, Iterable, Iterator, Literal, Optional
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from psycopg2 import sql
 from pydantic import BaseModel, Field
 
+from app.admission import admit_upload
 from app.db import get_db_connection
+from app.sessions import SessionClaims, authorize_workspace, optional_session
+from app.translator import detect_scopes, extract_changes, normalize_text, split_into_lines
+from app.workspace_index import (
+    WorkspacePartnerIndex,
+    get_workspace_index,
+    invalidate_workspace_index,
+    notify_workspace_changed,
+)
 
 router = APIRouter(prefix="/partners", tags=["partners"])
 
 
+UploadMode = Literal["replace", "merge"]
+
+DEFAULT_MERGE_KEY = ["partner_name", "area"]
+
+
 class UploadCsvRequest(BaseModel):
     workspace_id: int
     csv_text: str = Field(..., min_length=1)
+    mode: UploadMode = "replace"
+    merge_key: list[str] = Field(default_factory=lambda: list(DEFAULT_MERGE_KEY))
 
 
 class UploadJsonRequest(BaseModel):
     workspace_id: int
     rows: list[dict[str, Any]]
+    mode: UploadMode = "replace"
+    merge_key: list[str] = Field(default_factory=lambda: list(DEFAULT_MERGE_KEY))
 
 
 class UpdatePartnerRequest(BaseModel):
@@ -33,8 +58,22 @@ class CreatePartnerRequest(BaseModel):
     row_data: dict[str, Any]
 
 
+class ImpactRequest(BaseModel):
+    raw_text: str = Field(..., min_length=1)
+    product_area: Optional[str] = None
+    cursor: Optional[int] = Field(None, description="Last row id from the previous page.")
+    limit: int = Field(500, ge=1, le=5000)
+    impacted_only: bool = False
+    stream: bool = Field(False, description="Stream every row as NDJSON instead of returning one page.")
+
+
 @router.post("/create")
-def create_partner(req: CreatePartnerRequest):
+def create_partner(
+    req: CreatePartnerRequest,
+    session: Optional[SessionClaims] = Depends(optional_session),
+):
+    authorize_workspace(session, req.workspace_id)
+
     conn = get_db_connection()
     cur = conn.cursor()
 
@@ -67,6 +106,7 @@ def create_partner(req: CreatePartnerRequest):
 
         exact_extra = _build_extra_from_active_columns(row_data, active_columns)
         normalized = _normalize_partner_row(exact_extra)
+        version = _next_dataset_version(cur, workspace_id)
 
         cur.execute(
             """
@@ -77,9 +117,11 @@ def create_partner(req: CreatePartnerRequest):
                 scopes,
                 area,
                 status,
-                extra
+                extra,
+                created_version,
+                updated_version
             )
-            VALUES (%s, %s, %s, %s::jsonb, %s, %s, %s::jsonb)
+            VALUES (%s, %s, %s, %s::jsonb, %s, %s, %s::jsonb, %s, %s)
             RETURNING id, workspace_id, upload_id, partner_name, scopes, area, status, extra, created_at;
             """,
             (
@@ -90,14 +132,19 @@ def create_partner(req: CreatePartnerRequest):
                 normalized["area"],
                 normalized["status"],
                 json.dumps(exact_extra),
+                version,
+                version,
             ),
         )
 
         result = cur.fetchone()
+        notify_workspace_changed(cur, workspace_id)
         conn.commit()
+        invalidate_workspace_index(workspace_id)
 
         return {
             "success": True,
+            "version": version,
             "row": _build_dynamic_row(result, active_columns),
         }
 
@@ -163,101 +210,6 @@ def _normalize_scopes(value: Any) -> list[str]:
     return []
 
 
-def _normalize_row_keys(row: dict[str, Any]) -> dict[str, Any]:
-    normalized: dict[str, Any] = {}
-    for key, value in row.items():
-        cleaned_key = _clean_string(key)
-        if cleaned_key:
-            normalized[cleaned_key] = value
-    return normalized
-
-
-def _lower_key_map(row: dict[str, Any]) -> dict[str, Any]:
-    lowered: dict[str, Any] = {}
-    for key, value in row.items():
-        cleaned_key = _clean_key(key)
-        if cleaned_key:
-            lowered[cleaned_key] = value
-    return lowered
-
-
-def _pick_first(row: dict[str, Any], keys: list[str]) -> Any:
-    lowered = _lower_key_map(row)
-    for key in keys:
-        if key in lowered:
-            return lowered[key]
-    return None
-
-
-def _best_effort_partner_name(row: dict[str, Any]) -> str:
-    candidate = _pick_first(
-        row,
-        [
-            "partner_name",
-            "partner",
-            "name",
-            "customer",
-            "customer_name",
-            "account",
-            "account_name",
-            "organization",
-            "org",
-            "company",
-            "client",
-        ],
-    )
-    cleaned = _clean_string(candidate)
-    return cleaned or "Unknown"
-
-
-def _best_effort_scopes(row: dict[str, Any]) -> list[str]:
-    candidate = _pick_first(
-        row,
-        [
-            "scopes",
-            "scope",
-            "permissions",
-            "permission_scopes",
-            "oauth_scopes",
-            "api_scopes",
-            "capabilities",
-        ],
-    )
-    return _normalize_scopes(candidate)
-
-
-def _best_effort_area(row: dict[str, Any]) -> str:
-    candidate = _pick_first(
-        row,
-        [
-            "area",
-            "product_area",
-            "domain",
-            "module",
-            "service",
-            "team",
-            "product",
-            "feature_area",
-        ],
-    )
-    return _clean_string(candidate)
-
-
-def _best_effort_status(row: dict[str, Any]) -> str:
-    candidate = _pick_first(
-        row,
-        [
-            "status",
-            "state",
-            "mapping_status",
-            "health",
-            "condition",
-        ],
-    )
-    cleaned = _clean_string(candidate)
-    return cleaned or "mapped"
-
-
 def _dynamic_columns_from_rows(rows: list[dict[str, Any]]) -> list[str]:
     seen: set[str] = set()
     ordered: list[str] = []
@@ -281,6 +233,137 @@ def _ensure_partner_uploads_columns_order_column(cur) -> None:
     )
 
 
+# Dataset versioning and the indexes behind `/partners/list`, applied by
+# `python -m app.maintenance migrate`; request handlers assume they exist.
+#
+# Every write to a workspace dataset takes the next version from
+# `partner_dataset_versions` (which also serializes writers per workspace)
+# and stamps it on the rows it inserts or updates. Deleted row ids are kept
+# in `partner_mapping_tombstones`; replace uploads and resets record
+# `reset_version` instead, since every row changes.
+# `prune_partner_tombstones` moves `reset_version` past pruned tombstones.
+PARTNER_MAPPINGS_DDL = """
+    ALTER TABLE partner_mappings
+        ADD COLUMN IF NOT EXISTS created_version BIGINT NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS updated_version BIGINT NOT NULL DEFAULT 0;
+
+    CREATE TABLE IF NOT EXISTS partner_dataset_versions (
+        workspace_id INTEGER PRIMARY KEY,
+        version BIGINT NOT NULL,
+        reset_version BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+
+    CREATE TABLE IF NOT EXISTS partner_mapping_tombstones (
+        workspace_id INTEGER NOT NULL,
+        row_id INTEGER NOT NULL,
+        version BIGINT NOT NULL,
+        deleted_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (workspace_id, version, row_id)
+    );
+    ALTER TABLE partner_mapping_tombstones
+        ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ NOT NULL DEFAULT now();
+"""
+
+# Built with CREATE INDEX CONCURRENTLY by `python -m app.maintenance migrate`.
+PARTNER_MAPPINGS_INDEXES = {
+    "partner_mappings_workspace_id_idx": "(workspace_id, id)",
+    # Text sorts page on COALESCE(column, ''); see `_sort_key_sql`.
+    "partner_mappings_workspace_partner_name_key_idx": "(workspace_id, COALESCE(partner_name, ''), id)",
+    "partner_mappings_workspace_area_key_idx": "(workspace_id, COALESCE(area, ''), id)",
+    "partner_mappings_workspace_status_key_idx": "(workspace_id, COALESCE(status, ''), id)",
+    "partner_mappings_workspace_created_at_idx": "(workspace_id, created_at, id)",
+    "partner_mappings_workspace_updated_version_idx": "(workspace_id, updated_version)",
+    "partner_mappings_scopes_idx": "USING GIN (scopes jsonb_path_ops)",
+    # The case-insensitive `partner_name` prefix filter.
+    "partner_mappings_workspace_name_prefix_idx": "(workspace_id, lower(partner_name) text_pattern_ops)",
+}
+# Replaced by the indexes above; dropped concurrently by the migration.
+PARTNER_MAPPINGS_OBSOLETE_INDEXES = (
+    "partner_mappings_workspace_partner_name_idx",
+    "partner_mappings_workspace_area_idx",
+    "partner_mappings_workspace_status_idx",
+)
+
+
+def _next_dataset_version(cur, workspace_id: int, reset: bool = False) -> int:
+    """
+    Take the next dataset version for a write. The version row stays locked
+    until the caller commits, so versions become visible in order.
+    """
+    cur.execute(
+        """
+        INSERT INTO partner_dataset_versions AS v (workspace_id, version, reset_version)
+        VALUES (%(workspace_id)s, 1, CASE WHEN %(reset)s THEN 1 ELSE 0 END)
+        ON CONFLICT (workspace_id) DO UPDATE
+        SET version = v.version + 1,
+            reset_version = CASE WHEN %(reset)s THEN v.version + 1 ELSE v.reset_version END,
+            updated_at = now()
+        RETURNING version;
+        """,
+        {"workspace_id": workspace_id, "reset": reset},
+    )
+    version = cur.fetchone()["version"]
+
+    if reset:
+        cur.execute("DELETE FROM partner_mapping_tombstones WHERE workspace_id = %s;", (workspace_id,))
+
+    return version
+
+
+def _lock_dataset_version(cur, workspace_id: int) -> int:
+    """
+    Lock the version row like `_next_dataset_version` without bumping it,
+    for writes that may turn out to change nothing. Returns the current
+    version; commit `_set_dataset_version` with the next one if they do.
+    """
+    cur.execute(
+        """
+        INSERT INTO partner_dataset_versions (workspace_id, version)
+        VALUES (%s, 0)
+        ON CONFLICT (workspace_id) DO NOTHING;
+        """,
+        (workspace_id,),
+    )
+    cur.execute(
+        """
+        SELECT version
+        FROM partner_dataset_versions
+        WHERE workspace_id = %s
+        FOR UPDATE;
+        """,
+        (workspace_id,),
+    )
+    return cur.fetchone()["version"]
+
+
+def _set_dataset_version(cur, workspace_id: int, version: int) -> None:
+    cur.execute(
+        """
+        UPDATE partner_dataset_versions
+        SET version = %s,
+            updated_at = now()
+        WHERE workspace_id = %s;
+        """,
+        (version, workspace_id),
+    )
+
+
+def _get_dataset_version(cur, workspace_id: int) -> dict[str, int]:
+    cur.execute(
+        """
+        SELECT version, reset_version
+        FROM partner_dataset_versions
+        WHERE workspace_id = %s;
+        """,
+        (workspace_id,),
+    )
+    row = cur.fetchone()
+    if not row:
+        return {"version": 0, "reset_version": 0}
+    return {"version": row["version"], "reset_version": row["reset_version"]}
+
+
 def _get_active_columns_for_workspace(cur, workspace_id: int) -> list[str]:
     _ensure_partner_uploads_columns_order_column(cur)
 
@@ -316,9 +399,9 @@ def _get_active_columns_for_workspace(cur, workspace_id: int) -> list[str]:
 
 _COLUMN_ALIASES: dict[str, list[str]] = {
     "partner": [
+        "partner_name",
         "partner",
         "partner name",
-        "partner_name",
         "name",
         "customer",
         "customer_name",
@@ -358,13 +441,26 @@ _COLUMN_ALIASES: dict[str, list[str]] = {
 }
 
 
-def _get_row_value_for_active_column(row_data: dict[str, Any], active_column: str) -> str:
-    lowered_input: dict[str, Any] = {}
-    for key, value in row_data.items():
+# Canonical partner_mappings column -> `_COLUMN_ALIASES` group, in the
+# order uploads are checked for them.
+_CANONICAL_FIELDS: dict[str, str] = {
+    "partner_name": "partner",
+    "scopes": "scopes",
+    "area": "area",
+    "status": "status",
+}
+
+
+def _lower_key_map(row: dict[str, Any]) -> dict[str, Any]:
+    lowered: dict[str, Any] = {}
+    for key, value in row.items():
         cleaned_key = _clean_key(key)
         if cleaned_key:
-            lowered_input[cleaned_key] = value
+            lowered[cleaned_key] = value
+    return lowered
 
+
+def _get_row_value_for_active_column(lowered_input: dict[str, Any], active_column: str) -> str:
     target = _clean_key(active_column)
 
     if target in lowered_input:
@@ -383,8 +479,9 @@ def _build_extra_from_active_columns(
     row_data: dict[str, Any],
     active_columns: list[str],
 ) -> dict[str, Any]:
+    lowered_input = _lower_key_map(row_data)
     return {
-        column: _get_row_value_for_active_column(row_data, column)
+        column: _get_row_value_for_active_column(lowered_input, column)
         for column in active_columns
     }
 
@@ -410,22 +507,104 @@ def _build_dynamic_row(
     }
 
 
-def _normalize_partner_row(row: dict[str, Any]) -> dict[str, Any]:
-    raw_row = _normalize_row_keys(row)
+class _PartnerRowNormalizer:
+    """
+    Maps one header layout onto the canonical partner columns.
 
-    cleaned_extra = {
-        _clean_string(key): _clean_string(value)
-        for key, value in raw_row.items()
-        if _clean_string(key)
-    }
+    Aliases are resolved once, when the normalizer is built from the
+    header; rows are then value lists in header order and are normalized a
+    batch at a time, column by column, with direct index lookups.
+    """
 
-    return {
-        "partner_name": _best_effort_partner_name(raw_row),
-        "scopes": _best_effort_scopes(raw_row),
-        "area": _best_effort_area(raw_row),
-        "status": _best_effort_status(raw_row),
-        "extra": cleaned_extra,
-    }
+    def __init__(self, headers: list[Any]):
+        # Same semantics as a dict keyed by the cleaned headers: blank keys
+        # are dropped and a repeated key keeps its last column.
+        extra_positions: dict[str, int] = {}
+        for position, header in enumerate(headers):
+            key = _clean_string(header)
+            if key:
+                extra_positions[key] = position
+
+        lowered_positions = {key.lower(): position for key, position in extra_positions.items()}
+
+        self.extra_keys = list(extra_positions)
+        self.extra_positions = list(extra_positions.values())
+        self.field_positions: dict[str, Optional[int]] = {
+            field: next(
+                (
+                    lowered_positions[alias]
+                    for alias in _COLUMN_ALIASES[group]
+                    if alias in lowered_positions
+                ),
+                None,
+            )
+            for field, group in _CANONICAL_FIELDS.items()
+        }
+
+    def normalize_batch(self, rows: list[list[Any]]) -> list[dict[str, Any]]:
+        if not rows:
+            return []
+
+        count = len(rows)
+        columns = list(zip(*rows))
+        cleaned = {position: list(map(_clean_string, columns[position])) for position in self.extra_positions}
+
+        def cleaned_field(field: str) -> list[str]:
+            position = self.field_positions[field]
+            return cleaned[position] if position is not None else [""] * count
+
+        scopes_position = self.field_positions["scopes"]
+        scopes = (
+            list(map(_normalize_scopes, columns[scopes_position]))
+            if scopes_position is not None
+            else [[] for _ in range(count)]
+        )
+
+        if self.extra_positions:
+            extras = [
+                dict(zip(self.extra_keys, values))
+                for values in zip(*(cleaned[position] for position in self.extra_positions))
+            ]
+        else:
+            extras = [{} for _ in range(count)]
+
+        return [
+            {
+                "partner_name": partner_name or "Unknown",
+                "scopes": row_scopes,
+                "area": area,
+                "status": status or "mapped",
+                "extra": extra,
+            }
+            for partner_name, row_scopes, area, status, extra in zip(
+                cleaned_field("partner_name"),
+                scopes,
+                cleaned_field("area"),
+                cleaned_field("status"),
+                extras,
+            )
+        ]
+
+
+def _normalize_partner_rows(rows: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    Normalize dict rows (JSON uploads, single creates). Consecutive rows
+    with the same keys share one batch, and each key layout is compiled once.
+    """
+    normalizers: dict[tuple, _PartnerRowNormalizer] = {}
+    normalized: list[dict[str, Any]] = []
+
+    for keys, group in groupby(rows, key=lambda row: tuple(row.keys())):
+        normalizer = normalizers.get(keys)
+        if normalizer is None:
+            normalizer = normalizers[keys] = _PartnerRowNormalizer(list(keys))
+        normalized.extend(normalizer.normalize_batch([list(row.values()) for row in group]))
+
+    return normalized
+
+
+def _normalize_partner_row(row: dict[str, Any]) -> dict[str, Any]:
+    return _normalize_partner_rows([row])[0]
 
 
 def _parse_single_wrapped_csv_row(line: str) -> list[str]:
@@ -436,15 +615,23 @@ def _parse_single_wrapped_csv_row(line: str) -> list[str]:
     return [_clean_string(value) for value in parsed]
 
 
-def _parse_uploaded_csv_rows(csv_text: str) -> tuple[list[str], list[dict[str, Any]]]:
-    normalized_text = csv_text.lstrip("\ufeff").replace("\r\n", "\n").replace("\r", "\n")
-    lines = [line for line in normalized_text.split("\n") if line.strip()]
+def _iter_uploaded_csv_rows(stream) -> tuple[list[str], Iterator[list[str]]]:
+    """
+    Parse an uploaded CSV incrementally with a single `csv.reader`, so
+    quoted fields may contain newlines. Returns the header and a lazy
+    iterator of value lists padded to the header width; memory use does not
+    depend on file size.
+    """
+    reader = csv.reader(stream)
 
-    if not lines:
-        raise HTTPException(status_code=400, detail="CSV must include a header row")
+    raw_header: list[str] = []
+    for record in reader:
+        if any(value.strip() for value in record):
+            raw_header = record
+            break
 
-    header_reader = csv.reader([lines[0]])
-    raw_header = next(header_reader)
+    if not raw_header:
+        raise HTTPException(status_code=400, detail="CSV must include a header row")
 
     if len(raw_header) == 1 and "," in raw_header[0]:
         headers = [_clean_string(part) for part in raw_header[0].split(",")]
@@ -456,19 +643,42 @@ def _parse_uploaded_csv_rows(csv_text: str) -> tuple[list[str], list[dict[str, A
     if not headers:
         raise HTTPException(status_code=400, detail="CSV must include a valid header row")
 
-    parsed_rows: list[dict[str, Any]] = []
+    def rows() -> Iterator[list[str]]:
+        for record in reader:
+            if not any(value.strip() for value in record):
+                continue
+
+            # Some exports wrap each whole line in quotes, which the reader
+            # returns as a single field.
+            if len(record) == 1 and len(headers) > 1 and "," in record[0]:
+                parsed_values = _parse_single_wrapped_csv_row(record[0])
+            else:
+                parsed_values = [_clean_string(value) for value in record]
+
+            if len(parsed_values) < len(headers):
+                parsed_values.extend([""] * (len(headers) - len(parsed_values)))
+            elif len(parsed_values) > len(headers):
+                parsed_values = parsed_values[: len(headers)]
+
+            yield parsed_values
 
-    for line in lines[1:]:
-        parsed_values = _parse_single_wrapped_csv_row(line)
+    return headers, rows()
 
-        if len(parsed_values) < len(headers):
-            parsed_values.extend([""] * (len(headers) - len(parsed_values)))
-        elif len(parsed_values) > len(headers):
-            parsed_values = parsed_values[: len(headers)]
 
-        parsed_rows.append(dict(zip(headers, parsed_values)))
+def _parse_uploaded_csv_rows(csv_text: str) -> tuple[list[str], list[list[str]]]:
+    headers, rows = _iter_uploaded_csv_rows(io.StringIO(csv_text.lstrip("\ufeff"), newline=""))
+    return headers, list(rows)
 
-    return headers, parsed_rows
+
+def _iter_chunks(items: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    chunk: list[Any] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 
 def _replace_workspace_partner_dataset(
@@ -482,6 +692,7 @@ def _replace_workspace_partner_dataset(
 
     try:
         _ensure_partner_uploads_columns_order_column(cur)
+        version = _next_dataset_version(cur, workspace_id, reset=True)
 
         cur.execute(
             """
@@ -522,9 +733,11 @@ def _replace_workspace_partner_dataset(
                     scopes,
                     area,
                     status,
-                    extra
+                    extra,
+                    created_version,
+                    updated_version
                 )
-                VALUES (%s, %s, %s, %s::jsonb, %s, %s, %s::jsonb)
+                VALUES (%s, %s, %s, %s::jsonb, %s, %s, %s::jsonb, %s, %s)
                 RETURNING id, workspace_id, upload_id, partner_name, scopes, area, status, extra, created_at;
                 """,
                 (
@@ -535,17 +748,22 @@ def _replace_workspace_partner_dataset(
                     row["area"],
                     row["status"],
                     json.dumps(row["extra"]),
+                    version,
+                    version,
                 ),
             )
             inserted_rows.append(cur.fetchone())
 
+        notify_workspace_changed(cur, workspace_id)
         conn.commit()
+        invalidate_workspace_index(workspace_id)
 
         dynamic_rows = [_build_dynamic_row(row, source_columns) for row in inserted_rows]
 
         return {
             "success": True,
             "upload_id": upload_id,
+            "version": version,
             "row_count": len(dynamic_rows),
             "columns": source_columns,
             "rows": dynamic_rows,
@@ -560,11 +778,491 @@ def _replace_workspace_partner_dataset(
         conn.close()
 
 
-@router.post("/upload-csv")
-def upload_csv(req: UploadCsvRequest):
+UPLOAD_CHUNK_ROWS = 5000
+
+# COPY's csv format reads an unquoted empty field as NULL, while the INSERT
+# paths store "". Normalized text fields are never None, so they are loaded
+# as "" to match.
+_COPY_CSV_OPTIONS = "FORMAT csv, FORCE_NOT_NULL (partner_name, area, status)"
+
+
+def _copy_partner_rows(
+    cur,
+    workspace_id: int,
+    upload_id: int,
+    normalized_rows: list[dict[str, Any]],
+    version: int,
+) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in normalized_rows:
+        writer.writerow([
+            workspace_id,
+            upload_id,
+            row["partner_name"],
+            json.dumps(row["scopes"]),
+            row["area"],
+            row["status"],
+            json.dumps(row["extra"]),
+            version,
+            version,
+        ])
+    buffer.seek(0)
+
+    cur.copy_expert(
+        f"""
+        COPY partner_mappings (
+            workspace_id, upload_id, partner_name, scopes, area, status, extra, created_version, updated_version
+        )
+        FROM STDIN WITH ({_COPY_CSV_OPTIONS});
+        """,
+        buffer,
+    )
+
+
+def _iter_normalized_rows(headers: list[str], records: Iterable[list[Any]]) -> Iterator[dict[str, Any]]:
+    normalizer = _PartnerRowNormalizer(headers)
+    for chunk in _iter_chunks(records, UPLOAD_CHUNK_ROWS):
+        yield from normalizer.normalize_batch(chunk)
+
+
+def _stream_workspace_partner_dataset(
+    workspace_id: int,
+    normalized_rows: Iterable[dict[str, Any]],
+    source_type: str,
+    source_columns: list[str],
+) -> dict[str, Any]:
+    """
+    Replace the workspace dataset from a row iterator, COPY-loading
+    `UPLOAD_CHUNK_ROWS` rows at a time in one transaction.
+    Rows are not echoed back; clients page them through `/partners/list`.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        _ensure_partner_uploads_columns_order_column(cur)
+        version = _next_dataset_version(cur, workspace_id, reset=True)
+
+        cur.execute(
+            """
+            UPDATE partner_uploads
+            SET is_active = FALSE
+            WHERE workspace_id = %s AND is_active = TRUE;
+            """,
+            (workspace_id,),
+        )
+
+        cur.execute(
+            """
+            DELETE FROM partner_mappings
+            WHERE workspace_id = %s;
+            """,
+            (workspace_id,),
+        )
+
+        cur.execute(
+            """
+            INSERT INTO partner_uploads (workspace_id, source_type, row_count, is_active, columns_order)
+            VALUES (%s, %s, 0, TRUE, %s::jsonb)
+            RETURNING id;
+            """,
+            (workspace_id, source_type, json.dumps(source_columns)),
+        )
+        upload_id = cur.fetchone()["id"]
+
+        row_count = 0
+        for chunk in _iter_chunks(normalized_rows, UPLOAD_CHUNK_ROWS):
+            _copy_partner_rows(cur, workspace_id, upload_id, chunk, version)
+            row_count += len(chunk)
+
+        cur.execute(
+            """
+            UPDATE partner_uploads
+            SET row_count = %s
+            WHERE id = %s;
+            """,
+            (row_count, upload_id),
+        )
+
+        notify_workspace_changed(cur, workspace_id)
+        conn.commit()
+        invalidate_workspace_index(workspace_id)
+
+        return {
+            "success": True,
+            "upload_id": upload_id,
+            "version": version,
+            "row_count": row_count,
+            "columns": source_columns,
+        }
+
+    except HTTPException:
+        conn.rollback()
+        raise
+    except (UnicodeDecodeError, csv.Error) as e:
+        conn.rollback()
+        raise HTTPException(status_code=400, detail=f"Invalid CSV: {e}")
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    finally:
+        cur.close()
+        conn.close()
+
+
+_MERGE_KEY_COLUMNS = {"partner_name", "area", "status"}
+
+
+def _merge_key_sql(merge_key: list[str], source_columns: list[str], alias: str) -> sql.Composable:
+    """
+    SQL expression for a row's natural key. Canonical columns are read
+    directly and any other key is read from `extra`. Values are compared
+    trimmed and case-insensitively.
+    """
+    if not merge_key:
+        raise HTTPException(status_code=400, detail="merge_key must include at least one column")
+
+    parts: list[sql.Composable] = []
+    for key in merge_key:
+        cleaned = _clean_string(key)
+        if cleaned in _MERGE_KEY_COLUMNS:
+            value = sql.SQL("{}.{}").format(sql.Identifier(alias), sql.Identifier(cleaned))
+        elif cleaned in source_columns:
+            value = sql.SQL("{}.extra ->> {}").format(sql.Identifier(alias), sql.Literal(cleaned))
+        else:
+            raise HTTPException(status_code=400, detail=f"Unknown merge_key column: {key}")
+        parts.append(sql.SQL("lower(btrim(COALESCE({}, '')))").format(value))
+
+    return sql.SQL("concat_ws(chr(31), {})").format(sql.SQL(", ").join(parts))
+
+
+def _row_hash_sql(alias: str) -> sql.Composable:
+    # Rows COPY-loaded before FORCE_NOT_NULL may hold NULL text fields; they
+    # hash the same as "" so re-uploading them is not a change.
+    return sql.SQL(
+        "md5(jsonb_build_array("
+        "COALESCE({a}.partner_name, ''), {a}.scopes, COALESCE({a}.area, ''), COALESCE({a}.status, ''), {a}.extra"
+        ")::text)"
+    ).format(a=sql.Identifier(alias))
+
+
+def _merge_workspace_partner_dataset(
+    workspace_id: int,
+    normalized_rows: Iterable[dict[str, Any]],
+    source_type: str,
+    source_columns: list[str],
+    merge_key: list[str],
+) -> dict[str, Any]:
+    """
+    Apply an upload as a diff against the current dataset, keyed on
+    `merge_key`: new keys are inserted, rows whose content hash changed are
+    updated in place (keeping their ids), and keys missing from the upload
+    are deleted. Unchanged rows are not written. When the upload repeats a
+    key, its last row wins.
+    """
+    stage_key = _merge_key_sql(merge_key, source_columns, "s")
+    current_key = _merge_key_sql(merge_key, source_columns, "t")
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        _ensure_partner_uploads_columns_order_column(cur)
+
+        cur.execute(
+            """
+            CREATE TEMP TABLE partner_mappings_stage (
+                seq BIGINT,
+                partner_name TEXT,
+                scopes JSONB,
+                area TEXT,
+                status TEXT,
+                extra JSONB
+            ) ON COMMIT DROP;
+            """
+        )
+
+        row_count = 0
+        for chunk in _iter_chunks(normalized_rows, UPLOAD_CHUNK_ROWS):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in chunk:
+                writer.writerow([
+                    row_count,
+                    row["partner_name"],
+                    json.dumps(row["scopes"]),
+                    row["area"],
+                    row["status"],
+                    json.dumps(row["extra"]),
+                ])
+                row_count += 1
+            buffer.seek(0)
+            cur.copy_expert(
+                f"""
+                COPY partner_mappings_stage (seq, partner_name, scopes, area, status, extra)
+                FROM STDIN WITH ({_COPY_CSV_OPTIONS});
+                """,
+                buffer,
+            )
+
+        # Locked before reading the current rows so concurrent writes to the
+        # workspace cannot interleave with the diff. The version is only
+        # bumped if the upload changes something.
+        current_version = _lock_dataset_version(cur, workspace_id)
+        version = current_version + 1
+
+        cur.execute(
+            sql.SQL(
+                """
+                CREATE TEMP TABLE partner_mappings_incoming ON COMMIT DROP AS
+                SELECT DISTINCT ON (merge_key) *
+                FROM (
+                    SELECT {stage_key} AS merge_key, {stage_hash} AS row_hash, s.*
+                    FROM partner_mappings_stage s
+                ) keyed
+                ORDER BY merge_key, seq DESC;
+
+                CREATE TEMP TABLE partner_mappings_current ON COMMIT DROP AS
+                SELECT t.id, {current_key} AS merge_key, {current_hash} AS row_hash
+                FROM partner_mappings t
+                WHERE t.workspace_id = %(workspace_id)s;
+
+                CREATE INDEX ON partner_mappings_incoming (merge_key);
+                CREATE INDEX ON partner_mappings_current (merge_key);
+                ANALYZE partner_mappings_incoming;
+                ANALYZE partner_mappings_current;
+                """
+            ).format(
+                stage_key=stage_key,
+                stage_hash=_row_hash_sql("s"),
+                current_key=current_key,
+                current_hash=_row_hash_sql("t"),
+            ),
+            {"workspace_id": workspace_id},
+        )
+
+        cur.execute(
+            """
+            SELECT id, source_type, columns_order
+            FROM partner_uploads
+            WHERE workspace_id = %s AND is_active = TRUE
+            ORDER BY id DESC
+            LIMIT 1;
+            """,
+            (workspace_id,),
+        )
+        upload = cur.fetchone()
+
+        # List pages show the upload's column layout, so a new layout is a
+        # change even when no row is.
+        columns_changed = upload is None or (upload["columns_order"] or []) != source_columns
+        if upload is None:
+            cur.execute(
+                """
+                INSERT INTO partner_uploads (workspace_id, source_type, row_count, is_active, columns_order)
+                VALUES (%s, %s, 0, TRUE, %s::jsonb)
+                RETURNING id;
+                """,
+                (workspace_id, source_type, json.dumps(source_columns)),
+            )
+            upload_id = cur.fetchone()["id"]
+        else:
+            upload_id = upload["id"]
+            if columns_changed or upload["source_type"] != source_type:
+                cur.execute(
+                    """
+                    UPDATE partner_uploads
+                    SET source_type = %s, columns_order = %s::jsonb
+                    WHERE id = %s;
+                    """,
+                    (source_type, json.dumps(source_columns), upload_id),
+                )
+
+        # Keys missing from the upload, and duplicate keys left over from
+        # earlier replace uploads (the lowest id per key is kept).
+        cur.execute(
+            """
+            WITH deleted AS (
+                DELETE FROM partner_mappings t
+                USING partner_mappings_current c
+                WHERE t.id = c.id
+                  AND (
+                    NOT EXISTS (
+                        SELECT 1 FROM partner_mappings_incoming i WHERE i.merge_key = c.merge_key
+                    )
+                    OR EXISTS (
+                        SELECT 1 FROM partner_mappings_current d
+                        WHERE d.merge_key = c.merge_key AND d.id < c.id
+                    )
+                  )
+                RETURNING t.id
+            )
+            INSERT INTO partner_mapping_tombstones (workspace_id, row_id, version)
+            SELECT %s, id, %s FROM deleted;
+            """,
+            (workspace_id, version),
+        )
+        deleted = cur.rowcount
+
+        cur.execute(
+            """
+            UPDATE partner_mappings t
+            SET upload_id = %s,
+                partner_name = i.partner_name,
+                scopes = i.scopes,
+                area = i.area,
+                status = i.status,
+                extra = i.extra,
+                updated_version = %s
+            FROM partner_mappings_current c
+            JOIN partner_mappings_incoming i ON i.merge_key = c.merge_key
+            WHERE t.id = c.id
+              AND c.row_hash <> i.row_hash
+              AND NOT EXISTS (
+                SELECT 1 FROM partner_mappings_current d
+                WHERE d.merge_key = c.merge_key AND d.id < c.id
+              );
+            """,
+            (upload_id, version),
+        )
+        updated = cur.rowcount
+
+        cur.execute(
+            """
+            INSERT INTO partner_mappings (
+                workspace_id, upload_id, partner_name, scopes, area, status, extra, created_version, updated_version
+            )
+            SELECT %s, %s, i.partner_name, i.scopes, i.area, i.status, i.extra, %s, %s
+            FROM partner_mappings_incoming i
+            WHERE NOT EXISTS (
+                SELECT 1 FROM partner_mappings_current c WHERE c.merge_key = i.merge_key
+            )
+            ORDER BY i.seq;
+            """,
+            (workspace_id, upload_id, version, version),
+        )
+        inserted = cur.rowcount
+
+        cur.execute("SELECT COUNT(*) AS total FROM partner_mappings_incoming;")
+        total = cur.fetchone()["total"]
+
+        rows_changed = bool(inserted or updated or deleted)
+        if rows_changed or columns_changed:
+            _set_dataset_version(cur, workspace_id, version)
+            cur.execute(
+                """
+                UPDATE partner_uploads
+                SET row_count = %s
+                WHERE id = %s;
+                """,
+                (total, upload_id),
+            )
+        else:
+            version = current_version
+
+        if rows_changed:
+            notify_workspace_changed(cur, workspace_id)
+        conn.commit()
+        if rows_changed:
+            invalidate_workspace_index(workspace_id)
+
+        return {
+            "success": True,
+            "mode": "merge",
+            "upload_id": upload_id,
+            "version": version,
+            "row_count": total,
+            "columns": source_columns,
+            "changes": {
+                "inserted": inserted,
+                "updated": updated,
+                "deleted": deleted,
+                "unchanged": total - inserted - updated,
+                "duplicate_keys_in_upload": row_count - total,
+            },
+        }
+
+    except HTTPException:
+        conn.rollback()
+        raise
+    except (UnicodeDecodeError, csv.Error) as e:
+        conn.rollback()
+        raise HTTPException(status_code=400, detail=f"Invalid CSV: {e}")
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    finally:
+        cur.close()
+        conn.close()
+
+
+@router.post("/upload-csv-file", dependencies=[Depends(admit_upload)])
+def upload_csv_file(
+    workspace_id: int = Form(...),
+    file: UploadFile = File(...),
+    mode: UploadMode = Form("replace"),
+    merge_key: str = Form(",".join(DEFAULT_MERGE_KEY)),
+    session: Optional[SessionClaims] = Depends(optional_session),
+):
+    authorize_workspace(session, workspace_id)
+
+    # The multipart body is spooled to a temporary file by the framework;
+    # it is read back through one incremental csv.reader.
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+
+    try:
+        source_columns, raw_rows = _iter_uploaded_csv_rows(stream)
+        normalized_rows = _iter_normalized_rows(source_columns, raw_rows)
+
+        if mode == "merge":
+            return _merge_workspace_partner_dataset(
+                workspace_id=workspace_id,
+                normalized_rows=normalized_rows,
+                source_type="csv",
+                source_columns=source_columns,
+                merge_key=[key for key in merge_key.split(",") if key.strip()],
+            )
+
+        return _stream_workspace_partner_dataset(
+            workspace_id=workspace_id,
+            normalized_rows=normalized_rows,
+            source_type="csv",
+            source_columns=source_columns,
+        )
+
+    except HTTPException:
+        raise
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid CSV: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    finally:
+        stream.detach()
+
+
+@router.post("/upload-csv", dependencies=[Depends(admit_upload)])
+def upload_csv(
+    req: UploadCsvRequest,
+    session: Optional[SessionClaims] = Depends(optional_session),
+):
+    authorize_workspace(session, req.workspace_id)
+
     try:
         source_columns, raw_rows = _parse_uploaded_csv_rows(req.csv_text)
-        normalized_rows = [_normalize_partner_row(row) for row in raw_rows]
+        normalized_rows = _PartnerRowNormalizer(source_columns).normalize_batch(raw_rows)
+
+        if req.mode == "merge":
+            return _merge_workspace_partner_dataset(
+                workspace_id=req.workspace_id,
+                normalized_rows=normalized_rows,
+                source_type="csv",
+                source_columns=source_columns,
+                merge_key=req.merge_key,
+            )
 
         return _replace_workspace_partner_dataset(
             workspace_id=req.workspace_id,
@@ -579,12 +1277,26 @@ def upload_csv(req: UploadCsvRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/upload-json")
-def upload_json(req: UploadJsonRequest):
+@router.post("/upload-json", dependencies=[Depends(admit_upload)])
+def upload_json(
+    req: UploadJsonRequest,
+    session: Optional[SessionClaims] = Depends(optional_session),
+):
+    authorize_workspace(session, req.workspace_id)
+
     try:
-        normalized_rows = [_normalize_partner_row(row) for row in req.rows]
+        normalized_rows = _normalize_partner_rows(req.rows)
         source_columns = _dynamic_columns_from_rows([row.get("extra") or {} for row in normalized_rows])
 
+        if req.mode == "merge":
+            return _merge_workspace_partner_dataset(
+                workspace_id=req.workspace_id,
+                normalized_rows=normalized_rows,
+                source_type="json",
+                source_columns=source_columns,
+                merge_key=req.merge_key,
+            )
+
         return _replace_workspace_partner_dataset(
             workspace_id=req.workspace_id,
             normalized_rows=normalized_rows,
@@ -598,35 +1310,341 @@ def upload_json(req: UploadJsonRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+PARTNER_LIST_DEFAULT_LIMIT = 100
+PARTNER_LIST_MAX_LIMIT = 1000
+# `total` stops counting here, so a first page never scans a huge dataset.
+PARTNER_LIST_COUNT_LIMIT = 10000
+
+PartnerSort = Literal["id", "partner_name", "area", "status", "created_at"]
+SortOrder = Literal["asc", "desc"]
+
+# Nullable text columns. A row comparison with NULL is never true, so these
+# sort and page on COALESCE(column, '') instead of the raw value.
+_TEXT_SORTS = ("partner_name", "area", "status")
+
+
+def _sort_key_sql(sort: str) -> sql.Composable:
+    if sort in _TEXT_SORTS:
+        return sql.SQL("COALESCE({column}, '')").format(column=sql.Identifier(sort))
+    return sql.Identifier(sort)
+
+
+def _encode_list_cursor(sort: str, row: dict[str, Any]) -> str:
+    value = row[sort]
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif value is None and sort in _TEXT_SORTS:
+        value = ""
+    payload = json.dumps([sort, value, row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def _decode_list_cursor(cursor: str, sort: str) -> tuple[Any, int]:
+    try:
+        cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if cursor_sort != sort or not isinstance(row_id, int) or isinstance(row_id, bool):
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort")
+
+    # The value is bound into the keyset comparison, so it must have the
+    # sort column's type.
+    if sort == "id":
+        valid = isinstance(value, int) and not isinstance(value, bool)
+    elif sort == "created_at":
+        try:
+            value = datetime.fromisoformat(value)
+            valid = True
+        except (ValueError, TypeError):
+            valid = False
+    else:
+        if value is None:
+            value = ""
+        valid = isinstance(value, str)
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return value, row_id
+
+
+def _list_etag(workspace_id: int, version: int, request: Request) -> str:
+    # The page depends on the query string as well as the dataset version.
+    query_hash = hashlib.sha256(request.url.query.encode("utf-8")).hexdigest()[:16]
+    return f'"{workspace_id}.{version}.{query_hash}"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [candidate.strip().removeprefix("W/") for candidate in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
 @router.get("/list/{workspace_id}")
-def list_partners(workspace_id: int):
+def list_partners(
+    workspace_id: int,
+    request: Request,
+    response: Response,
+    limit: int = Query(PARTNER_LIST_DEFAULT_LIMIT, ge=1, le=PARTNER_LIST_MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="`next_cursor` from the previous page."),
+    sort: PartnerSort = "id",
+    order: SortOrder = "asc",
+    partner_name: Optional[str] = Query(None, description="Case-insensitive prefix match."),
+    area: Optional[str] = None,
+    status: Optional[str] = None,
+    scope: Optional[list[str]] = Query(None, description="Rows must hold every given scope."),
+    session: Optional[SessionClaims] = Depends(optional_session),
+):
+    """
+    One keyset-paginated page of a workspace dataset. `total` counts the
+    rows matching the filters up to `PARTNER_LIST_COUNT_LIMIT`
+    (`total_capped` tells when it stopped) and is only computed for the
+    first page.
+
+    The `ETag` changes with the dataset version, so an unchanged dataset is
+    answered with 304 before any rows are read.
+    """
+    authorize_workspace(session, workspace_id)
+
+    after = _decode_list_cursor(cursor, sort) if cursor else None
+
+    sort_column = _sort_key_sql(sort)
+    conditions: list[sql.Composable] = [sql.SQL("workspace_id = %s")]
+    params: list[Any] = [workspace_id]
+
+    if partner_name:
+        conditions.append(sql.SQL("lower(partner_name) LIKE %s"))
+        params.append(f"{_escape_like(partner_name.strip().lower())}%")
+    if area is not None:
+        conditions.append(sql.SQL("area = %s"))
+        params.append(area)
+    if status is not None:
+        conditions.append(sql.SQL("status = %s"))
+        params.append(status)
+    for item in scope or []:
+        conditions.append(sql.SQL("scopes @> %s::jsonb"))
+        params.append(json.dumps([_clean_string(item)]))
+
+    where_clause = sql.SQL(" AND ").join(conditions)
+
     conn = get_db_connection()
     cur = conn.cursor()
 
     try:
+        # The version, count and page must come from one snapshot for the
+        # ETag to describe the rows returned.
+        conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+
+        version = _get_dataset_version(cur, workspace_id)["version"]
+        etag = _list_etag(workspace_id, version, request)
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+        total = None
+        total_capped = False
+        if after is None:
+            cur.execute(
+                sql.SQL(
+                    """
+                    SELECT COUNT(*) AS total
+                    FROM (SELECT 1 FROM partner_mappings WHERE {where} LIMIT %s) AS matching;
+                    """
+                ).format(where=where_clause),
+                (*params, PARTNER_LIST_COUNT_LIMIT + 1),
+            )
+            total = cur.fetchone()["total"]
+            total_capped = total > PARTNER_LIST_COUNT_LIMIT
+            total = min(total, PARTNER_LIST_COUNT_LIMIT)
+
+        page_conditions = where_clause
+        page_params = list(params)
+        if after is not None:
+            page_conditions = sql.SQL("{where} AND ({column}, id) {op} (%s, %s)").format(
+                where=where_clause,
+                column=sort_column,
+                op=sql.SQL(">" if order == "asc" else "<"),
+            )
+            page_params.extend(after)
+
         cur.execute(
-            """
-            SELECT id, workspace_id, upload_id, partner_name, scopes, area, status, extra, created_at
-            FROM partner_mappings
-            WHERE workspace_id = %s
-            ORDER BY id ASC;
-            """,
-            (workspace_id,),
+            sql.SQL(
+                """
+                SELECT id, workspace_id, upload_id, partner_name, scopes, area, status, extra, created_at
+                FROM partner_mappings
+                WHERE {where}
+                ORDER BY {column} {direction}, id {direction}
+                LIMIT %s;
+                """
+            ).format(
+                where=page_conditions,
+                column=sort_column,
+                direction=sql.SQL(order.upper()),
+            ),
+            (*page_params, limit + 1),
         )
-
         rows = cur.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
         columns = _get_active_columns_for_workspace(cur, workspace_id)
         if not columns:
             columns = _dynamic_columns_from_rows([row.get("extra") or {} for row in rows])
 
-        dynamic_rows = [_build_dynamic_row(row, columns) for row in rows]
+        conn.commit()
+
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
 
         return {
             "success": True,
+            "version": version,
             "columns": columns,
-            "rows": dynamic_rows,
+            "rows": [_build_dynamic_row(row, columns) for row in rows],
+            "next_cursor": _encode_list_cursor(sort, rows[-1]) if has_more else None,
+            "total": total,
+            "total_capped": total_capped,
         }
 
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    finally:
+        cur.close()
+        conn.close()
+
+
+PARTNER_CHANGES_MAX_IDS = 10000
+
+
+def prune_partner_tombstones(retention_days: int) -> int:
+    """
+    Delete tombstones older than `retention_days`. Each workspace's
+    `reset_version` moves up to the newest version pruned, so clients
+    syncing from before it are told to reload instead of missing deletes.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        cur.execute(
+            """
+            WITH pruned AS (
+                DELETE FROM partner_mapping_tombstones
+                WHERE deleted_at < now() - make_interval(days => %s)
+                RETURNING workspace_id, version
+            ),
+            horizon AS (
+                UPDATE partner_dataset_versions v
+                SET reset_version = GREATEST(v.reset_version, h.version)
+                FROM (
+                    SELECT workspace_id, MAX(version) AS version
+                    FROM pruned
+                    GROUP BY workspace_id
+                ) h
+                WHERE v.workspace_id = h.workspace_id
+            )
+            SELECT COUNT(*) AS deleted FROM pruned;
+            """,
+            (retention_days,),
+        )
+        deleted = cur.fetchone()["deleted"]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+    return deleted
+
+
+@router.get("/changes/{workspace_id}")
+def list_partner_changes(
+    workspace_id: int,
+    changes_since: int = Query(..., ge=0, description="Dataset `version` the client last synced."),
+    session: Optional[SessionClaims] = Depends(optional_session),
+):
+    """
+    Row ids inserted, updated and deleted after dataset version
+    `changes_since`. `reset: true` means the client has to reload the list
+    instead: the dataset was replaced or reset since then, deletions since
+    then have been pruned, or more than `PARTNER_CHANGES_MAX_IDS` rows
+    changed.
+    """
+    authorize_workspace(session, workspace_id)
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+
+        versions = _get_dataset_version(cur, workspace_id)
+        result: dict[str, Any] = {
+            "success": True,
+            "workspace_id": workspace_id,
+            "since": changes_since,
+            "version": versions["version"],
+            "reset": False,
+            "inserted": [],
+            "updated": [],
+            "deleted": [],
+        }
+
+        if changes_since == versions["version"]:
+            return result
+
+        if changes_since > versions["version"] or changes_since < versions["reset_version"]:
+            result["reset"] = True
+            return result
+
+        params = {"workspace_id": workspace_id, "since": changes_since, "limit": PARTNER_CHANGES_MAX_IDS + 1}
+
+        cur.execute(
+            """
+            SELECT id, created_version > %(since)s AS inserted
+            FROM partner_mappings
+            WHERE workspace_id = %(workspace_id)s AND updated_version > %(since)s
+            ORDER BY id
+            LIMIT %(limit)s;
+            """,
+            params,
+        )
+        changed = cur.fetchall()
+
+        cur.execute(
+            """
+            SELECT DISTINCT row_id
+            FROM partner_mapping_tombstones
+            WHERE workspace_id = %(workspace_id)s AND version > %(since)s
+            ORDER BY row_id
+            LIMIT %(limit)s;
+            """,
+            params,
+        )
+        deleted = [row["row_id"] for row in cur.fetchall()]
+        conn.commit()
+
+        if len(changed) + len(deleted) > PARTNER_CHANGES_MAX_IDS:
+            result["reset"] = True
+            return result
+
+        result["inserted"] = [row["id"] for row in changed if row["inserted"]]
+        result["updated"] = [row["id"] for row in changed if not row["inserted"]]
+        result["deleted"] = deleted
+        return result
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -636,7 +1654,11 @@ def list_partners(workspace_id: int):
 
 
 @router.put("/update/{row_id}")
-def update_partner(row_id: int, req: UpdatePartnerRequest):
+def update_partner(
+    row_id: int,
+    req: UpdatePartnerRequest,
+    session: Optional[SessionClaims] = Depends(optional_session),
+):
     conn = get_db_connection()
     cur = conn.cursor()
 
@@ -655,6 +1677,10 @@ def update_partner(row_id: int, req: UpdatePartnerRequest):
         if not current:
             raise HTTPException(status_code=404, detail="Partner row not found")
 
+        authorize_workspace(session, current["workspace_id"])
+
+        version = _next_dataset_version(cur, current["workspace_id"])
+
         current_extra = current.get("extra") or {}
         merged_extra = dict(current_extra)
         merged_extra.update(req.extra or {})
@@ -677,7 +1703,8 @@ def update_partner(row_id: int, req: UpdatePartnerRequest):
                 scopes = %s::jsonb,
                 area = %s,
                 status = %s,
-                extra = %s::jsonb
+                extra = %s::jsonb,
+                updated_version = %s
             WHERE id = %s
             RETURNING id, workspace_id, upload_id, partner_name, scopes, area, status, extra, created_at;
             """,
@@ -687,14 +1714,17 @@ def update_partner(row_id: int, req: UpdatePartnerRequest):
                 area,
                 status,
                 json.dumps(normalized_extra),
+                version,
                 row_id,
             ),
         )
 
         result = cur.fetchone()
+        workspace_id = result["workspace_id"]
+        notify_workspace_changed(cur, workspace_id)
         conn.commit()
+        invalidate_workspace_index(workspace_id)
 
-        workspace_id = result["workspace_id"]
         columns = _get_active_columns_for_workspace(cur, workspace_id)
         if not columns:
             cur.execute(
@@ -711,6 +1741,7 @@ def update_partner(row_id: int, req: UpdatePartnerRequest):
 
         return {
             "success": True,
+            "version": version,
             "columns": columns,
             "row": _build_dynamic_row(result, columns),
         }
@@ -728,29 +1759,48 @@ def update_partner(row_id: int, req: UpdatePartnerRequest):
 
 
 @router.delete("/delete/{row_id}")
-def delete_partner(row_id: int):
+def delete_partner(
+    row_id: int,
+    session: Optional[SessionClaims] = Depends(optional_session),
+):
     conn = get_db_connection()
     cur = conn.cursor()
 
     try:
+        cur.execute("SELECT workspace_id FROM partner_mappings WHERE id = %s;", (row_id,))
+        current = cur.fetchone()
+
+        if not current:
+            conn.rollback()
+            raise HTTPException(status_code=404, detail="Partner row not found")
+
+        authorize_workspace(session, current["workspace_id"])
+
+        workspace_id = current["workspace_id"]
+        version = _next_dataset_version(cur, workspace_id)
+
         cur.execute(
             """
-            DELETE FROM partner_mappings
-            WHERE id = %s
-            RETURNING id;
+            WITH deleted AS (
+                DELETE FROM partner_mappings
+                WHERE id = %s
+                RETURNING id, workspace_id
+            )
+            INSERT INTO partner_mapping_tombstones (workspace_id, row_id, version)
+            SELECT workspace_id, id, %s FROM deleted;
             """,
-            (row_id,),
+            (row_id, version),
         )
 
-        result = cur.fetchone()
-
-        if not result:
+        if cur.rowcount == 0:
             conn.rollback()
             raise HTTPException(status_code=404, detail="Partner row not found")
 
+        notify_workspace_changed(cur, workspace_id)
         conn.commit()
+        invalidate_workspace_index(workspace_id)
 
-        return {"success": True}
+        return {"success": True, "version": version}
 
     except HTTPException:
         raise
@@ -764,12 +1814,18 @@ def delete_partner(row_id: int):
 
 
 @router.delete("/reset/{workspace_id}")
-def reset_partners(workspace_id: int):
+def reset_partners(
+    workspace_id: int,
+    session: Optional[SessionClaims] = Depends(optional_session),
+):
+    authorize_workspace(session, workspace_id)
+
     conn = get_db_connection()
     cur = conn.cursor()
 
     try:
         _ensure_partner_uploads_columns_order_column(cur)
+        version = _next_dataset_version(cur, workspace_id, reset=True)
 
         cur.execute(
             """
@@ -788,9 +1844,11 @@ def reset_partners(workspace_id: int):
             (workspace_id,),
         )
 
+        notify_workspace_changed(cur, workspace_id)
         conn.commit()
+        invalidate_workspace_index(workspace_id)
 
-        return {"success": True}
+        return {"success": True, "version": version}
 
     except Exception as e:
         conn.rollback()
@@ -798,4 +1856,125 @@ def reset_partners(workspace_id: int):
 
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+def _analyze_changelog(raw_text: str, product_area: Optional[str]) -> tuple[list[str], list[str]]:
+    lines = [normalize_text(line) for line in split_into_lines(raw_text)]
+    areas: list[str] = []
+    for change in extract_changes(lines, product_area):
+        area = change.area.strip().lower()
+        if area and area != "general" and area not in areas:
+            areas.append(area)
+
+    return detect_scopes(normalize_text(raw_text)), areas
+
+
+def _evaluate_impacts(
+    index: WorkspacePartnerIndex,
+    scopes: list[str],
+    areas: list[str],
+) -> dict[int, tuple[str, str]]:
+    """
+    Impacted row positions -> (impact_status, impact_reason). Rows absent
+    from the result are not impacted. Cost is proportional to the matches,
+    not the dataset size.
+    """
+    matched_scopes: dict[int, list[str]] = {}
+    for scope in scopes:
+        for position in index.index.lookup([scope]):
+            matched_scopes.setdefault(position, []).append(scope)
+
+    impacts = {
+        position: ("impacted", f"Holds impacted scopes: {', '.join(row_scopes)}")
+        for position, row_scopes in matched_scopes.items()
+    }
+
+    for area in areas:
+        for position in index.areas.get(area, []):
+            if position not in impacts:
+                impacts[position] = (
+                    "review",
+                    f"Mapped to area {index.rows[position]['area']} changed in this release",
+                )
+
+    return impacts
+
+
+def _impact_row(index: WorkspacePartnerIndex, position: int, impacts: dict[int, tuple[str, str]]) -> dict[str, Any]:
+    impact_status, impact_reason = impacts.get(position, ("none", ""))
+    return {
+        **index.rows[position],
+        "impact_status": impact_status,
+        "impact_reason": impact_reason,
+    }
+
+
+@router.post("/impact/{workspace_id}")
+def analyze_partner_impact(
+    workspace_id: int,
+    req: ImpactRequest,
+    session: Optional[SessionClaims] = Depends(optional_session),
+):
+    authorize_workspace(session, workspace_id)
+
+    try:
+        index = get_workspace_index(workspace_id)
+        scopes, areas = _analyze_changelog(req.raw_text, req.product_area)
+        impacts = _evaluate_impacts(index, scopes, areas)
+
+        statuses = [status for status, _ in impacts.values()]
+        summary = {
+            "total": len(index.rows),
+            "impacted": statuses.count("impacted"),
+            "review": statuses.count("review"),
+            "none": len(index.rows) - len(impacts),
+        }
+
+        start = bisect_right(index.ids, req.cursor) if req.cursor is not None else 0
+        if req.impacted_only:
+            positions = (position for position in sorted(impacts) if position >= start)
+        else:
+            positions = iter(range(start, len(index.rows)))
+
+        if req.stream:
+            return StreamingResponse(
+                _stream_impact_rows(index, positions, impacts, scopes, areas, summary),
+                media_type="application/x-ndjson",
+            )
+
+        page = []
+        for position in positions:
+            page.append(_impact_row(index, position, impacts))
+            if len(page) == req.limit:
+                break
+
+        has_more = next(positions, None) is not None
+
+        return {
+            "success": True,
+            "workspace_id": workspace_id,
+            "scopes": scopes,
+            "areas": areas,
+            "summary": summary,
+            "rows": page,
+            "next_cursor": page[-1]["id"] if page and has_more else None,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _stream_impact_rows(index, positions, impacts, scopes, areas, summary, chunk_size: int = 1000):
+    yield json.dumps({"type": "summary", "scopes": scopes, "areas": areas, **summary}) + "\n"
+
+    chunk: list[str] = []
+    for position in positions:
+        chunk.append(json.dumps({"type": "row", **_impact_row(index, position, impacts)}))
+        if len(chunk) == chunk_size:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+
+    if chunk:
+        yield "\n".join(chunk) + "\n"
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+# bcrypt work factor for new hashes. Stored hashes with a different cost
+# are upgraded on the next successful login.
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+
+# bcrypt releases the GIL, so hashing threads run in parallel with request
+# handling; the pool size bounds how many cores logins can take.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Hashes allowed to wait for a worker before new ones are refused.
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_SLOTS = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE)
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+async def _run(fn, *args):
+    if not _SLOTS.acquire(blocking=False):
+        raise PasswordHasherBusy("Too many password checks in flight")
+
+    try:
+        future = _EXECUTOR.submit(fn, *args)
+    except BaseException:
+        _SLOTS.release()
+        raise
+
+    # Released when the hash finishes, even if the request was cancelled.
+    future.add_done_callback(lambda _: _SLOTS.release())
+    return await asyncio.wrap_future(future)
+
+
+def _hash_password(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=rounds)).decode()
+
+
+def _verify_password(password: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(password.encode(), hashed.encode())
+    except ValueError:
+        # Not a bcrypt hash.
+        return False
+
+
+async def hash_password(password: str) -> str:
+    return await _run(_hash_password, password, PASSWORD_BCRYPT_ROUNDS)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await _run(_verify_password, password, hashed)
+
+
+def needs_rehash(hashed: str) -> bool:
+    # bcrypt hashes look like $2b$<cost>$<salt and digest>.
+    parts = hashed.split("$")
+    try:
+        return int(parts[2]) != PASSWORD_BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
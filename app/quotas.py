@@ -0,0 +1,403 @@
+import atexit
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from datetime import date, datetime, timedelta, timezone
+
+from psycopg2.extras import execute_values
+
+from .db import get_db_connection
+from .logs import get_logger
+
+log = get_logger(__name__)
+
+# Request cost in quota units: one unit per started `QUOTA_COST_BYTES_PER_UNIT`
+# of input, times the batch size, times `QUOTA_COST_AI_MULTIPLIER` in AI mode.
+QUOTA_COST_BYTES_PER_UNIT = int(os.getenv("QUOTA_COST_BYTES_PER_UNIT", "8192"))
+QUOTA_COST_AI_MULTIPLIER = int(os.getenv("QUOTA_COST_AI_MULTIPLIER", "10"))
+
+# How often buffered usage is written to `api_key_usage`.
+USAGE_FLUSH_INTERVAL_SECONDS = float(os.getenv("USAGE_FLUSH_INTERVAL_SECONDS", "5"))
+# After a failed read of stored usage, keys start from their in-memory
+# counters for this long instead of every request retrying the database.
+USAGE_LOAD_RETRY_SECONDS = float(os.getenv("USAGE_LOAD_RETRY_SECONDS", "5"))
+# Counters of keys idle this long are dropped from memory.
+USAGE_IDLE_SECONDS = 3600.0
+
+# Applied by `python -m app.maintenance migrate`; request handlers and the
+# flusher assume it exists.
+USAGE_DDL = """
+    CREATE TABLE IF NOT EXISTS api_key_usage (
+        key_hash TEXT NOT NULL,
+        period TEXT NOT NULL,
+        period_start DATE NOT NULL,
+        units BIGINT NOT NULL DEFAULT 0,
+        ai_tokens BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (key_hash, period, period_start)
+    );
+"""
+
+@dataclass(frozen=True)
+class QuotaConfig:
+    # Quota units per period; 0 means unlimited.
+    daily_units: int
+    monthly_units: int
+    # LLM tokens per period for AI mode; 0 means unlimited.
+    daily_ai_tokens: int
+    monthly_ai_tokens: int
+
+    def units(self, period: str) -> int:
+        return self.daily_units if period == "day" else self.monthly_units
+
+    def ai_tokens(self, period: str) -> int:
+        return self.daily_ai_tokens if period == "day" else self.monthly_ai_tokens
+
+
+def _plan_quota(plan: str, **defaults: int) -> QuotaConfig:
+    prefix = f"QUOTA_{plan.upper()}"
+    return QuotaConfig(**{
+        name: int(os.getenv(f"{prefix}_{name.upper()}", str(value)))
+        for name, value in defaults.items()
+    })
+
+
+FREE_QUOTA = _plan_quota(
+    "free",
+    daily_units=2_000,
+    monthly_units=30_000,
+    daily_ai_tokens=0,
+    monthly_ai_tokens=0,
+)
+PRO_QUOTA = _plan_quota(
+    "pro",
+    daily_units=50_000,
+    monthly_units=1_000_000,
+    daily_ai_tokens=1_000_000,
+    monthly_ai_tokens=20_000_000,
+)
+
+PLAN_QUOTAS = {"free": FREE_QUOTA, "pro": PRO_QUOTA}
+
+
+def request_cost(mode: str = "basic", input_bytes: int = 0, batch_size: int = 1) -> int:
+    per_item = 1 + max(0, input_bytes - 1) // QUOTA_COST_BYTES_PER_UNIT
+    if mode == "ai":
+        per_item *= QUOTA_COST_AI_MULTIPLIER
+    return per_item * max(1, batch_size)
+
+
+@dataclass(frozen=True)
+class QuotaStatus:
+    # The tightest unit quota (None when the plan has none).
+    limit: int | None
+    remaining: int | None
+    reset_seconds: float
+    ai_tokens_remaining: int | None
+    # Set when the request was rejected: "quota" or "ai_tokens".
+    exceeded: str | None = None
+
+    def headers(self) -> dict[str, str]:
+        headers: dict[str, str] = {}
+        if self.limit is not None:
+            headers["X-Quota-Limit"] = str(self.limit)
+            headers["X-Quota-Remaining"] = str(self.remaining)
+            headers["X-Quota-Reset"] = str(math.ceil(self.reset_seconds))
+        if self.ai_tokens_remaining is not None:
+            headers["X-AI-Tokens-Remaining"] = str(self.ai_tokens_remaining)
+        return headers
+
+
+@dataclass
+class _Usage:
+    # Best known period total: the database total at the last flush plus
+    # what this worker has counted since.
+    units: int = 0
+    ai_tokens: int = 0
+    # Counted here but not yet flushed.
+    pending_units: int = 0
+    pending_ai_tokens: int = 0
+    used_at: float = 0.0
+    # Whether `units`/`ai_tokens` include the stored totals.
+    loaded: bool = False
+
+
+# (hashed api_key, period, period start) -> usage
+_USAGE: dict[tuple[str, str, date], _Usage] = {}
+_LOCK = threading.Lock()
+_FLUSHER_STARTED = False
+# Monotonic time before which `_load_counters` does not read the database.
+_LOAD_RETRY_AT = 0.0
+
+
+def _period_starts(now: datetime) -> dict[str, date]:
+    today = now.date()
+    return {"day": today, "month": today.replace(day=1)}
+
+
+def _period_reset_seconds(period: str, start: date, now: datetime) -> float:
+    if period == "day":
+        end = start + timedelta(days=1)
+    else:
+        end = (start + timedelta(days=32)).replace(day=1)
+    end_at = datetime(end.year, end.month, end.day, tzinfo=timezone.utc)
+    return max(0.0, (end_at - now).total_seconds())
+
+
+def _counters(key: str, now: datetime) -> dict[str, tuple[date, _Usage]]:
+    counters = {}
+    for period, start in _period_starts(now).items():
+        usage = _USAGE.get((key, period, start))
+        if usage is None:
+            usage = _USAGE[(key, period, start)] = _Usage()
+        usage.used_at = time.monotonic()
+        counters[period] = (start, usage)
+    return counters
+
+
+def _read_usage(key: str, periods: list[tuple[str, date]]) -> dict[tuple[str, date], tuple[int, int]]:
+    """Stored (units, ai_tokens) totals of `key` for the given periods."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT period, period_start, units, ai_tokens
+            FROM api_key_usage
+            WHERE key_hash = %s AND (period, period_start) IN %s;
+            """,
+            (key, tuple(periods)),
+        )
+        rows = cur.fetchall()
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+    return {(row["period"], row["period_start"]): (row["units"], row["ai_tokens"]) for row in rows}
+
+
+def _load_counters(key: str, now: datetime) -> None:
+    """
+    Start counters from the stored period totals the first time this worker
+    sees a key (or sees it again after eviction), so a restart or a new
+    worker does not hand out a fresh quota. If the database cannot be read,
+    reads are retried after `USAGE_LOAD_RETRY_SECONDS`.
+    """
+    global _LOAD_RETRY_AT
+
+    with _LOCK:
+        missing = [
+            (period, start)
+            for period, start in _period_starts(now).items()
+            if not (usage := _USAGE.get((key, period, start))) or not usage.loaded
+        ]
+    if not missing or time.monotonic() < _LOAD_RETRY_AT:
+        return
+
+    try:
+        stored = _read_usage(key, missing)
+    except Exception as e:
+        _LOAD_RETRY_AT = time.monotonic() + USAGE_LOAD_RETRY_SECONDS
+        log.warning("quota.load_failed", error=f"{type(e).__name__}: {e}")
+        return
+
+    with _LOCK:
+        for period, start in missing:
+            usage = _USAGE.setdefault((key, period, start), _Usage())
+            if usage.loaded:
+                # A flush has synced it with the database meanwhile.
+                continue
+            units, ai_tokens = stored.get((period, start), (0, 0))
+            usage.units += units
+            usage.ai_tokens += ai_tokens
+            usage.loaded = True
+
+
+def _status(
+    cfg: QuotaConfig,
+    counters: dict[str, tuple[date, _Usage]],
+    now: datetime,
+    exceeded: str | None = None,
+) -> QuotaStatus:
+    limit = remaining = None
+    reset_seconds = 0.0
+    ai_tokens_remaining = None
+
+    for period, (start, usage) in counters.items():
+        period_limit = cfg.units(period)
+        if period_limit:
+            period_remaining = max(0, period_limit - usage.units)
+            if remaining is None or period_remaining < remaining:
+                limit, remaining = period_limit, period_remaining
+                reset_seconds = _period_reset_seconds(period, start, now)
+
+        ai_limit = cfg.ai_tokens(period)
+        if ai_limit:
+            ai_remaining = max(0, ai_limit - usage.ai_tokens)
+            if ai_tokens_remaining is None or ai_remaining < ai_tokens_remaining:
+                ai_tokens_remaining = ai_remaining
+
+    return QuotaStatus(limit, remaining, reset_seconds, ai_tokens_remaining, exceeded)
+
+
+def charge_quota(key: str, plan: str, cost: int, ai: bool = False) -> QuotaStatus:
+    """
+    Check `cost` units (and, for AI requests, the AI token budget) against
+    the key's daily and monthly quotas and count them if they fit.
+
+    Only in-memory counters are touched; a background thread flushes them
+    in batches, so workers see each other's usage within
+    `USAGE_FLUSH_INTERVAL_SECONDS`.
+    """
+    _ensure_flusher()
+
+    cfg = PLAN_QUOTAS.get(plan, FREE_QUOTA)
+    now = datetime.now(timezone.utc)
+    _load_counters(key, now)
+
+    with _LOCK:
+        counters = _counters(key, now)
+
+        exceeded, exhausted = None, []
+        for period, (start, usage) in counters.items():
+            if cfg.units(period) and usage.units + cost > cfg.units(period):
+                exceeded = "quota"
+                exhausted.append((period, start))
+        if ai and not exceeded:
+            for period, (start, usage) in counters.items():
+                if cfg.ai_tokens(period) and usage.ai_tokens >= cfg.ai_tokens(period):
+                    exceeded = "ai_tokens"
+                    exhausted.append((period, start))
+
+        if exceeded:
+            # The request can go through once every exhausted period has
+            # rolled over.
+            reset_seconds = max(_period_reset_seconds(period, start, now) for period, start in exhausted)
+            return replace(_status(cfg, counters, now, exceeded), reset_seconds=reset_seconds)
+
+        for _, usage in counters.values():
+            usage.units += cost
+            usage.pending_units += cost
+
+        return _status(cfg, counters, now)
+
+
+def refund_quota(key: str, cost: int) -> None:
+    """Give back `cost` units charged to a request that was then refused."""
+    now = datetime.now(timezone.utc)
+
+    with _LOCK:
+        for _, usage in _counters(key, now).values():
+            usage.units -= cost
+            usage.pending_units -= cost
+
+
+def record_ai_tokens(key: str, plan: str, tokens: int) -> QuotaStatus:
+    """
+    Count LLM tokens spent by an AI request. Token usage is only known after
+    the call, so a request may overshoot the budget; the next one is refused.
+    """
+    cfg = PLAN_QUOTAS.get(plan, FREE_QUOTA)
+    now = datetime.now(timezone.utc)
+
+    with _LOCK:
+        counters = _counters(key, now)
+        for _, usage in counters.values():
+            usage.ai_tokens += tokens
+            usage.pending_ai_tokens += tokens
+        return _status(cfg, counters, now)
+
+
+def _write_usage(batch: list[tuple[str, str, date, int, int]]) -> list[tuple[str, str, date, int, int]]:
+    """Add `batch` deltas to `api_key_usage`; returns the new totals."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        rows = execute_values(
+            cur,
+            """
+            INSERT INTO api_key_usage AS u (key_hash, period, period_start, units, ai_tokens)
+            VALUES %s
+            ON CONFLICT (key_hash, period, period_start) DO UPDATE
+            SET units = u.units + EXCLUDED.units,
+                ai_tokens = u.ai_tokens + EXCLUDED.ai_tokens,
+                updated_at = NOW()
+            RETURNING key_hash, period, period_start, units, ai_tokens;
+            """,
+            batch,
+            fetch=True,
+        )
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+    return [
+        (row["key_hash"], row["period"], row["period_start"], row["units"], row["ai_tokens"])
+        for row in rows
+    ]
+
+
+def flush_usage() -> int:
+    """Write buffered usage in one statement. Returns the rows written."""
+    now = datetime.now(timezone.utc)
+    current = _period_starts(now)
+    idle_before = time.monotonic() - USAGE_IDLE_SECONDS
+
+    with _LOCK:
+        batch = []
+        for (key, period, start), usage in list(_USAGE.items()):
+            if usage.pending_units or usage.pending_ai_tokens:
+                batch.append((key, period, start, usage.pending_units, usage.pending_ai_tokens))
+                usage.pending_units = usage.pending_ai_tokens = 0
+            elif start != current[period] or usage.used_at < idle_before:
+                del _USAGE[(key, period, start)]
+
+    if not batch:
+        return 0
+
+    # A stable row order keeps concurrent flushes from deadlocking.
+    batch.sort()
+    try:
+        totals = _write_usage(batch)
+    except Exception as e:
+        with _LOCK:
+            for key, period, start, units, ai_tokens in batch:
+                usage = _USAGE.setdefault((key, period, start), _Usage(units=units, ai_tokens=ai_tokens))
+                usage.pending_units += units
+                usage.pending_ai_tokens += ai_tokens
+        log.warning("quota.flush_failed", counters=len(batch), error=f"{type(e).__name__}: {e}")
+        return 0
+
+    with _LOCK:
+        for key, period, start, units, ai_tokens in totals:
+            usage = _USAGE.get((key, period, start))
+            if usage is not None:
+                # The database totals include every worker's flushed usage;
+                # add back what arrived here during the write.
+                usage.units = units + usage.pending_units
+                usage.ai_tokens = ai_tokens + usage.pending_ai_tokens
+                usage.loaded = True
+
+    return len(batch)
+
+
+def _ensure_flusher() -> None:
+    global _FLUSHER_STARTED
+
+    with _LOCK:
+        if _FLUSHER_STARTED:
+            return
+        _FLUSHER_STARTED = True
+
+    threading.Thread(target=_flush_periodically, name="usage-flusher", daemon=True).start()
+    atexit.register(flush_usage)
+
+
+def _flush_periodically() -> None:
+    while True:
+        time.sleep(USAGE_FLUSH_INTERVAL_SECONDS)
+        flush_usage()
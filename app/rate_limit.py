@@ -1,47 +1,255 @@
+import hashlib
+import math
+import os
+import threading
 import time
+from collections import OrderedDict
+from contextvars import ContextVar
 from dataclasses import dataclass
-from typing import Dict, Tuple
 
-from fastapi import HTTPException, status
+from fastapi import HTTPException, Request, status
+
+from .logs import get_logger
+from .metrics import RATE_LIMIT_BACKEND_ERRORS, RATE_LIMIT_REJECTIONS, record_cache_lookup
+from .quotas import charge_quota, record_ai_tokens, refund_quota
+from .rate_limit_backends import RATE_LIMIT_MAX_KEYS, get_rate_limit_backend
+
+log = get_logger(__name__)
 
 
 @dataclass(frozen=True)
 class RateLimitConfig:
+    requests_per_minute: int
+    # Bucket size: how many requests may arrive back to back.
+    burst: int
+
+    @property
+    def interval(self) -> float:
+        return 60.0 / self.requests_per_minute
+
+
+def _plan_config(plan: str, requests_per_minute: int, burst: int) -> RateLimitConfig:
+    prefix = f"RATE_LIMIT_{plan.upper()}"
+    return RateLimitConfig(
+        requests_per_minute=int(os.getenv(f"{prefix}_PER_MINUTE", str(requests_per_minute))),
+        burst=int(os.getenv(f"{prefix}_BURST", str(burst))),
+    )
+
+
+FREE_LIMIT = _plan_config("free", requests_per_minute=60, burst=20)
+PRO_LIMIT = _plan_config("pro", requests_per_minute=300, burst=60)
+
+PLAN_LIMITS = {"free": FREE_LIMIT, "pro": PRO_LIMIT}
+
+# Login attempts, checked before any password is hashed.
+LOGIN_IP_LIMIT = _plan_config("login_ip", requests_per_minute=20, burst=20)
+LOGIN_EMAIL_LIMIT = _plan_config("login_email", requests_per_minute=1, burst=5)
+
+# Upper bound on tokens a worker reserves from a shared backend at once.
+# Reserved tokens are served locally without a network hop.
+RATE_LIMIT_LEASE_SIZE = int(os.getenv("RATE_LIMIT_LEASE_SIZE", "10"))
+
+
+@dataclass(frozen=True)
+class RateLimitStatus:
     limit: int
-    window_seconds: int
+    remaining: int
+    # Seconds until the bucket is full again.
+    reset_seconds: float
 
+    def headers(self) -> dict[str, str]:
+        return {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_seconds)),
+        }
 
-# MVP defaults (adjust later)
-FREE_LIMIT = RateLimitConfig(limit=60, window_seconds=60)   # 60 requests per 60 seconds
-PRO_LIMIT = RateLimitConfig(limit=300, window_seconds=60)   # 300 requests per 60 seconds
 
-# api_key -> (window_start_epoch_seconds, request_count)
-_BUCKETS: Dict[str, Tuple[float, int]] = {}
+@dataclass
+class _Lease:
+    tokens: int
+    # Shared bucket state when the lease was taken.
+    tat: float
+    expires_at: float
 
 
-def enforce_rate_limit(api_key: str, plan: str) -> None:
-    """
-    Fixed-window rate limiting (MVP):
-    - Count requests per api_key within a time window
-    - Reset count when window expires
-    """
-    cfg = PRO_LIMIT if plan == "pro" else FREE_LIMIT
+# hashed api_key -> lease, least recently used first.
+_LEASES: "OrderedDict[str, _Lease]" = OrderedDict()
+_LEASE_LOCK = threading.Lock()
 
-    now = time.time()
-    window_start, count = _BUCKETS.get(api_key, (now, 0))
+# Set per request by `rate_limit_headers_middleware`.
+_RESPONSE_HEADERS: ContextVar[dict[str, str] | None] = ContextVar("rate_limit_headers", default=None)
+
+
+def _limiter_key(api_key: str) -> str:
+    # Shared backends never see raw API keys.
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+
+
+def _lease_size(cfg: RateLimitConfig, shared: bool) -> int:
+    if not shared:
+        return 1
+    # Keep leases small relative to the burst so workers holding unused
+    # tokens cannot starve each other.
+    return max(1, min(RATE_LIMIT_LEASE_SIZE, cfg.burst // 10))
+
+
+def _status(cfg: RateLimitConfig, tat: float, now: float, leased: int) -> RateLimitStatus:
+    available = int((cfg.burst * cfg.interval - (tat - now)) / cfg.interval + 1e-9)
+    return RateLimitStatus(
+        limit=cfg.burst,
+        remaining=max(0, available) + leased,
+        reset_seconds=max(0.0, tat - now),
+    )
+
+
+def _retry_after(cfg: RateLimitConfig, tat: float, now: float, cost: int = 1) -> int:
+    # `cost` tokens are free once tat is within (burst - cost) intervals.
+    return max(1, math.ceil(tat - now - (cfg.burst - cost) * cfg.interval))
+
+
+def _record(result):
+    headers = _RESPONSE_HEADERS.get()
+    if headers is not None:
+        headers.update(result.headers())
+    return result
+
+
+def _take_from_lease(key: str, cfg: RateLimitConfig, cost: int, now: float) -> RateLimitStatus | None:
+    with _LEASE_LOCK:
+        lease = _LEASES.get(key)
+        if lease is None or lease.expires_at <= now or lease.tokens < cost:
+            return None
+        lease.tokens -= cost
+        _LEASES.move_to_end(key)
+        return _status(cfg, lease.tat, now, lease.tokens)
 
-    # Reset the window if expired
-    if now - window_start >= cfg.window_seconds:
-        window_start, count = now, 0
 
-    count += 1
-    _BUCKETS[api_key] = (window_start, count)
+def _store_lease(key: str, tokens: int, tat: float, expires_at: float, now: float) -> None:
+    with _LEASE_LOCK:
+        _LEASES[key] = _Lease(tokens=tokens, tat=tat, expires_at=expires_at)
+        _LEASES.move_to_end(key)
 
-    # Enforce limit
-    if count > cfg.limit:
-        retry_after = max(0, int(cfg.window_seconds - (now - window_start)))
+        while _LEASES:
+            oldest_key, oldest = next(iter(_LEASES.items()))
+            if oldest.expires_at > now and len(_LEASES) <= RATE_LIMIT_MAX_KEYS:
+                break
+            del _LEASES[oldest_key]
+
+
+def _take_tokens(key: str, plan: str, cfg: RateLimitConfig, cost: int, now: float) -> RateLimitStatus | None:
+    leased = _take_from_lease(key, cfg, cost, now)
+    record_cache_lookup("rate_limit_lease", leased is not None)
+    if leased is not None:
+        return _record(leased)
+
+    backend = get_rate_limit_backend()
+    try:
+        state = backend.take(key, cost, cost + _lease_size(cfg, backend.shared) - 1, cfg.burst, cfg.interval, now)
+    except Exception as e:
+        # Fail open: an unavailable limiter store must not take the API down.
+        RATE_LIMIT_BACKEND_ERRORS.inc(backend=backend.name)
+        log.warning("rate_limit.backend_failed", backend=backend.name, error=f"{type(e).__name__}: {e}")
+        return None
+
+    if state.granted == 0:
+        RATE_LIMIT_REJECTIONS.inc(plan=plan, reason="rate_limit")
+        result = _record(_status(cfg, state.tat, now, 0))
+        retry_after = _retry_after(cfg, state.tat, now, cost)
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail=f"Rate limit exceeded. Try again in ~{retry_after}s.",
-            headers={"Retry-After": str(retry_after)},
+            headers={"Retry-After": str(retry_after), **result.headers()},
+        )
+
+    left = state.granted - cost
+    if left:
+        # Leftover tokens stay usable for as long as the bucket needs to
+        # regenerate them.
+        _store_lease(key, left, state.tat, now + max(1.0, left * cfg.interval), now)
+
+    return _record(_status(cfg, state.tat, now, left))
+
+
+def enforce_rate_limit(api_key: str, plan: str, cost: int = 1, ai: bool = False) -> RateLimitStatus | None:
+    """
+    Token-bucket rate limiting per API key: each plan refills at
+    `requests_per_minute` and allows up to `burst` requests back to back,
+    so no window boundary doubles the allowance. Buckets are shared by every
+    worker through the backend selected by `RATE_LIMIT_BACKEND`.
+
+    A request is charged `cost` units of the key's daily and monthly quotas
+    and then takes `cost` tokens (see `quotas.request_cost`, capped at the
+    burst). `ai=True` also requires AI token budget to be left. A request
+    refused by either check uses up neither: the quota is checked first and
+    refunded if the rate limit refuses.
+    """
+    cfg = PLAN_LIMITS.get(plan, FREE_LIMIT)
+    key = _limiter_key(api_key)
+    cost = max(1, cost)
+
+    quota = _record(charge_quota(key, plan, cost, ai=ai))
+    if quota.exceeded:
+        RATE_LIMIT_REJECTIONS.inc(plan=plan, reason=quota.exceeded)
+        retry_after = max(1, math.ceil(quota.reset_seconds))
+        budget = "AI token budget" if quota.exceeded == "ai_tokens" else "Usage quota"
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"{budget} exhausted. Resets in ~{retry_after}s.",
+            headers={"Retry-After": str(retry_after), **quota.headers()},
         )
+
+    try:
+        return _take_tokens(key, plan, cfg, min(cost, cfg.burst), time.time())
+    except HTTPException:
+        refund_quota(key, cost)
+        raise
+
+
+def record_ai_usage(api_key: str, plan: str, tokens: int | None) -> None:
+    """Charge the LLM tokens of a completed AI request to the key's budget."""
+    if tokens:
+        _record(record_ai_tokens(_limiter_key(api_key), plan, tokens))
+
+
+def enforce_login_throttle(client_ip: str | None, email: str) -> None:
+    """
+    Throttle login attempts per client IP and per account. Runs before the
+    password is checked, so credential-stuffing bursts are refused without
+    spending any bcrypt time.
+    """
+    checks = [(f"login-email:{_limiter_key(email.strip().lower())}", LOGIN_EMAIL_LIMIT)]
+    if client_ip:
+        checks.insert(0, (f"login-ip:{_limiter_key(client_ip)}", LOGIN_IP_LIMIT))
+
+    backend = get_rate_limit_backend()
+    now = time.time()
+    for key, cfg in checks:
+        try:
+            state = backend.take(key, 1, 1, cfg.burst, cfg.interval, now)
+        except Exception as e:
+            RATE_LIMIT_BACKEND_ERRORS.inc(backend=backend.name)
+            log.warning("rate_limit.backend_failed", backend=backend.name, error=f"{type(e).__name__}: {e}")
+            return
+
+        if state.granted == 0:
+            RATE_LIMIT_REJECTIONS.inc(plan="login", reason=key.partition(":")[0])
+            retry_after = _retry_after(cfg, state.tat, now)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Too many login attempts. Try again in ~{retry_after}s.",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+
+async def rate_limit_headers_middleware(request: Request, call_next):
+    """Adds the `X-RateLimit-*` and `X-Quota-*` headers of the request's checks."""
+    headers: dict[str, str] = {}
+    token = _RESPONSE_HEADERS.set(headers)
+    try:
+        response = await call_next(request)
+    finally:
+        _RESPONSE_HEADERS.reset(token)
+
+    response.headers.update(headers)
+    return response
@@ -0,0 +1,315 @@
+import hashlib
+import os
+import socket
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Protocol
+from urllib.parse import urlparse
+
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from app.db import get_db_connection
+
+
+@dataclass(frozen=True)
+class BucketState:
+    # Tokens granted out of the ones requested (0 when fewer than the
+    # required amount were available).
+    granted: int
+    # Theoretical arrival time after this call: the bucket is full again at
+    # `tat`, and holds `(burst * interval - (tat - now)) / interval` tokens.
+    tat: float
+
+
+class RateLimitBackend(Protocol):
+    name: str
+    # Local backends are not worth leasing from.
+    shared: bool
+
+    def take(self, key: str, required: int, tokens: int, burst: int, interval: float, now: float) -> BucketState:
+        """
+        Atomically take up to `tokens` from `key`'s bucket, or nothing if
+        fewer than `required` are available.
+        """
+        ...
+
+
+def _gcra(tat: float | None, required: int, tokens: int, burst: int, interval: float, now: float) -> BucketState:
+    """
+    Token bucket as GCRA: the whole per-key state is one timestamp. A bucket
+    refills one token every `interval` seconds up to `burst` tokens.
+    """
+    tat = max(tat or now, now)
+    available = int((burst * interval - (tat - now)) / interval + 1e-9)
+    granted = min(tokens, available) if available >= required else 0
+    return BucketState(granted=granted, tat=tat + granted * interval)
+
+
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+class MemoryBackend:
+    name = "memory"
+    shared = False
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS) -> None:
+        # key -> tat, least recently used first.
+        self._buckets: "OrderedDict[str, float]" = OrderedDict()
+        self._max_keys = max_keys
+        self._lock = threading.Lock()
+
+    def take(self, key: str, required: int, tokens: int, burst: int, interval: float, now: float) -> BucketState:
+        with self._lock:
+            state = _gcra(self._buckets.get(key), required, tokens, burst, interval, now)
+            self._buckets[key] = state.tat
+            self._buckets.move_to_end(key)
+
+            # A bucket whose tat has passed is full, which is the same as not
+            # tracking it, so idle keys are dropped from the cold end. Past
+            # the cap, the least recently used keys go even if not yet full.
+            while self._buckets:
+                oldest_key, oldest_tat = next(iter(self._buckets.items()))
+                if oldest_tat > now and len(self._buckets) <= self._max_keys:
+                    break
+                del self._buckets[oldest_key]
+
+        return state
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RespError(Exception):
+    pass
+
+
+class _RespClient:
+    """
+    Minimal Redis-protocol (RESP2) client: enough for pipelined commands
+    against Redis or any compatible server (Valkey, KeyDB, Dragonfly).
+    """
+
+    def __init__(self, url: str, timeout: float) -> None:
+        parsed = urlparse(url)
+        self._host = parsed.hostname or "localhost"
+        self._port = parsed.port or 6379
+        self._password = parsed.password
+        self._db = int((parsed.path or "/0").lstrip("/") or 0)
+        self._timeout = timeout
+        self._sock: socket.socket | None = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> None:
+        self._sock = socket.create_connection((self._host, self._port), timeout=self._timeout)
+        self._reader = self._sock.makefile("rb")
+        setup: list[tuple] = []
+        if self._password:
+            setup.append(("AUTH", self._password))
+        if self._db:
+            setup.append(("SELECT", self._db))
+        if setup:
+            self._send(setup)
+            for _ in setup:
+                self._read_reply()
+
+    def _close(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._reader = None
+
+    @staticmethod
+    def _encode(command: tuple) -> bytes:
+        parts = [f"*{len(command)}\r\n".encode()]
+        for arg in command:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        return b"".join(parts)
+
+    def _send(self, commands: list[tuple]) -> None:
+        self._sock.sendall(b"".join(self._encode(command) for command in commands))
+
+    def _read_reply(self) -> Any:
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by server")
+        prefix, body = line[:1], line[1:-2]
+        if prefix == b"+":
+            return body.decode()
+        if prefix == b"-":
+            return RespError(body.decode())
+        if prefix == b":":
+            return int(body)
+        if prefix == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if prefix == b"*":
+            length = int(body)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise RespError(f"unexpected reply: {line!r}")
+
+    def pipeline(self, *commands: tuple) -> list[Any]:
+        """Send every command in one write and read all replies back."""
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._send(list(commands))
+                replies = [self._read_reply() for _ in commands]
+            except (OSError, ConnectionError):
+                self._close()
+                raise
+
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+
+# KEYS[1] = bucket key; ARGV = now, interval, burst, required, tokens.
+_GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local required = tonumber(ARGV[4])
+local tokens = tonumber(ARGV[5])
+local tat = tonumber(redis.call('GET', KEYS[1]) or ARGV[1])
+if tat < now then tat = now end
+local available = math.floor((burst * interval - (tat - now)) / interval + 1e-9)
+local granted = 0
+if available >= required then granted = math.min(tokens, available) end
+tat = tat + granted * interval
+if granted > 0 then
+    redis.call('SET', KEYS[1], string.format('%.6f', tat), 'PX', math.ceil((tat - now) * 1000) + 1000)
+end
+return {granted, string.format('%.6f', tat)}
+"""
+
+
+class RedisBackend:
+    """
+    Buckets in any Redis-protocol server. The GCRA update runs as one Lua
+    script (one round trip, atomic), and keys expire once their bucket is
+    full again.
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str, timeout: float = 0.25) -> None:
+        self._client = _RespClient(url, timeout)
+        self._script_sha = hashlib.sha1(_GCRA_SCRIPT.encode("utf-8")).hexdigest()
+
+    def take(self, key: str, required: int, tokens: int, burst: int, interval: float, now: float) -> BucketState:
+        args = (f"rl:{key}", repr(now), repr(interval), burst, required, tokens)
+        try:
+            (reply,) = self._client.pipeline(("EVALSHA", self._script_sha, 1, *args))
+        except RespError as e:
+            if not str(e).startswith("NOSCRIPT"):
+                raise
+            (reply,) = self._client.pipeline(("EVAL", _GCRA_SCRIPT, 1, *args))
+
+        granted, tat = reply
+        return BucketState(granted=int(granted), tat=float(tat))
+
+
+# Applied by `python -m app.maintenance migrate`, whichever backend is
+# selected, so switching to `postgres` needs no extra step.
+RATE_LIMIT_BUCKETS_DDL = """
+    CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+        key TEXT PRIMARY KEY,
+        tat DOUBLE PRECISION NOT NULL,
+        granted INTEGER NOT NULL
+    );
+"""
+
+_POSTGRES_AVAILABLE = "floor((%(burst)s * %(interval)s - (GREATEST(b.tat, %(now)s) - %(now)s)) / %(interval)s + 1e-9)"
+_POSTGRES_GRANTED = (
+    f"(CASE WHEN {_POSTGRES_AVAILABLE} >= %(required)s "
+    f"THEN LEAST(%(tokens)s, {_POSTGRES_AVAILABLE}) ELSE 0 END)"
+)
+_POSTGRES_TAKE_SQL = f"""
+    INSERT INTO rate_limit_buckets AS b (key, tat, granted)
+    SELECT %(key)s, %(now)s + granted * %(interval)s, granted
+    FROM (
+        SELECT CASE WHEN %(burst)s >= %(required)s THEN LEAST(%(tokens)s, %(burst)s) ELSE 0 END AS granted
+    ) fresh
+    ON CONFLICT (key) DO UPDATE
+    SET granted = {_POSTGRES_GRANTED}::int,
+        tat = GREATEST(b.tat, %(now)s) + {_POSTGRES_GRANTED} * %(interval)s
+    RETURNING tat, granted;
+"""
+
+
+class PostgresBackend:
+    """
+    Buckets in an UNLOGGED table (no WAL, so cheap to update and lost on a
+    crash, which only refills every bucket). The upsert takes the row lock,
+    so the GCRA check-and-take is atomic in one statement. Full buckets are
+    deleted every `PRUNE_INTERVAL_SECONDS`.
+    """
+
+    name = "postgres"
+    shared = True
+
+    PRUNE_INTERVAL_SECONDS = 60.0
+
+    def __init__(self) -> None:
+        self._conn = None
+        self._lock = threading.Lock()
+        self._pruned_at = 0.0
+
+    def _cursor(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = get_db_connection()
+            self._conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        return self._conn.cursor()
+
+    def take(self, key: str, required: int, tokens: int, burst: int, interval: float, now: float) -> BucketState:
+        params = {
+            "key": key,
+            "required": required,
+            "tokens": tokens,
+            "burst": burst,
+            "interval": interval,
+            "now": now,
+        }
+
+        with self._lock:
+            try:
+                cur = self._cursor()
+                cur.execute(_POSTGRES_TAKE_SQL, params)
+                row = cur.fetchone()
+
+                if now - self._pruned_at >= self.PRUNE_INTERVAL_SECONDS:
+                    self._pruned_at = now
+                    cur.execute("DELETE FROM rate_limit_buckets WHERE tat < %s;", (now,))
+                cur.close()
+            except Exception:
+                if self._conn is not None:
+                    self._conn.close()
+                self._conn = None
+                raise
+
+        return BucketState(granted=row["granted"], tat=row["tat"])
+
+
+@lru_cache(maxsize=1)
+def get_rate_limit_backend() -> RateLimitBackend:
+    backend_name = os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower()
+    if backend_name == "redis":
+        return RedisBackend(os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0"))
+    if backend_name == "postgres":
+        return PostgresBackend()
+    return MemoryBackend()
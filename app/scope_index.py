@@ -0,0 +1,132 @@
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Iterable
+
+# `namespace:segment.segment`, optionally ending in a `*` wildcard segment
+# (`auth:*`, `billing:invoices.*`).
+SCOPE_PATTERN = re.compile(r"\b[a-z][a-z0-9_-]*:(?:\*|[a-z0-9_-]+(?:\.[a-z0-9_-]+)*(?:\.\*)?)")
+
+WILDCARD = "*"
+
+
+def normalize_scope(scope: str) -> str:
+    return scope.strip().lower()
+
+
+def scope_segments(scope: str) -> list[str]:
+    namespace, _, path = normalize_scope(scope).partition(":")
+    segments = [namespace]
+    if path:
+        segments.extend(path.split("."))
+    return [segment for segment in segments if segment]
+
+
+@dataclass
+class _ScopeNode:
+    children: dict[str, "_ScopeNode"] = field(default_factory=dict)
+    # Entries holding exactly the scope that ends at this node.
+    exact: list[int] = field(default_factory=list)
+    # Entries holding `<this node's scope>.*` / `<namespace>:*`.
+    wildcard: list[int] = field(default_factory=list)
+
+
+@dataclass
+class ScopeIndex:
+    """
+    Scope trie keyed by `namespace` and dotted path segments.
+
+    Matching is hierarchical in both directions: an entry holding `auth:*`
+    matches a query for `auth:legacy`, and a query for `billing:*` matches
+    every entry holding a `billing:` sub-scope. Lookups walk one path of the
+    trie (plus the matched subtree for wildcard queries), so their cost
+    depends on the query and the matches, not on the number of entries.
+    Positions follow insertion order, so results keep dataset order.
+    """
+
+    entry_count: int = 0
+    root: _ScopeNode = field(default_factory=_ScopeNode)
+    scope_count: int = 0
+    posting_count: int = 0
+    build_ms: float = 0.0
+
+    @classmethod
+    def build(cls, entry_scopes: Iterable[Iterable[str]]) -> "ScopeIndex":
+        started = time.perf_counter()
+        index = cls()
+
+        for position, scopes in enumerate(entry_scopes):
+            index.entry_count = position + 1
+            seen: set[str] = set()
+            for scope in scopes:
+                normalized = normalize_scope(scope)
+                if normalized and normalized not in seen:
+                    seen.add(normalized)
+                    index._insert(normalized, position)
+
+        index.build_ms = (time.perf_counter() - started) * 1000
+        return index
+
+    def _insert(self, scope: str, position: int) -> None:
+        segments = scope_segments(scope)
+        if not segments:
+            return
+
+        is_wildcard = segments[-1] == WILDCARD
+        if is_wildcard:
+            segments = segments[:-1]
+
+        node = self.root
+        for segment in segments:
+            node = node.children.setdefault(segment, _ScopeNode())
+
+        postings = node.wildcard if is_wildcard else node.exact
+        if not postings:
+            self.scope_count += 1
+        postings.append(position)
+        self.posting_count += 1
+
+    def lookup(self, scopes: Iterable[str]) -> list[int]:
+        matched: set[int] = set()
+        for scope in scopes:
+            self._match(scope_segments(scope), matched)
+        return sorted(matched)
+
+    def _match(self, segments: list[str], matched: set[int]) -> None:
+        if not segments:
+            return
+
+        is_wildcard = segments[-1] == WILDCARD
+        if is_wildcard:
+            segments = segments[:-1]
+
+        node = self.root
+        for segment in segments:
+            node = node.children.get(segment)
+            if node is None:
+                return
+            # Entry wildcards on the queried scope or any of its ancestors
+            # cover it.
+            matched.update(node.wildcard)
+
+        if is_wildcard:
+            self._collect_subtree(node, matched)
+        else:
+            matched.update(node.exact)
+
+    @staticmethod
+    def _collect_subtree(node: _ScopeNode, matched: set[int]) -> None:
+        stack = list(node.children.values())
+        while stack:
+            current = stack.pop()
+            matched.update(current.exact)
+            matched.update(current.wildcard)
+            stack.extend(current.children.values())
+
+    def stats(self) -> dict:
+        return {
+            "entries": self.entry_count,
+            "scopes": self.scope_count,
+            "postings": self.posting_count,
+            "build_ms": round(self.build_ms, 3),
+        }
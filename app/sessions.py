@@ -0,0 +1,389 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import select
+import threading
+import time
+from dataclasses import dataclass
+
+from fastapi import Header, HTTPException, status
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from app.db import get_db_connection
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+NOTIFY_CHANNEL = "app_sessions_revoked"
+
+ACCESS_TOKEN_TTL_SECONDS = int(os.getenv("ACCESS_TOKEN_TTL_SECONDS", "900"))
+REFRESH_TOKEN_TTL_SECONDS = int(os.getenv("REFRESH_TOKEN_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# Workspace-scoped endpoints always check a bearer token that is sent; this
+# makes one mandatory.
+APP_AUTH_REQUIRED = os.getenv("APP_AUTH_REQUIRED", "false").strip().lower() in ("1", "true", "yes")
+
+# How long startup waits for the revocation list before giving up.
+SESSION_REVOCATION_LOAD_TIMEOUT_SECONDS = float(os.getenv("SESSION_REVOCATION_LOAD_TIMEOUT_SECONDS", "10"))
+
+# Applied by `python -m app.maintenance migrate`.
+REVOKED_SESSIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS revoked_sessions (
+        session_id TEXT PRIMARY KEY,
+        expires_at TIMESTAMPTZ NOT NULL
+    );
+"""
+
+
+def _load_secrets() -> list[bytes]:
+    # Comma-separated: the first secret signs, every one verifies, so a new
+    # secret can be rolled out before the old one is dropped.
+    configured = [value.strip() for value in os.getenv("SESSION_SECRET", "").split(",") if value.strip()]
+    if configured:
+        return [value.encode("utf-8") for value in configured]
+
+    log.warning("session.secret_missing", detail="SESSION_SECRET is not set; tokens only verify in this process")
+    return [secrets.token_bytes(32)]
+
+
+SESSION_SECRETS = _load_secrets()
+
+
+class InvalidToken(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class SessionClaims:
+    # None for app tokens.
+    user_id: int | None
+    email: str | None
+    workspace_ids: tuple[int, ...]
+    session_id: str
+    # "access", "refresh" or "app".
+    token_type: str
+    expires_at: int
+    app_id: int | None = None
+
+    @property
+    def workspace_id(self) -> int | None:
+        return self.workspace_ids[0] if self.workspace_ids else None
+
+
+# session id -> unix time after which its tokens have expired anyway.
+_REVOKED: dict[str, float] = {}
+_LOCK = threading.Lock()
+_LISTENER_STARTED = False
+# Set once the listener has loaded `revoked_sessions`.
+_REVOCATIONS_LOADED = threading.Event()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _signature(payload: str, secret: bytes) -> str:
+    return _b64encode(hmac.new(secret, payload.encode("ascii"), hashlib.sha256).digest())
+
+
+def _encode_token(claims: dict) -> str:
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_signature(payload, SESSION_SECRETS[0])}"
+
+
+def decode_token(token: str, token_type: str | tuple[str, ...]) -> SessionClaims:
+    """Check signature, expiry and type. Revocation is checked separately."""
+    # Tokens are base64url; anything else cannot be signed or compared.
+    if not token.isascii():
+        raise InvalidToken("Malformed token")
+    try:
+        payload, signature = token.split(".")
+    except ValueError:
+        raise InvalidToken("Malformed token")
+
+    if not any(hmac.compare_digest(signature, _signature(payload, secret)) for secret in SESSION_SECRETS):
+        raise InvalidToken("Bad token signature")
+
+    try:
+        claims = json.loads(_b64decode(payload))
+        decoded = SessionClaims(
+            user_id=int(claims["sub"]) if "sub" in claims else None,
+            email=claims.get("email"),
+            workspace_ids=tuple(int(workspace_id) for workspace_id in claims["wids"]),
+            session_id=claims["sid"],
+            token_type=claims["typ"],
+            expires_at=int(claims["exp"]),
+            app_id=int(claims["app"]) if "app" in claims else None,
+        )
+    except (ValueError, KeyError, TypeError):
+        raise InvalidToken("Malformed token")
+
+    token_types = (token_type,) if isinstance(token_type, str) else token_type
+    if decoded.token_type not in token_types:
+        raise InvalidToken(f"Expected a {' or '.join(token_types)} token")
+    if decoded.expires_at <= time.time():
+        raise InvalidToken("Token expired")
+
+    return decoded
+
+
+def issue_tokens(user_id: int, email: str, workspace_ids: list[int], session_id: str | None = None) -> dict:
+    """Access and refresh token pair for a (new or refreshed) session."""
+    now = int(time.time())
+    session_id = session_id or secrets.token_urlsafe(16)
+    claims = {"sub": user_id, "email": email, "wids": list(workspace_ids), "sid": session_id, "iat": now}
+
+    return {
+        "access_token": _encode_token({**claims, "typ": "access", "exp": now + ACCESS_TOKEN_TTL_SECONDS}),
+        "refresh_token": _encode_token({**claims, "typ": "refresh", "exp": now + REFRESH_TOKEN_TTL_SECONDS}),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_TTL_SECONDS,
+    }
+
+
+def app_session_id(app_id: int, secret_version: int) -> str:
+    # Rotating an app's secret revokes this id, which ends every token and
+    # cached verification of the previous secret.
+    return f"app-{app_id}-v{secret_version}"
+
+
+def issue_app_token(app_id: int, workspace_id: int, secret_version: int, ttl_seconds: int) -> dict:
+    now = int(time.time())
+    token = _encode_token({
+        "typ": "app",
+        "app": app_id,
+        "wids": [workspace_id],
+        "sid": app_session_id(app_id, secret_version),
+        "iat": now,
+        "exp": now + ttl_seconds,
+    })
+    return {"access_token": token, "token_type": "bearer", "expires_in": ttl_seconds}
+
+
+def _remember_revoked(session_id: str, expires_at: float) -> None:
+    now = time.time()
+    with _LOCK:
+        _REVOKED[session_id] = max(expires_at, _REVOKED.get(session_id, 0.0))
+        for expired in [sid for sid, until in _REVOKED.items() if until <= now]:
+            del _REVOKED[expired]
+
+
+def is_session_revoked(session_id: str) -> bool:
+    _ensure_listener()
+    with _LOCK:
+        return session_id in _REVOKED
+
+
+def queue_session_revocation(cur, session_id: str, ttl_seconds: float = REFRESH_TOKEN_TTL_SECONDS) -> float:
+    """
+    Revoke a session inside the caller's transaction; workers learn about it
+    when the transaction commits. Returns the expiry to pass to
+    `remember_revoked_session` after the commit. Entries are kept only until
+    the session's tokens would have expired, so the list stays small.
+    """
+    expires_at = time.time() + ttl_seconds
+
+    cur.execute("DELETE FROM revoked_sessions WHERE expires_at < NOW();")
+    cur.execute(
+        """
+        INSERT INTO revoked_sessions (session_id, expires_at)
+        VALUES (%s, to_timestamp(%s))
+        ON CONFLICT (session_id) DO UPDATE
+        SET expires_at = GREATEST(revoked_sessions.expires_at, EXCLUDED.expires_at);
+        """,
+        (session_id, expires_at),
+    )
+    cur.execute("SELECT pg_notify(%s, %s);", (NOTIFY_CHANNEL, f"{session_id}:{expires_at}"))
+    return expires_at
+
+
+def remember_revoked_session(session_id: str, expires_at: float) -> None:
+    """Apply a committed revocation in this worker without waiting for NOTIFY."""
+    _remember_revoked(session_id, expires_at)
+
+
+def revoke_session(session_id: str) -> None:
+    """Revoke every token of a user session."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        expires_at = queue_session_revocation(cur, session_id)
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+    remember_revoked_session(session_id, expires_at)
+
+
+def refresh_session(refresh_token: str) -> dict:
+    """
+    Exchange a refresh token for a new token pair in the same session. This
+    is the one call that reads the database: it checks revocation and picks
+    up changes to the user's workspaces.
+    """
+    claims = decode_token(refresh_token, "refresh")
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT u.email,
+                   ARRAY(SELECT id FROM workspaces WHERE owner_user_id = u.id ORDER BY id) AS workspace_ids,
+                   EXISTS (SELECT 1 FROM revoked_sessions WHERE session_id = %s) AS revoked
+            FROM users u
+            WHERE u.id = %s;
+            """,
+            (claims.session_id, claims.user_id),
+        )
+        row = cur.fetchone()
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+    if row is None or row["revoked"]:
+        raise InvalidToken("Session revoked")
+
+    return issue_tokens(claims.user_id, row["email"], row["workspace_ids"], claims.session_id)
+
+
+def _bearer_token(authorization: str | None) -> str | None:
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    return token.strip()
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def verify_access_token(token: str, token_types: tuple[str, ...] = ("access",)) -> SessionClaims:
+    claims = decode_token(token, token_types)
+    if is_session_revoked(claims.session_id):
+        raise InvalidToken("Session revoked")
+    return claims
+
+
+def _session_from_header(authorization: str | None, token_types: tuple[str, ...]) -> SessionClaims:
+    token = _bearer_token(authorization)
+    if token is None:
+        raise _unauthorized("Missing bearer token")
+
+    try:
+        return verify_access_token(token, token_types)
+    except InvalidToken as e:
+        raise _unauthorized(str(e))
+
+
+def require_session(authorization: str | None = Header(default=None, alias="Authorization")) -> SessionClaims:
+    """Signed user access token from `Authorization: Bearer`; no database access."""
+    return _session_from_header(authorization, ("access",))
+
+
+def optional_session(
+    authorization: str | None = Header(default=None, alias="Authorization"),
+) -> SessionClaims | None:
+    """User access token or app token, for workspace-scoped endpoints."""
+    if _bearer_token(authorization) is None and not APP_AUTH_REQUIRED:
+        return None
+    return _session_from_header(authorization, ("access", "app"))
+
+
+def authorize_workspace(session: SessionClaims | None, workspace_id: int) -> None:
+    if session is not None and workspace_id not in session.workspace_ids:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No access to this workspace",
+        )
+
+
+def _ensure_listener() -> None:
+    global _LISTENER_STARTED
+
+    with _LOCK:
+        if _LISTENER_STARTED:
+            return
+        _LISTENER_STARTED = True
+
+    threading.Thread(
+        target=_listen_for_revocations,
+        name="session-revocation-listener",
+        daemon=True,
+    ).start()
+
+
+def start_revocation_listener(timeout: float = SESSION_REVOCATION_LOAD_TIMEOUT_SECONDS) -> None:
+    """
+    Start listening for revocations and wait for the first load of
+    `revoked_sessions`. Run at startup: until the list is loaded, tokens of
+    revoked sessions would still verify.
+    """
+    _ensure_listener()
+    if not _REVOCATIONS_LOADED.wait(timeout):
+        raise RuntimeError(f"Revoked sessions not loaded within {timeout:g}s")
+
+
+def _load_revocations(cur) -> None:
+    cur.execute(
+        """
+        SELECT session_id, extract(epoch FROM expires_at) AS expires_at
+        FROM revoked_sessions
+        WHERE expires_at > NOW();
+        """
+    )
+    revoked = {row["session_id"]: float(row["expires_at"]) for row in cur.fetchall()}
+    with _LOCK:
+        _REVOKED.clear()
+        _REVOKED.update(revoked)
+    _REVOCATIONS_LOADED.set()
+
+
+def _listen_for_revocations() -> None:
+    while True:
+        conn = None
+        try:
+            conn = get_db_connection()
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {NOTIFY_CHANNEL};")
+
+            # Listening before loading, so no revocation falls in between.
+            _load_revocations(cur)
+
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    session_id, _, expires_at = conn.notifies.pop(0).payload.rpartition(":")
+                    try:
+                        _remember_revoked(session_id, float(expires_at))
+                    except ValueError:
+                        _load_revocations(cur)
+
+        except Exception as e:
+            log.warning("session.listener_failed", error=f"{type(e).__name__}: {e}")
+            time.sleep(5)
+
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
@@ -1,12 +1,20 @@
 import re
+import time
+from dataclasses import dataclass
 from typing import List
 from .ai import get_provider
+from .scope_index import SCOPE_PATTERN
+from .partner_catalog import impacted_partners_for_workspace
+from .logs import get_logger
+from .metrics import AI_FALLBACKS, AI_REQUEST_SECONDS, AI_TOKENS, TRANSLATE_STAGE_SECONDS
 from .models import (
     TranslateRequest,
     TranslateResponse,
     ExtractedChange,
 )
 
+log = get_logger(__name__)
+
 
 CHANGE_KEYWORDS = {
     "added": ["added", "introduce", "new feature"],
@@ -150,7 +158,7 @@ def build_follow_up_questions(risks: List[str]) -> List[str]:
 
 
 def detect_scopes(text: str) -> List[str]:
-    found = re.findall(r"\b[a-z][a-z0-9_-]*:[a-z0-9_.*-]+\b", text.lower())
+    found = SCOPE_PATTERN.findall(text.lower())
     seen = set()
     ordered: List[str] = []
     for scope in found:
@@ -160,7 +168,18 @@ def detect_scopes(text: str) -> List[str]:
     return ordered
 
 
-def translate(req: TranslateRequest) -> TranslateResponse:
+@dataclass
+class TranslationTimings:
+    translate_ms: float | None = None
+    ai_ms: float | None = None
+    ai_input_tokens: int | None = None
+    ai_output_tokens: int | None = None
+    ai_total_tokens: int | None = None
+
+
+def translate(req: TranslateRequest, timings: TranslationTimings | None = None) -> TranslateResponse:
+    started = time.perf_counter()
+
     lines = [normalize_text(line) for line in split_into_lines(req.raw_text)]
     normalized_text = normalize_text(req.raw_text)
 
@@ -186,8 +205,17 @@ def translate(req: TranslateRequest) -> TranslateResponse:
         extracted_changes=extracted,
         impact_level=impact_level,
     )
+    TRANSLATE_STAGE_SECONDS.observe(time.perf_counter() - started, stage="rules")
+
+    if req.workspace_id is not None and scopes:
+        with TRANSLATE_STAGE_SECONDS.time(stage="partners"):
+            response.impacted_partners = impacted_partners_for_workspace(req.workspace_id, scopes)
+
+    if timings is not None:
+        timings.translate_ms = (time.perf_counter() - started) * 1000
 
     if req.mode == "ai":
+        ai_started = time.perf_counter()
         provider = get_provider()
         response.ai_provider = provider.name
 
@@ -195,6 +223,7 @@ def translate(req: TranslateRequest) -> TranslateResponse:
         response.ai_model = getattr(provider, "model", None)
         response.ai_prompt_version = getattr(provider, "prompt_version", None)
         response.ai_error_message = None
+        outcome = "success"
 
         try:
             response.ai_enhancement = provider.enhance(req, response)
@@ -215,5 +244,23 @@ def translate(req: TranslateRequest) -> TranslateResponse:
         except Exception as e:
             response.ai_fallback_used = True
             response.ai_error_message = str(e)
-            print(f"[AI ERROR] {type(e).__name__}: {e}")
+            outcome = "fallback"
+            AI_FALLBACKS.inc(provider=provider.name, reason=type(e).__name__)
+            log.warning("ai.fallback", provider=provider.name, error=f"{type(e).__name__}: {e}")
+
+        ai_seconds = time.perf_counter() - ai_started
+        AI_REQUEST_SECONDS.observe(ai_seconds, provider=provider.name, outcome=outcome)
+        TRANSLATE_STAGE_SECONDS.observe(ai_seconds, stage="ai")
+
+        usage = getattr(provider, "last_usage", None) or {}
+        for kind in ("input", "output"):
+            if usage.get(f"{kind}_tokens"):
+                AI_TOKENS.inc(usage[f"{kind}_tokens"], provider=provider.name, kind=kind)
+
+        if timings is not None:
+            timings.ai_ms = ai_seconds * 1000
+            timings.ai_input_tokens = usage.get("input_tokens")
+            timings.ai_output_tokens = usage.get("output_tokens")
+            timings.ai_total_tokens = usage.get("total_tokens")
+
     return response
@@ -1,39 +1,42 @@
-import bcrypt
+from starlette.concurrency import run_in_threadpool
+
 from app.db import get_db_connection
+from app.logs import get_logger
+from app.passwords import hash_password, needs_rehash, verify_password
+
+log = get_logger(__name__)
+
+# Applied by `python -m app.maintenance migrate`. The plan is set by billing,
+# never by API callers; workspace API keys take it from here.
+WORKSPACES_DDL = """
+    ALTER TABLE workspaces ADD COLUMN IF NOT EXISTS plan TEXT NOT NULL DEFAULT 'free';
+"""
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode(), hashed.encode())
+async def create_user(email: str, password: str, full_name: str, business_name: str | None):
+    # Hashed on the password executor, not on a request thread.
+    password_hash = await hash_password(password)
 
-def create_user(email: str, password: str, full_name: str, business_name: str | None):
-    print("START create_user")
+    return await run_in_threadpool(_insert_user, email, password_hash, full_name, business_name)
 
+
+def _insert_user(email: str, password_hash: str, full_name: str, business_name: str | None):
     conn = get_db_connection()
     cur = conn.cursor()
 
     try:
-        print("DB connected")
-
-        password_hash = hash_password(password)
-        print("Password hashed")
-
         cur.execute("""
             INSERT INTO users (email, password_hash, full_name)
             VALUES (%s, %s, %s)
             RETURNING id;
         """, (email, password_hash, full_name))
 
-        print("AFTER USER EXECUTE")
         user_row = cur.fetchone()
-        print("USER FETCH RESULT:", user_row)
 
         if user_row is None:
             raise Exception("User insert failed — no ID returned")
 
         user_id = user_row["id"]
-        print("User ID:", user_id)
 
         workspace_name = business_name if business_name else f"{full_name}'s Workspace"
 
@@ -43,18 +46,15 @@ def create_user(email: str, password: str, full_name: str, business_name: str |
             RETURNING id;
         """, (user_id, workspace_name))
 
-        print("AFTER WORKSPACE EXECUTE")
         workspace_row = cur.fetchone()
-        print("WORKSPACE FETCH RESULT:", workspace_row)
 
         if workspace_row is None:
             raise Exception("Workspace insert failed — no ID returned")
 
         workspace_id = workspace_row["id"]
-        print("Workspace ID:", workspace_id)
 
         conn.commit()
-        print("COMMIT SUCCESS")
+        log.info("user.created", user_id=user_id, workspace_id=workspace_id)
 
         return {
             "user_id": user_id,
@@ -65,68 +65,91 @@ def create_user(email: str, password: str, full_name: str, business_name: str |
         }
 
     except Exception as e:
-        print("ROLLBACK TRIGGERED:", repr(e))
+        log.warning("user.create_failed", error=type(e).__name__)
         conn.rollback()
         raise e
 
     finally:
         cur.close()
         conn.close()
-        print("CONNECTION CLOSED")
 
 
-def login_user(email: str, password: str):
-    conn = get_db_connection()
-    cur = conn.cursor()
+async def login_user(email: str, password: str):
+    user_row = await run_in_threadpool(_fetch_login_user, email)
 
-    try:
-        print("START login_user")
+    if user_row is None:
+        raise Exception("Invalid email or password")
 
-        cur.execute("""
-            SELECT id, email, password_hash, full_name
-            FROM users
-            WHERE email = %s
-            LIMIT 1;
-        """, (email,))
+    stored_hash = user_row["password_hash"]
+    if not stored_hash:
+        raise Exception("Invalid email or password")
 
-        user_row = cur.fetchone()
-        print("LOGIN USER ROW:", user_row)
+    if not await verify_password(password, stored_hash):
+        raise Exception("Invalid email or password")
 
-        if user_row is None:
-            raise Exception("Invalid email or password")
+    if needs_rehash(stored_hash):
+        # Upgrade to the configured cost while the plaintext is at hand. A
+        # failure here must not fail the login.
+        try:
+            new_hash = await hash_password(password)
+            await run_in_threadpool(_update_password_hash, user_row["id"], stored_hash, new_hash)
+        except Exception as e:
+            log.warning("user.rehash_failed", user_id=user_row["id"], error=f"{type(e).__name__}: {e}")
 
-        stored_hash = user_row["password_hash"]
-        if not stored_hash:
-            raise Exception("Invalid email or password")
+    if user_row["workspace_id"] is None:
+        raise Exception("Workspace not found for user")
 
-        if not verify_password(password, stored_hash):
-            raise Exception("Invalid email or password")
+    return {
+        "user_id": user_row["id"],
+        "email": user_row["email"],
+        "full_name": user_row["full_name"],
+        "workspace_id": user_row["workspace_id"],
+        "workspace_name": user_row["workspace_name"],
+        "workspace_ids": user_row["workspace_ids"],
+    }
 
-        user_id = user_row["id"]
 
+def _fetch_login_user(email: str):
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
         cur.execute("""
-            SELECT id, name
-            FROM workspaces
-            WHERE owner_user_id = %s
-            ORDER BY id ASC
+            SELECT u.id, u.email, u.password_hash, u.full_name,
+                   w.id AS workspace_id, w.name AS workspace_name,
+                   ARRAY(SELECT id FROM workspaces WHERE owner_user_id = u.id ORDER BY id) AS workspace_ids
+            FROM users u
+            LEFT JOIN LATERAL (
+                SELECT id, name
+                FROM workspaces
+                WHERE owner_user_id = u.id
+                ORDER BY id ASC
+                LIMIT 1
+            ) w ON TRUE
+            WHERE u.email = %s
             LIMIT 1;
-        """, (user_id,))
+        """, (email,))
 
-        workspace_row = cur.fetchone()
-        print("LOGIN WORKSPACE ROW:", workspace_row)
+        return cur.fetchone()
 
-        if workspace_row is None:
-            raise Exception("Workspace not found for user")
+    finally:
+        cur.close()
+        conn.close()
 
-        return {
-            "user_id": user_row["id"],
-            "email": user_row["email"],
-            "full_name": user_row["full_name"],
-            "workspace_id": workspace_row["id"],
-            "workspace_name": workspace_row["name"],
-        }
+
+def _update_password_hash(user_id: int, old_hash: str, new_hash: str) -> None:
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        # Skipped if the password changed since it was read.
+        cur.execute("""
+            UPDATE users
+            SET password_hash = %s
+            WHERE id = %s AND password_hash = %s;
+        """, (new_hash, user_id, old_hash))
+        conn.commit()
 
     finally:
         cur.close()
         conn.close()
-        print("LOGIN CONNECTION CLOSED")
\ No newline at end of file
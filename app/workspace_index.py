@@ -0,0 +1,216 @@
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any
+
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from app.db import get_db_connection
+from app.logs import get_logger
+from app.metrics import CACHE_ENTRIES, record_cache_lookup
+from app.scope_index import ScopeIndex
+
+log = get_logger(__name__)
+
+NOTIFY_CHANNEL = "partner_dataset_changed"
+
+WORKSPACE_INDEX_CACHE_SIZE = int(os.getenv("WORKSPACE_INDEX_CACHE_SIZE", "256"))
+# Safety net in case a change notification is missed by this worker.
+WORKSPACE_INDEX_TTL_SECONDS = float(os.getenv("WORKSPACE_INDEX_TTL_SECONDS", "300"))
+
+
+@dataclass
+class WorkspacePartnerIndex:
+    workspace_id: int
+    rows: list[dict[str, Any]] = field(default_factory=list)
+    index: ScopeIndex = field(default_factory=ScopeIndex)
+    # Row id at each position (ascending), for cursor paging.
+    ids: list[int] = field(default_factory=list)
+    # Normalized area -> row positions.
+    areas: dict[str, list[int]] = field(default_factory=dict)
+    loaded_at: float = 0.0
+
+    @classmethod
+    def from_rows(cls, workspace_id: int, db_rows: list[dict[str, Any]]) -> "WorkspacePartnerIndex":
+        rows: list[dict[str, Any]] = []
+        areas: dict[str, list[int]] = {}
+
+        for position, row in enumerate(db_rows):
+            area = row.get("area") or ""
+            rows.append({
+                "id": row["id"],
+                "partner_name": row.get("partner_name") or "",
+                "area": area,
+                "status": row.get("status") or "",
+            })
+            if area.strip():
+                areas.setdefault(area.strip().lower(), []).append(position)
+
+        return cls(
+            workspace_id=workspace_id,
+            rows=rows,
+            index=ScopeIndex.build(row.get("scopes") or [] for row in db_rows),
+            ids=[row["id"] for row in rows],
+            areas=areas,
+            loaded_at=time.monotonic(),
+        )
+
+    def matching_rows(self, scopes: list[str]) -> list[dict[str, Any]]:
+        return [self.rows[position] for position in self.index.lookup(scopes)]
+
+    def impacted_partner_names(self, scopes: list[str]) -> list[str]:
+        names: list[str] = []
+        seen: set[str] = set()
+        for row in self.matching_rows(scopes):
+            name = row["partner_name"]
+            if name and name not in seen:
+                seen.add(name)
+                names.append(name)
+        return names
+
+
+_CACHE: "OrderedDict[int, WorkspacePartnerIndex]" = OrderedDict()
+_GENERATIONS: dict[int, int] = {}
+_LOCK = threading.Lock()
+CACHE_ENTRIES.set_function(lambda: len(_CACHE), cache="workspace_index")
+_LISTENER_STARTED = False
+
+
+def _load_workspace_index(workspace_id: int) -> WorkspacePartnerIndex:
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        cur.execute(
+            """
+            SELECT id, partner_name, scopes, area, status
+            FROM partner_mappings
+            WHERE workspace_id = %s
+            ORDER BY id ASC;
+            """,
+            (workspace_id,),
+        )
+        db_rows = cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+
+    return WorkspacePartnerIndex.from_rows(workspace_id, db_rows)
+
+
+def get_workspace_index(workspace_id: int) -> WorkspacePartnerIndex:
+    """
+    Cached scope index over a workspace's `partner_mappings`.
+
+    Built lazily on first use and kept in a process-wide LRU. Writes in
+    `partners_api` invalidate the entry locally and notify other workers.
+    """
+    _ensure_listener()
+
+    now = time.monotonic()
+    with _LOCK:
+        cached = _CACHE.get(workspace_id)
+        if cached is not None and now - cached.loaded_at < WORKSPACE_INDEX_TTL_SECONDS:
+            _CACHE.move_to_end(workspace_id)
+            record_cache_lookup("workspace_index", True)
+            return cached
+        generation = _GENERATIONS.get(workspace_id, 0)
+
+    record_cache_lookup("workspace_index", False)
+
+    # Built outside the lock so a slow load does not block other workspaces.
+    loaded = _load_workspace_index(workspace_id)
+
+    with _LOCK:
+        # An invalidation that raced with the load means `loaded` may be
+        # stale; serve it for this call but do not cache it.
+        if _GENERATIONS.get(workspace_id, 0) == generation:
+            _CACHE[workspace_id] = loaded
+            _CACHE.move_to_end(workspace_id)
+            while len(_CACHE) > WORKSPACE_INDEX_CACHE_SIZE:
+                _CACHE.popitem(last=False)
+
+    return loaded
+
+
+def invalidate_workspace_index(workspace_id: int) -> None:
+    with _LOCK:
+        _GENERATIONS[workspace_id] = _GENERATIONS.get(workspace_id, 0) + 1
+        _CACHE.pop(workspace_id, None)
+
+
+def clear_workspace_indexes() -> None:
+    with _LOCK:
+        for workspace_id in list(_CACHE):
+            _GENERATIONS[workspace_id] = _GENERATIONS.get(workspace_id, 0) + 1
+        _CACHE.clear()
+
+
+def notify_workspace_changed(cur, workspace_id: int) -> None:
+    """
+    Queue a change notification inside the caller's transaction. Postgres
+    delivers it to every listening worker only when the transaction commits.
+    """
+    cur.execute("SELECT pg_notify(%s, %s);", (NOTIFY_CHANNEL, str(workspace_id)))
+
+
+def workspace_index_stats() -> dict:
+    with _LOCK:
+        return {
+            "cached_workspaces": len(_CACHE),
+            "capacity": WORKSPACE_INDEX_CACHE_SIZE,
+            "ttl_seconds": WORKSPACE_INDEX_TTL_SECONDS,
+        }
+
+
+def _ensure_listener() -> None:
+    global _LISTENER_STARTED
+
+    with _LOCK:
+        if _LISTENER_STARTED:
+            return
+        _LISTENER_STARTED = True
+
+    threading.Thread(
+        target=_listen_for_changes,
+        name="partner-dataset-listener",
+        daemon=True,
+    ).start()
+
+
+def _listen_for_changes() -> None:
+    while True:
+        conn = None
+        try:
+            conn = get_db_connection()
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {NOTIFY_CHANNEL};")
+
+            # Notifications sent while disconnected are lost.
+            clear_workspace_indexes()
+
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notification = conn.notifies.pop(0)
+                    try:
+                        invalidate_workspace_index(int(notification.payload))
+                    except ValueError:
+                        clear_workspace_indexes()
+
+        except Exception as e:
+            log.warning("workspace_index.listener_failed", error=f"{type(e).__name__}: {e}")
+            time.sleep(5)
+
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
@@ -25,6 +25,10 @@ export type FetchPartnersResponse = {
   rows: PartnerRow[];
 };
 
+type PartnersPage = FetchPartnersResponse & {
+  next_cursor: string | null;
+};
+
 export type UploadPartnersJsonResponse = {
   success: boolean;
   upload_id: number;
@@ -87,14 +91,35 @@ async function parseJsonOrThrow<T>(res: Response): Promise<T> {
   return data as T;
 }
 
+// The largest page `/partners/list` serves.
+const PARTNER_LIST_PAGE_SIZE = 1000;
+
+/** Every row of the workspace dataset, following `next_cursor` page by page. */
 export async function fetchPartners(
   workspaceId: number,
 ): Promise<FetchPartnersResponse> {
-  const res = await fetch(`${API_BASE}/partners/list/${workspaceId}`, {
-    cache: 'no-store',
-  });
-
-  return parseJsonOrThrow<FetchPartnersResponse>(res);
+  const rows: PartnerRow[] = [];
+  const columns: string[] = [];
+  let cursor: string | null = null;
+
+  do {
+    const params = new URLSearchParams({ limit: String(PARTNER_LIST_PAGE_SIZE) });
+    if (cursor) params.set('cursor', cursor);
+
+    const res = await fetch(`${API_BASE}/partners/list/${workspaceId}?${params}`, {
+      cache: 'no-store',
+    });
+    const page = await parseJsonOrThrow<PartnersPage>(res);
+
+    rows.push(...page.rows);
+    // Without saved columns each page derives them from its own rows.
+    for (const column of page.columns) {
+      if (!columns.includes(column)) columns.push(column);
+    }
+    cursor = page.next_cursor;
+  } while (cursor);
+
+  return { success: true, columns, rows };
 }
 
 export async function uploadPartnersJSON(
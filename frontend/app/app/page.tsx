@@ -14,7 +14,8 @@ type AppRow = {
   description: string;
   status: 'Sandbox' | 'Production review';
   clientId: string;
-  clientSecret: string;
+  // Only known right after create or rotate; the API never returns it again.
+  clientSecret: string | null;
   redirectUri: string;
   calls: string;
 };
@@ -25,7 +26,7 @@ type AppApiRow = {
   description?: string | null;
   status: string;
   client_id: string;
-  client_secret: string;
+  client_secret?: string | null;
   redirect_uri?: string | null;
 };
 
@@ -111,14 +112,6 @@ const notifications: NotificationRow[] = [
   },
 ];
 
-function generateClientId() {
-  return `cli_sbx_${Math.random().toString(36).slice(2, 12)}`;
-}
-
-function generateClientSecret() {
-  return `sec_sbx_${Math.random().toString(36).slice(2, 18)}`;
-}
-
 function normalizeStatus(status: string): 'Sandbox' | 'Production review' {
   return status.toLowerCase() === 'sandbox' ? 'Sandbox' : 'Production review';
 }
@@ -130,7 +123,7 @@ function mapApiAppToRow(app: AppApiRow): AppRow {
     description: app.description ?? '',
     status: normalizeStatus(app.status),
     clientId: app.client_id,
-    clientSecret: app.client_secret,
+    clientSecret: app.client_secret ?? null,
     redirectUri: app.redirect_uri ?? '',
     calls: '0',
   };
@@ -585,7 +578,6 @@ export default function AppHomePage() {
                 description: updated.description ?? '',
                 status: normalizeStatus(updated.status),
                 clientId: updated.client_id,
-                clientSecret: updated.client_secret,
                 redirectUri: updated.redirect_uri ?? '',
               }
         )
@@ -606,31 +598,42 @@ export default function AppHomePage() {
     }
   }
 
-  function handleRegenerateCredentials(appId: number) {
+  async function handleRegenerateCredentials(appId: number) {
     const target = apps.find((app) => app.id === appId);
     if (!target) {
       setConfirmRegenerateAppId(null);
       return;
     }
 
-    setApps((prev) =>
-      prev.map((app) =>
-        app.id === appId
-          ? { ...app, clientId: generateClientId(), clientSecret: generateClientSecret() }
-          : app
-      )
-    );
+    try {
+      const res = await fetch(`${API_BASE}/apps/rotate-secret/${appId}`, { method: 'POST' });
+      const data = await res.json();
 
-    setAppDrafts((prev) => ({
-      ...prev,
-      [appId]: {
-        ...(prev[appId] ?? { redirectUri: '', description: '', showSecret: false }),
-        showSecret: false,
-      },
-    }));
+      if (!res.ok) {
+        alert(data.detail || 'Unable to regenerate credentials.');
+        return;
+      }
 
-    setConfirmRegenerateAppId(null);
-    alert('Credential regeneration is UI-only right now. Backend endpoint not wired yet.');
+      setApps((prev) =>
+        prev.map((app) =>
+          app.id === appId
+            ? { ...app, clientId: data.client_id, clientSecret: data.client_secret }
+            : app
+        )
+      );
+
+      setAppDrafts((prev) => ({
+        ...prev,
+        [appId]: {
+          ...(prev[appId] ?? { redirectUri: '', description: '', showSecret: false }),
+          showSecret: true,
+        },
+      }));
+    } catch {
+      alert('Unable to reach the server.');
+    } finally {
+      setConfirmRegenerateAppId(null);
+    }
   }
 
   function openImpactDetails(row: PartnerRow) {
@@ -786,16 +789,22 @@ export default function AppHomePage() {
 
                       <div className="app-static-field">
                         <span>Client secret</span>
-                        <div className="app-static-field-value mono app-static-field-secret">
-                          <span>{draft.showSecret ? app.clientSecret : '••••••••••••••••••••'}</span>
-                          <button
-                            type="button"
-                            className="app-inline-link"
-                            onClick={() => toggleSecret(app.id)}
-                          >
-                            {draft.showSecret ? 'Hide' : 'Show'}
-                          </button>
-                        </div>
+                        {app.clientSecret ? (
+                          <div className="app-static-field-value mono app-static-field-secret">
+                            <span>{draft.showSecret ? app.clientSecret : '••••••••••••••••••••'}</span>
+                            <button
+                              type="button"
+                              className="app-inline-link"
+                              onClick={() => toggleSecret(app.id)}
+                            >
+                              {draft.showSecret ? 'Hide' : 'Show'}
+                            </button>
+                          </div>
+                        ) : (
+                          <div className="app-static-field-value">
+                            Shown once when created. Regenerate to get a new secret.
+                          </div>
+                        )}
                       </div>
 
                       <label className="app-edit-field">
@@ -1212,7 +1221,7 @@ export default function AppHomePage() {
             </div>
 
             <p className="app-modal-copy">
-              This will replace the current client ID and client secret for this app in the current workspace view.
+              This will replace the client secret for this app. The current secret and tokens issued with it stop working, and the new secret is shown only once.
             </p>
 
             <div className="app-card-actions app-card-actions-refined">
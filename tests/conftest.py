@@ -0,0 +1,10 @@
+import pytest
+
+from app import quotas
+
+
+@pytest.fixture(autouse=True)
+def no_usage_database(monkeypatch):
+    # Quota usage is read from and flushed to Postgres; tests run without one.
+    monkeypatch.setattr(quotas, "_ensure_flusher", lambda: None)
+    monkeypatch.setattr(quotas, "_read_usage", lambda key, periods: {})
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app import admission, main
+from app.auth import ApiCaller, require_api_key
+
+
+def test_pro_waiters_are_served_first_and_displace_free_ones():
+    pool = admission.AdmissionPool("test_priority", admission.AdmissionConfig(concurrency=1, max_queue=2, max_wait_seconds=5))
+    order = []
+
+    async def request(name, priority):
+        try:
+            await pool.acquire(priority)
+        except admission.Shed as e:
+            order.append(f"{name}:{e.reason}")
+            return
+        order.append(name)
+        await asyncio.sleep(0)
+        pool.release(0.01)
+
+    async def scenario():
+        await pool.acquire(0)
+        waiting = [
+            asyncio.create_task(request("free-1", 1)),
+            asyncio.create_task(request("free-2", 1)),
+        ]
+        await asyncio.sleep(0)
+        # The queue is full: the newest free waiter makes room.
+        waiting.append(asyncio.create_task(request("pro", 0)))
+        await asyncio.sleep(0)
+        pool.release(0.01)
+        await asyncio.gather(*waiting)
+
+    asyncio.run(scenario())
+
+    assert order == ["free-2:displaced", "pro", "free-1"]
+    assert pool.active == 0
+
+
+def test_free_callers_are_shed_first_when_the_queue_is_slow(monkeypatch):
+    pool = admission.AdmissionPool("test_latency", admission.AdmissionConfig(concurrency=1, max_queue=10, max_wait_seconds=4))
+    monkeypatch.setitem(admission.POOLS, "test_latency", pool)
+    pool.active = 1
+    # One waiter ahead, each request holds the slot for ~3s.
+    pool.service_seconds = 3.0
+
+    async def try_free():
+        async with admission.admit("test_latency", "free"):
+            pass
+
+    with pytest.raises(HTTPException) as shed:
+        asyncio.run(try_free())
+
+    assert shed.value.status_code == 503
+    assert shed.value.headers["Retry-After"] == "3"
+
+    async def try_pro():
+        task = asyncio.create_task(pool.acquire(admission.PLAN_PRIORITY["pro"]))
+        await asyncio.sleep(0)
+        pool.release(3.0)
+        await task
+
+    asyncio.run(try_pro())
+    assert pool.active == 1
+
+
+def test_rate_limited_callers_never_take_a_slot(monkeypatch):
+    def over_limit(*args):
+        raise HTTPException(status_code=429, detail="Rate limit exceeded.", headers={"Retry-After": "5"})
+
+    async def acquire(priority):
+        raise AssertionError("a rate-limited request reached admission")
+
+    monkeypatch.setattr(main, "enforce_rate_limit", over_limit)
+    monkeypatch.setattr(admission.POOLS["basic"], "acquire", acquire)
+    main.app.dependency_overrides[require_api_key] = lambda: ApiCaller(api_key="k", plan="free")
+    try:
+        response = TestClient(main.app).post("/v1/translate", json={"raw_text": "Fixed login", "audience": ["cs"]})
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert response.status_code == 429
+    assert admission.POOLS["basic"].active == 0
@@ -1,6 +1,8 @@
+import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
-from app.main import app
+from app.main import app, _parse_history_fields
 
 
 client = TestClient(app)
@@ -9,3 +11,26 @@ client = TestClient(app)
 def test_health_requires_auth():
     r = client.get('/health')
     assert r.status_code == 401
+
+
+def test_history_fields_reject_unknown_columns():
+    assert _parse_history_fields(None) is None
+    assert _parse_history_fields('id, mode,impact_level') == ['id', 'mode', 'impact_level']
+
+    with pytest.raises(HTTPException) as exc:
+        _parse_history_fields('id,password_hash')
+    assert exc.value.status_code == 400
+
+
+@pytest.mark.parametrize('workspace_id', [None, 7])
+def test_translate_rejects_a_foreign_workspace(workspace_id):
+    from app.auth import ApiCaller, require_api_key
+
+    app.dependency_overrides[require_api_key] = lambda: ApiCaller(api_key='k', plan='pro', workspace_id=workspace_id)
+    try:
+        r = client.post('/v1/translate', json={'raw_text': 'Changed scope read:users', 'audience': ['cs'], 'workspace_id': 8})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert r.status_code == 403
+    assert r.json()['detail'] == 'No access to this workspace'
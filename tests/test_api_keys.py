@@ -0,0 +1,87 @@
+from fastapi.testclient import TestClient
+
+from app import api_keys, sessions
+from app.api_keys import StoredApiKey
+from app.main import app
+
+
+def _use_fake_store(monkeypatch, stored):
+    loads = []
+
+    def load(key_hash):
+        loads.append(key_hash)
+        return stored.get(key_hash)
+
+    monkeypatch.setattr(api_keys, "_CACHE", api_keys.OrderedDict())
+    monkeypatch.setattr(api_keys, "_LISTENER_STARTED", True)
+    monkeypatch.setattr(api_keys, "_load_api_key", load)
+    return loads
+
+
+def test_lookup_caches_known_and_unknown_keys(monkeypatch):
+    raw_key = api_keys.generate_api_key()
+    key_hash = api_keys.hash_api_key(raw_key)
+    loads = _use_fake_store(monkeypatch, {key_hash: StoredApiKey(id=1, workspace_id=7, plan="pro")})
+
+    assert api_keys.lookup_api_key(raw_key).workspace_id == 7
+    assert api_keys.lookup_api_key(raw_key).plan == "pro"
+    unknown_key = api_keys.generate_api_key()
+    assert api_keys.lookup_api_key(unknown_key) is None
+    assert api_keys.lookup_api_key(unknown_key) is None
+
+    assert len(loads) == 2
+
+
+def test_malformed_keys_are_refused_without_a_lookup(monkeypatch):
+    loads = _use_fake_store(monkeypatch, {})
+    raw_key = api_keys.generate_api_key()
+
+    for malformed in ("ctk_unknown", raw_key[:-1], raw_key + "x", "xyz_" + raw_key[4:]):
+        assert api_keys.lookup_api_key(malformed) is None
+
+    assert loads == []
+
+
+def test_revocation_invalidates_cached_key(monkeypatch):
+    raw_key = api_keys.generate_api_key()
+    key_hash = api_keys.hash_api_key(raw_key)
+    stored = {key_hash: StoredApiKey(id=1, workspace_id=7, plan="free")}
+    _use_fake_store(monkeypatch, stored)
+
+    assert api_keys.lookup_api_key(raw_key) is not None
+
+    del stored[key_hash]
+    api_keys.invalidate_api_key(key_hash)
+
+    assert api_keys.lookup_api_key(raw_key) is None
+
+
+def test_known_key_survives_store_outage(monkeypatch):
+    raw_key = api_keys.generate_api_key()
+    key_hash = api_keys.hash_api_key(raw_key)
+    _use_fake_store(monkeypatch, {key_hash: StoredApiKey(id=1, workspace_id=7, plan="free")})
+    monkeypatch.setattr(api_keys, "API_KEY_CACHE_TTL_SECONDS", 0.0)
+
+    assert api_keys.lookup_api_key(raw_key) is not None
+
+    def unavailable(key_hash):
+        raise OSError("database down")
+
+    monkeypatch.setattr(api_keys, "_load_api_key", unavailable)
+
+    assert api_keys.lookup_api_key(raw_key).id == 1
+
+
+def test_key_management_requires_a_session_for_the_workspace(monkeypatch):
+    monkeypatch.setattr(sessions, "_LISTENER_STARTED", True)
+    monkeypatch.setattr(sessions, "_REVOKED", {})
+    client = TestClient(app)
+    token = sessions.issue_tokens(3, "ada@example.com", [7])["access_token"]
+    auth = {"Authorization": f"Bearer {token}"}
+
+    assert client.post("/api-keys/create", json={"workspace_id": 7}).status_code == 401
+    assert client.get("/api-keys/list/7").status_code == 401
+    assert client.post("/api-keys/revoke/1").status_code == 401
+
+    assert client.post("/api-keys/create", json={"workspace_id": 9, "plan": "pro"}, headers=auth).status_code == 403
+    assert client.get("/api-keys/list/9", headers=auth).status_code == 403
@@ -0,0 +1,118 @@
+import base64
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app_credentials, apps_api, sessions
+from app.main import app
+
+
+@pytest.fixture
+def stored_app(monkeypatch):
+    secret = app_credentials.generate_client_secret()
+    row = {"id": 5, "workspace_id": 7, "client_secret_hash": app_credentials.hash_client_secret(secret), "secret_version": 1}
+    loads = []
+
+    def load(client_id):
+        loads.append(client_id)
+        return dict(row) if client_id == "cli_test" else None
+
+    monkeypatch.setattr(app_credentials, "_CACHE", app_credentials.OrderedDict())
+    monkeypatch.setattr(app_credentials, "_load_app", load)
+    monkeypatch.setattr(sessions, "_LISTENER_STARTED", True)
+    monkeypatch.setattr(sessions, "_REVOKED", {})
+    return secret, row, loads
+
+
+def test_verification_is_cached_until_rotation(stored_app):
+    secret, row, loads = stored_app
+
+    for _ in range(3):
+        assert app_credentials.verify_client_credentials("cli_test", secret).secret_version == 1
+        assert app_credentials.verify_client_credentials("cli_test", "wrong") is None
+    assert len(loads) == 2
+
+    # Rotation on another worker: only the revocation list is pushed here.
+    row.update(client_secret_hash=app_credentials.hash_client_secret("rotated"), secret_version=2)
+    sessions.remember_revoked_session(sessions.app_session_id(5, 1), 2e9)
+
+    assert app_credentials.verify_client_credentials("cli_test", secret) is None
+    assert app_credentials.verify_client_credentials("cli_test", "rotated").secret_version == 2
+
+
+def test_token_endpoint_issues_workspace_scoped_app_tokens(stored_app):
+    secret, _, _ = stored_app
+    client = TestClient(app)
+
+    basic = base64.b64encode(f"cli_test:{secret}".encode()).decode()
+    r = client.post("/apps/token", data={"grant_type": "client_credentials"}, headers={"Authorization": f"Basic {basic}"})
+    assert r.status_code == 200
+    token = r.json()["access_token"]
+
+    claims = sessions.verify_access_token(token, ("app",))
+    assert (claims.app_id, claims.workspace_ids) == (5, (7,))
+
+    r = client.post("/partners/impact/9", json={"raw_text": "Fixed auth:read"}, headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 403
+    # App tokens are not user sessions.
+    assert client.get("/app-auth/me", headers={"Authorization": f"Bearer {token}"}).status_code == 401
+
+    r = client.post("/apps/token", data={"grant_type": "client_credentials", "client_id": "cli_test", "client_secret": "nope"})
+    assert r.status_code == 401
+
+
+@pytest.mark.parametrize("encoded", ["not-base64!", "é", base64.b64encode(b"\xff\xfe").decode()])
+def test_malformed_basic_credentials_are_rejected(stored_app, encoded):
+    # Header bytes arrive as latin-1, so "é" reaches the decoder as non-ASCII.
+    header = f"Basic {encoded}".encode("latin-1")
+    r = TestClient(app).post("/apps/token", data={"grant_type": "client_credentials"}, headers={"Authorization": header})
+
+    assert r.status_code == 401
+    assert r.headers["WWW-Authenticate"] == "Basic"
+
+
+class _FakeDeleteConnection:
+    def __init__(self, row):
+        self.row = row
+        self.statements = []
+        self.committed = False
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=()):
+        self.statements.append(query)
+
+    def fetchone(self):
+        return self.row
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_deleting_an_app_ends_its_tokens_and_cached_verifications(stored_app, monkeypatch):
+    secret, row, _ = stored_app
+    client = TestClient(app)
+    token = client.post(
+        "/apps/token", data={"grant_type": "client_credentials", "client_id": "cli_test", "client_secret": secret}
+    ).json()["access_token"]
+    assert any(key[0] == "cli_test" for key in app_credentials._CACHE)
+
+    conn = _FakeDeleteConnection({"id": 5, "workspace_id": 7, "client_id": "cli_test", "secret_version": 1})
+    monkeypatch.setattr(apps_api, "get_db_connection", lambda: conn)
+    user = sessions.issue_tokens(3, "ada@example.com", [7])["access_token"]
+
+    r = client.delete("/apps/delete/5", headers={"Authorization": f"Bearer {user}"})
+
+    assert r.status_code == 200
+    assert conn.committed
+    assert sessions.is_session_revoked(sessions.app_session_id(5, 1))
+    assert not any(key[0] == "cli_test" for key in app_credentials._CACHE)
+    r = client.post("/partners/impact/7", json={"raw_text": "Fixed auth:read"}, headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 401
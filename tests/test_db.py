@@ -0,0 +1,94 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from app import db
+from app.db import _decode_payload, _encode_payload, _hydrate_payloads, PAYLOAD_CODEC
+
+
+def test_payloads_are_content_addressed_and_compressed():
+    text = "Changed OAuth token rotation policy. " * 200
+
+    first_hash, data, size = _encode_payload(text)
+    second_hash, _, _ = _encode_payload(text)
+
+    assert first_hash == second_hash
+    assert size == len(text.encode("utf-8"))
+    assert len(data) < size // 10
+    assert _decode_payload(PAYLOAD_CODEC, data) == text
+
+
+def test_hydrate_prefers_payload_and_keeps_inline_legacy_values():
+    _, response_data, _ = _encode_payload(json.dumps({"impact_level": "high"}))
+
+    row = _hydrate_payloads({
+        "id": 2,
+        "raw_text": "legacy inline text",
+        "raw_text_codec": None,
+        "raw_text_data": None,
+        "response_json": None,
+        "response_json_codec": PAYLOAD_CODEC,
+        "response_json_data": response_data,
+    })
+
+    assert row == {"id": 2, "raw_text": "legacy inline text", "response_json": {"impact_level": "high"}}
+
+
+class _RecordingConnection:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.queries = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=None):
+        self.queries.append((" ".join(query.split()), params))
+
+    def fetchone(self):
+        return {"total_runs": 4, "basic_runs": 3, "ai_runs": 1}
+
+    def fetchall(self):
+        return self.rows
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_runs_update_hour_and_day_rollups_in_the_insert(monkeypatch):
+    conn = _RecordingConnection()
+    monkeypatch.setattr(db, "get_db_connection", lambda: conn)
+
+    db.insert_translation_run({"mode": "basic", "plan": "free", "impact_level": "low", "raw_text": "x"})
+
+    [(query, _)] = conn.queries
+    assert "INSERT INTO translation_run_rollups" in query
+    assert "(VALUES ('hour'), ('day'))" in query
+    assert "run_count = r.run_count + 1" in query
+
+
+def test_metrics_summary_reads_rollups_at_the_requested_granularity(monkeypatch):
+    conn = _RecordingConnection(rows=[{"bucket_start": datetime(2026, 10, 1), "total_runs": 4}])
+    monkeypatch.setattr(db, "get_db_connection", lambda: conn)
+
+    summary = db.fetch_metrics_summary()
+    assert summary == {"total_runs": 4, "basic_runs": 3, "ai_runs": 1}
+    assert conn.queries[-1][1] == ["day"]
+
+    # A start inside a day can only be honoured by hourly buckets.
+    db.fetch_metrics_summary(start=datetime(2026, 10, 1, 12, tzinfo=timezone.utc))
+    assert conn.queries[-1][1][0] == "hour"
+
+    summary = db.fetch_metrics_summary(granularity="day")
+    assert summary["granularity"] == "day"
+    assert summary["buckets"] == conn.rows
+
+    assert all("FROM translation_run_rollups" in query for query, _ in conn.queries)
+    assert not any("FROM translation_runs" in query for query, _ in conn.queries)
+
+    with pytest.raises(ValueError):
+        db.fetch_metrics_summary(granularity="week")
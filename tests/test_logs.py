@@ -0,0 +1,51 @@
+import json
+import logging
+
+from fastapi.testclient import TestClient
+
+from app import logs
+from app.main import app
+
+
+def test_request_id_is_echoed_or_generated():
+    client = TestClient(app)
+
+    assert client.get("/metrics", headers={"X-Request-ID": "abc-123"}).headers["X-Request-ID"] == "abc-123"
+
+    generated = client.get("/metrics", headers={"X-Request-ID": "not a valid id\n"}).headers["X-Request-ID"]
+    assert len(generated) == 16 and generated != "not a valid id\n"
+
+
+def test_records_are_redacted_and_sampled(monkeypatch):
+    monkeypatch.setattr(logs, "LOG_SAMPLE_RATES", {"noisy.event": 0.0})
+    request_filter = logs._RequestFilter()
+
+    def record(level, event, **fields):
+        entry = logging.LogRecord("app.test", level, __file__, 1, event, None, None)
+        entry.fields = fields
+        return entry
+
+    assert not request_filter.filter(record(logging.INFO, "noisy.event"))
+    assert request_filter.filter(record(logging.WARNING, "noisy.event"))
+
+    token = logs._REQUEST_ID.set("req-1")
+    try:
+        kept = record(
+            logging.INFO,
+            "user.created",
+            user_id=3,
+            password_hash="$2b$12$abc",
+            ai_total_tokens=120,
+            payload={"client_secret": "s3cret", "headers": {"Authorization": "Bearer x"}},
+        )
+        assert request_filter.filter(kept)
+    finally:
+        logs._REQUEST_ID.reset(token)
+
+    entry = json.loads(logs.JsonFormatter().format(kept))
+    assert entry["request_id"] == "req-1"
+    assert entry["event"] == "user.created"
+    assert entry["user_id"] == 3
+    assert entry["ai_total_tokens"] == 120
+    assert entry["password_hash"] == logs.REDACTED
+    assert entry["payload"] == {"client_secret": logs.REDACTED, "headers": {"Authorization": logs.REDACTED}}
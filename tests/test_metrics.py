@@ -0,0 +1,41 @@
+from fastapi.testclient import TestClient
+
+from app import metrics
+from app.main import app
+
+
+def test_metrics_endpoint_labels_requests_by_route_template():
+    client = TestClient(app)
+    client.get("/metrics")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == metrics.CONTENT_TYPE
+    assert "# TYPE http_request_duration_seconds histogram" in response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/metrics",status="200"}' in response.text
+
+
+def test_worker_snapshots_merge_counters_and_drop_dead_gauges(monkeypatch):
+    registry = metrics.Registry()
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+    requests = metrics.Counter("jobs_total", "Jobs.", ("kind",))
+    latency = metrics.Histogram("job_seconds", "Job latency.", buckets=(0.1, 1.0))
+    workers = metrics.Gauge("workers_busy", "Busy workers.")
+
+    requests.inc(kind='say "hi"')
+    latency.observe(0.05)
+    latency.observe(0.5)
+    workers.set_function(lambda: 3)
+    snapshot = registry.snapshot()
+
+    monkeypatch.setattr(metrics, "_pid_alive", lambda pid: pid == 1)
+    merged = metrics.merge_snapshots([{"pid": 1, "metrics": snapshot}, {"pid": 2, "metrics": snapshot}])
+    text = metrics.render_text(merged)
+
+    assert 'jobs_total{kind="say \\"hi\\""} 2' in text
+    assert 'job_seconds_bucket{le="0.1"} 2' in text
+    assert 'job_seconds_bucket{le="1"} 4' in text
+    assert 'job_seconds_bucket{le="+Inf"} 4' in text
+    assert "job_seconds_count 4" in text
+    assert "workers_busy 3" in text
@@ -0,0 +1,130 @@
+import gzip
+import json
+from datetime import date
+
+from psycopg2 import sql
+
+from app import partitions
+from app.db import PAYLOAD_CODEC, _encode_payload
+
+
+def _render(query) -> str:
+    if isinstance(query, str):
+        return query
+    if isinstance(query, sql.Composed):
+        return "".join(_render(part) for part in query.seq)
+    if isinstance(query, sql.Identifier):
+        return ".".join(f'"{name}"' for name in query.strings)
+    return query.string
+
+
+class _FakePartitionStore:
+    """Answers the catalog queries of `app.partitions` for `existing` partitions."""
+
+    def __init__(self, existing, rows=None, archive_dir=None):
+        self.existing = set(existing)
+        self.rows = rows or {}
+        self.archive_dir = archive_dir
+        # Partition -> whether its archive file was in place when it was dropped.
+        self.dropped = {}
+        self.result = []
+        self.statements = []
+
+    def cursor(self, name=None):
+        if name is not None:
+            return _ExportCursor(self, name.removeprefix("export_"))
+        return self
+
+    def execute(self, query, params=None):
+        text = " ".join(_render(query).split())
+        self.statements.append(text)
+        if "relkind" in text:
+            self.result = [{"relkind": "p"}]
+        elif "to_regclass" in text:
+            self.result = [{"existing": params[0] if params[0] in self.existing else None}]
+        elif "FROM pg_inherits" in text:
+            self.result = [{"name": name} for name in sorted(self.existing) + ["translation_runs_default"]]
+        elif text.startswith("DROP TABLE"):
+            name = text.split('"')[1]
+            self.existing.discard(name)
+            self.dropped[name] = (self.archive_dir / f"{name}.ndjson.gz").exists()
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _ExportCursor:
+    def __init__(self, store, partition):
+        self.store = store
+        self.partition = partition
+        self.itersize = None
+
+    def execute(self, query, params=None):
+        pass
+
+    def __iter__(self):
+        return iter(self.store.rows.get(self.partition, []))
+
+    def close(self):
+        pass
+
+
+def test_partition_names_round_trip_across_years():
+    assert partitions._add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert partitions._add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+
+    name = partitions._partition_name(date(2027, 2, 1))
+    assert name == "translation_runs_y2027m02"
+    assert partitions._partition_month(name) == date(2027, 2, 1)
+    assert partitions._partition_month("translation_runs_default") is None
+
+
+def test_future_partitions_are_created_once(monkeypatch):
+    store = _FakePartitionStore({"translation_runs_y2026m11"})
+    monkeypatch.setattr(partitions, "get_db_connection", lambda: store)
+    monkeypatch.setattr(partitions, "_utc_today", lambda: date(2026, 11, 15))
+
+    created = partitions.ensure_future_partitions(months_ahead=2)
+
+    assert created == ["translation_runs_y2026m12", "translation_runs_y2027m01"]
+    assert sum(statement.startswith("CREATE TABLE") for statement in store.statements) == 2
+
+
+def test_expired_partitions_are_exported_before_they_are_dropped(monkeypatch, tmp_path):
+    _, raw_text, _ = _encode_payload("Deprecated scope auth:legacy")
+    row = {
+        "line": json.dumps({"id": 1, "mode": "basic", "raw_text": None}),
+        "raw_text_codec": PAYLOAD_CODEC,
+        "raw_text_data": raw_text,
+        "response_json_codec": None,
+        "response_json_data": None,
+    }
+    store = _FakePartitionStore(
+        {"translation_runs_y2026m07", "translation_runs_y2026m08"},
+        rows={"translation_runs_y2026m07": [row]},
+        archive_dir=tmp_path,
+    )
+    monkeypatch.setattr(partitions, "get_db_connection", lambda: store)
+    monkeypatch.setattr(partitions, "_utc_today", lambda: date(2026, 11, 15))
+
+    archived = partitions.archive_expired_partitions(retention_months=3, archive_dir=str(tmp_path))
+
+    assert [item["partition"] for item in archived] == ["translation_runs_y2026m07"]
+    assert store.dropped == {"translation_runs_y2026m07": True}
+    assert store.existing == {"translation_runs_y2026m08"}
+    with gzip.open(tmp_path / "translation_runs_y2026m07.ndjson.gz", "rt", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert records == [{"id": 1, "mode": "basic", "raw_text": "Deprecated scope auth:legacy", "response_json": None}]
+    assert list(tmp_path.iterdir()) == [tmp_path / "translation_runs_y2026m07.ndjson.gz"]
@@ -0,0 +1,335 @@
+import csv
+import io
+import json
+import re
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from psycopg2 import sql
+
+from app import partners_api
+from app.main import app
+from app.workspace_index import WorkspacePartnerIndex
+
+
+client = TestClient(app)
+
+
+def _workspace(workspace_id):
+    return WorkspacePartnerIndex.from_rows(workspace_id, [
+        {"id": 10, "partner_name": "Northstar Bank", "scopes": ["auth:legacy"], "area": "Payments", "status": "mapped"},
+        {"id": 11, "partner_name": "Acme Payroll", "scopes": ["profile:read"], "area": "Billing", "status": "mapped"},
+        {"id": 12, "partner_name": "Orbit HR", "scopes": ["auth:*"], "area": "HR", "status": "mapped"},
+        {"id": 13, "partner_name": "Helios", "scopes": ["orders:read"], "area": "Orders", "status": "mapped"},
+    ])
+
+
+def test_bulk_impact_pages_and_streams(monkeypatch):
+    monkeypatch.setattr(partners_api, "get_workspace_index", _workspace)
+    body = {"raw_text": "Deprecated auth:legacy. Fixed invoice rounding in billing.", "limit": 2}
+
+    first = client.post('/partners/impact/7', json=body).json()
+    assert first["summary"] == {"total": 4, "impacted": 2, "review": 1, "none": 1}
+    assert [row["impact_status"] for row in first["rows"]] == ["impacted", "review"]
+    assert first["next_cursor"] == 11
+
+    second = client.post('/partners/impact/7', json={**body, "cursor": first["next_cursor"]}).json()
+    assert [row["id"] for row in second["rows"]] == [12, 13]
+    assert second["next_cursor"] is None
+
+    streamed = client.post('/partners/impact/7', json={**body, "stream": True, "impacted_only": True})
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    assert lines[0]["type"] == "summary"
+    assert [line["id"] for line in lines[1:]] == [10, 11, 12]
+
+
+def test_csv_parser_streams_quoted_newlines_and_wrapped_lines():
+    headers, rows = partners_api._iter_uploaded_csv_rows(io.StringIO(
+        'partner,scopes,area\n"Acme\nPayroll","auth:legacy,payments:read",Auth\n\n"Orbit HR,auth:*,HR"\n',
+        newline="",
+    ))
+
+    assert headers == ["partner", "scopes", "area"]
+    assert list(rows) == [
+        ["Acme\nPayroll", "auth:legacy,payments:read", "Auth"],
+        ["Orbit HR", "auth:*", "HR"],
+    ]
+
+
+def test_row_normalizer_resolves_aliases_once_per_header():
+    normalizer = partners_api._PartnerRowNormalizer(["Customer", " Permissions ", "Team", "Region", "region"])
+    assert normalizer.field_positions == {"partner_name": 0, "scopes": 1, "area": 2, "status": None}
+
+    rows = normalizer.normalize_batch([
+        ["Acme", "auth:read, auth:read,billing:*", "Auth", "EU", "US"],
+        ["", "", "", "", ""],
+    ])
+
+    assert rows[0] == {
+        "partner_name": "Acme",
+        "scopes": ["auth:read", "billing:*"],
+        "area": "Auth",
+        "status": "mapped",
+        "extra": {"Customer": "Acme", "Permissions": "auth:read, auth:read,billing:*", "Team": "Auth", "Region": "EU", "region": "US"},
+    }
+    assert rows[1]["partner_name"] == "Unknown"
+    assert rows[1]["scopes"] == []
+
+
+def test_multipart_csv_upload_requires_header():
+    r = client.post('/partners/upload-csv-file', data={"workspace_id": "7"}, files={"file": ("p.csv", b"\n\n")})
+    assert r.status_code == 400
+
+
+def test_merge_upload_rejects_unknown_key_column():
+    r = client.post('/partners/upload-json', json={
+        "workspace_id": 7,
+        "rows": [{"partner": "Acme", "scopes": "auth:legacy", "region": "EU"}],
+        "mode": "merge",
+        "merge_key": ["partner_name", "tier"],
+    })
+
+    assert r.status_code == 400
+    assert "tier" in r.json()["detail"]
+
+
+def test_list_cursor_round_trips_and_rejects_mismatched_sort():
+    row = {"id": 42, "partner_name": "Acme"}
+    cursor = partners_api._encode_list_cursor("partner_name", row)
+
+    assert partners_api._decode_list_cursor(cursor, "partner_name") == ("Acme", 42)
+    assert client.get(f"/partners/list/7?cursor={cursor}&sort=area").status_code == 400
+    assert client.get("/partners/list/7?cursor=not-a-cursor").status_code == 400
+
+
+def test_list_cursor_rejects_values_of_the_wrong_type():
+    def cursor(sort, value):
+        return partners_api._encode_list_cursor(sort, {"id": 42, sort: value})
+
+    created = datetime(2026, 1, 2, 3, 4, 5)
+    assert partners_api._decode_list_cursor(cursor("created_at", created), "created_at") == (created, 42)
+
+    for sort, value in [("partner_name", ["Acme"]), ("area", {"a": 1}), ("id", "42"), ("created_at", "soon")]:
+        r = client.get(f"/partners/list/7?cursor={cursor(sort, value)}&sort={sort}")
+        assert r.status_code == 400, (sort, value)
+
+
+def _render(query) -> str:
+    if isinstance(query, str):
+        return query
+    if isinstance(query, sql.Composed):
+        return "".join(_render(part) for part in query.seq)
+    if isinstance(query, sql.Identifier):
+        return ".".join(f'"{name}"' for name in query.strings)
+    return query.string
+
+
+class _FakePartnerStore:
+    """Answers the queries of `list_partners`, with Postgres NULL semantics."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.result = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=()):
+        text = _render(query)
+        if "partner_dataset_versions" in text:
+            self.result = [{"version": 3, "reset_version": 0}]
+        elif "COUNT(*)" in text:
+            self.result = [{"total": len(self.rows)}]
+        elif "FROM partner_mappings" in text:
+            self.result = self._page(text, params)
+        else:
+            self.result = []
+
+    def _page(self, text, params):
+        coalesced = """COALESCE("area", '')""" in text
+
+        def key(row):
+            return ("" if row["area"] is None else row["area"]) if coalesced else row["area"]
+
+        rows = self.rows
+        if len(params) == 4:
+            # A row comparison involving NULL is not true.
+            _, after_value, after_id, _ = params
+            rows = [
+                row for row in rows
+                if key(row) is not None and after_value is not None and (key(row), row["id"]) > (after_value, after_id)
+            ]
+        # Ascending order puts NULLs last.
+        rows = sorted(rows, key=lambda row: (key(row) is None, key(row) or "", row["id"]))
+        return [dict(row) for row in rows[: params[-1]]]
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+    def set_session(self, **kwargs):
+        pass
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_list_pages_across_null_sort_values(monkeypatch):
+    areas = {1: "Billing", 2: None, 3: "Auth", 4: None, 5: "", 6: "Auth"}
+    rows = [
+        {
+            "id": row_id, "workspace_id": 7, "upload_id": 1, "partner_name": f"P{row_id}", "scopes": [],
+            "area": area, "status": "mapped", "extra": {}, "created_at": datetime(2026, 1, 1),
+        }
+        for row_id, area in areas.items()
+    ]
+    monkeypatch.setattr(partners_api, "get_db_connection", lambda: _FakePartnerStore(rows))
+
+    seen, cursor = [], None
+    while True:
+        query = "sort=area&limit=2" + (f"&cursor={cursor}" if cursor else "")
+        page = client.get(f"/partners/list/7?{query}").json()
+        seen += [row["id"] for row in page["rows"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    # NULL areas sort with the empty one, and no page drops them.
+    assert seen == [2, 4, 5, 3, 6, 1]
+
+
+class _FakeCopyCursor:
+    """Loads `copy_expert` input the way Postgres reads FORMAT csv."""
+
+    def __init__(self):
+        self.loaded = []
+
+    def copy_expert(self, statement, buffer):
+        columns = [name.strip() for name in re.search(r"\(([^()]*)\)\s*FROM STDIN", statement).group(1).split(",")]
+        forced = re.search(r"FORCE_NOT_NULL \(([^()]*)\)", statement)
+        not_null = {name.strip() for name in forced.group(1).split(",")} if forced else set()
+        # csv.writer never quotes an empty field, and an unquoted empty
+        # field is NULL unless the column is listed in FORCE_NOT_NULL.
+        for record in csv.reader(buffer):
+            self.loaded.append({
+                column: None if value == "" and column not in not_null else value
+                for column, value in zip(columns, record)
+            })
+
+
+def test_copy_upload_keeps_empty_text_fields():
+    rows = partners_api._PartnerRowNormalizer(["partner", "area", "status"]).normalize_batch([["Acme", "", "live"]])
+    cur = _FakeCopyCursor()
+
+    partners_api._copy_partner_rows(cur, 7, 1, rows, 3)
+
+    assert cur.loaded[0]["partner_name"] == "Acme"
+    assert cur.loaded[0]["area"] == ""
+    assert cur.loaded[0]["status"] == "live"
+
+
+class _FakeMergeStore(_FakeCopyCursor):
+    """Answers the statements of a merge upload against `stored` rows."""
+
+    def __init__(self, stored, columns):
+        super().__init__()
+        self.stored = stored
+        self.columns = columns
+        self.versions_set = []
+        self.result = []
+        self.rowcount = 0
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=()):
+        text = _render(query)
+        self.result, self.rowcount = [], 0
+        if "CREATE TEMP TABLE partner_mappings_incoming" in text:
+            row_hash = re.search(r"md5\(jsonb_build_array\((.*?)\)::text\)", text).group(1)
+            self._diff(coalesced="COALESCE" in row_hash)
+        elif "SELECT version" in text:
+            self.result = [{"version": 3}]
+        elif "UPDATE partner_dataset_versions" in text:
+            self.versions_set.append(params[0])
+        elif "FROM partner_uploads" in text:
+            self.result = [{"id": 1, "source_type": "csv", "columns_order": self.columns}]
+        elif "DELETE FROM partner_mappings" in text:
+            self.rowcount = len(self.missing)
+        elif "UPDATE partner_mappings t" in text:
+            self.rowcount = self.changed
+        elif "INSERT INTO partner_mappings" in text:
+            self.rowcount = len(self.new)
+        elif "COUNT(*)" in text:
+            self.result = [{"total": len(self.loaded)}]
+
+    def _diff(self, coalesced):
+        def text(value):
+            return "" if value is None else value
+
+        def key(row):
+            return (text(row["partner_name"]).strip().lower(), text(row["area"]).strip().lower())
+
+        def content(row):
+            fields = [row[name] for name in ("partner_name", "area", "status")]
+            # jsonb_build_array(NULL, ...) hashes differently from "".
+            return [text(value) if coalesced else value for value in fields]
+
+        incoming = {key(row): row for row in self.loaded}
+        current = {key(row): row for row in self.stored}
+        self.missing = current.keys() - incoming.keys()
+        self.new = incoming.keys() - current.keys()
+        self.changed = sum(content(current[k]) != content(incoming[k]) for k in incoming.keys() & current.keys())
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_merge_reupload_with_empty_fields_keeps_the_version(monkeypatch):
+    stored = [
+        # Stored by an INSERT path, and COPY-loaded before empty fields were kept as "".
+        {"partner_name": "Acme", "area": "", "status": "mapped"},
+        {"partner_name": "Orbit", "area": None, "status": "mapped"},
+    ]
+    store = _FakeMergeStore(stored, ["partner", "area"])
+    monkeypatch.setattr(partners_api, "get_db_connection", lambda: store)
+
+    r = client.post(
+        "/partners/upload-csv-file",
+        data={"workspace_id": "7", "mode": "merge"},
+        files={"file": ("p.csv", b"partner,area\nAcme,\nOrbit,\n")},
+    )
+
+    assert r.status_code == 200, r.text
+    assert r.json()["version"] == 3
+    assert r.json()["changes"]["updated"] == 0
+    assert store.versions_set == []
+
+
+def test_list_etag_depends_on_version_and_query():
+    from starlette.requests import Request
+
+    def request(query: str, if_none_match: str | None = None) -> Request:
+        headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+        return Request({"type": "http", "path": "/", "query_string": query.encode(), "headers": headers})
+
+    etag = partners_api._list_etag(7, 3, request("limit=50"))
+
+    assert etag != partners_api._list_etag(7, 4, request("limit=50"))
+    assert etag != partners_api._list_etag(7, 3, request("limit=50&sort=area"))
+    assert partners_api._etag_matches(request("limit=50", f'"x", W/{etag}'), etag)
+    assert not partners_api._etag_matches(request("limit=50"), etag)
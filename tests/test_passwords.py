@@ -0,0 +1,36 @@
+import asyncio
+import threading
+
+import pytest
+
+from app import passwords
+
+
+def test_hash_verify_and_rehash_on_cost_change(monkeypatch):
+    monkeypatch.setattr(passwords, "PASSWORD_BCRYPT_ROUNDS", 4)
+    hashed = asyncio.run(passwords.hash_password("s3cret"))
+
+    assert asyncio.run(passwords.verify_password("s3cret", hashed))
+    assert not asyncio.run(passwords.verify_password("wrong", hashed))
+    assert not asyncio.run(passwords.verify_password("s3cret", "not-a-bcrypt-hash"))
+    assert not passwords.needs_rehash(hashed)
+
+    monkeypatch.setattr(passwords, "PASSWORD_BCRYPT_ROUNDS", 5)
+    assert passwords.needs_rehash(hashed)
+
+
+def test_full_queue_refuses_new_hashes(monkeypatch):
+    monkeypatch.setattr(passwords, "_SLOTS", threading.BoundedSemaphore(1))
+    release = threading.Event()
+
+    async def scenario():
+        blocked = asyncio.ensure_future(passwords._run(release.wait))
+        await asyncio.sleep(0)
+        with pytest.raises(passwords.PasswordHasherBusy):
+            await passwords.hash_password("s3cret")
+        release.set()
+        await blocked
+
+    asyncio.run(scenario())
+    # The slot is given back once the blocked hash finishes.
+    assert passwords._SLOTS.acquire(blocking=False)
@@ -0,0 +1,253 @@
+import socketserver
+import threading
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app import auth, quotas, rate_limit
+from app.main import app
+from app.rate_limit_backends import MemoryBackend, RedisBackend, _gcra
+
+
+class _FakeRespHandler(socketserver.StreamRequestHandler):
+    """
+    Redis-protocol stand-in: answers EVALSHA with NOSCRIPT and runs EVAL of
+    the GCRA script in Python.
+    """
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2].decode())
+
+            if args[0] == "EVALSHA":
+                self.wfile.write(b"-NOSCRIPT No matching script.\r\n")
+                continue
+
+            key, now, interval = args[3], float(args[4]), float(args[5])
+            burst, required, tokens = int(args[6]), int(args[7]), int(args[8])
+            state = _gcra(store.get(key), required, tokens, burst, interval, now)
+            if state.granted:
+                store[key] = state.tat
+            tat = f"{state.tat:.6f}".encode()
+            self.wfile.write(f"*2\r\n:{state.granted}\r\n${len(tat)}\r\n".encode() + tat + b"\r\n")
+
+
+@pytest.fixture
+def resp_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _FakeRespHandler)
+    server.daemon_threads = True
+    server.store = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_gcra_refills_without_boundary_bursts():
+    state = _gcra(None, 1, 10, 10, 1.0, 100.0)
+    assert state.granted == 10
+
+    # Empty bucket: one token per interval, never a fresh full window.
+    assert _gcra(state.tat, 1, 5, 10, 1.0, 100.5).granted == 0
+    assert _gcra(state.tat, 1, 5, 10, 1.0, 102.0).granted == 2
+    # Weighted takes are all or nothing.
+    assert _gcra(state.tat, 3, 5, 10, 1.0, 102.0).granted == 0
+
+
+def test_redis_backend_falls_back_to_eval(resp_server):
+    host, port = resp_server.server_address
+    backend = RedisBackend(f"redis://{host}:{port}/0")
+
+    assert backend.take("k", 1, 4, 6, 1.0, 1000.0).granted == 4
+    assert backend.take("k", 1, 4, 6, 1.0, 1000.0).granted == 2
+    assert backend.take("k", 1, 4, 6, 1.0, 1000.0).granted == 0
+
+
+def test_memory_backend_evicts_idle_keys_and_caps_tracked_keys():
+    backend = MemoryBackend(max_keys=3)
+    for index in range(5):
+        backend.take(f"key-{index}", 1, 1, 10, 1.0, 1000.0)
+    assert len(backend) == 3
+
+    # Every earlier bucket has refilled by now, so only this one is kept.
+    backend.take("late", 1, 1, 10, 1.0, 2000.0)
+    assert len(backend) == 1
+
+
+def test_leased_tokens_are_served_locally(monkeypatch):
+    calls = []
+
+    class CountingBackend(MemoryBackend):
+        shared = True
+
+        def take(self, *args):
+            calls.append(args)
+            return super().take(*args)
+
+    monkeypatch.setattr(rate_limit, "get_rate_limit_backend", lambda backend=CountingBackend(): backend)
+    monkeypatch.setattr(rate_limit, "_LEASES", rate_limit.OrderedDict())
+    monkeypatch.setattr(rate_limit, "PLAN_LIMITS", {"free": rate_limit.RateLimitConfig(60, 100)})
+
+    for _ in range(10):
+        rate_limit.enforce_rate_limit("lease-test-key", "free")
+
+    assert len(calls) == 1
+
+
+def test_rate_limit_rejects_over_burst_with_headers(monkeypatch):
+    monkeypatch.setattr(rate_limit, "get_rate_limit_backend", lambda backend=MemoryBackend(): backend)
+    monkeypatch.setattr(rate_limit, "PLAN_LIMITS", {"free": rate_limit.RateLimitConfig(1, 2)})
+
+    assert rate_limit.enforce_rate_limit("limit-test-key", "free").remaining == 1
+    assert rate_limit.enforce_rate_limit("limit-test-key", "free").remaining == 0
+    with pytest.raises(HTTPException) as exc:
+        rate_limit.enforce_rate_limit("limit-test-key", "free")
+
+    assert exc.value.status_code == 429
+    assert exc.value.headers["X-RateLimit-Remaining"] == "0"
+    assert int(exc.value.headers["Retry-After"]) >= 1
+
+
+def test_rate_limit_headers_are_added_to_responses(monkeypatch):
+    monkeypatch.setattr(auth, "FREE_KEYS", {"headers-test-key"})
+    monkeypatch.setattr(quotas, "_USAGE", {})
+    monkeypatch.setattr(quotas, "_FLUSHER_STARTED", True)
+
+    r = TestClient(app).get("/health", headers={"X-API-Key": "headers-test-key"})
+
+    assert r.status_code == 200
+    assert r.headers["X-RateLimit-Limit"] == str(rate_limit.FREE_LIMIT.burst)
+    assert "X-RateLimit-Remaining" in r.headers
+    assert r.headers["X-Quota-Remaining"] == str(quotas.FREE_QUOTA.daily_units - 1)
+
+
+def test_request_cost_weighs_mode_size_and_batch():
+    assert quotas.request_cost() == 1
+    assert quotas.request_cost("basic", quotas.QUOTA_COST_BYTES_PER_UNIT) == 1
+    assert quotas.request_cost("basic", quotas.QUOTA_COST_BYTES_PER_UNIT + 1) == 2
+    assert quotas.request_cost("ai", 100 * 1024, 2) == 13 * quotas.QUOTA_COST_AI_MULTIPLIER * 2
+
+
+def test_quota_is_charged_by_cost_and_flushed_in_batches(monkeypatch):
+    written = []
+
+    def write_usage(batch):
+        written.append(batch)
+        # Another worker has used 5 units of the day in the meantime.
+        return [(key, period, start, units + 5, ai_tokens) for key, period, start, units, ai_tokens in batch]
+
+    monkeypatch.setattr(quotas, "_USAGE", {})
+    monkeypatch.setattr(quotas, "_FLUSHER_STARTED", True)
+    monkeypatch.setattr(quotas, "_write_usage", write_usage)
+    monkeypatch.setattr(quotas, "PLAN_QUOTAS", {"free": quotas.QuotaConfig(20, 0, 0, 0)})
+    monkeypatch.setattr(rate_limit, "get_rate_limit_backend", lambda backend=MemoryBackend(): backend)
+
+    result = rate_limit.enforce_rate_limit("quota-test-key", "free", cost=8)
+    assert result is not None
+    assert quotas.flush_usage() == 2
+    assert [row[3] for row in written[0]] == [8, 8]
+    assert quotas.flush_usage() == 0
+
+    # 8 here + 5 elsewhere: another 8 would exceed the daily 20.
+    with pytest.raises(HTTPException) as exc:
+        rate_limit.enforce_rate_limit("quota-test-key", "free", cost=8)
+
+    assert exc.value.status_code == 429
+    assert exc.value.headers["X-Quota-Remaining"] == "7"
+    assert int(exc.value.headers["Retry-After"]) <= 86400
+
+
+def test_quota_counters_start_from_stored_usage(monkeypatch):
+    reads = []
+
+    def read_usage(key, periods):
+        reads.append(periods)
+        day, month = (start for _, start in periods)
+        return {("day", day): (15, 0), ("month", month): (40, 0)}
+
+    monkeypatch.setattr(quotas, "_USAGE", {})
+    monkeypatch.setattr(quotas, "_read_usage", read_usage)
+    monkeypatch.setattr(quotas, "PLAN_QUOTAS", {"free": quotas.QuotaConfig(20, 0, 0, 0)})
+
+    # A fresh worker: 15 of the day's 20 units were used before it started.
+    assert quotas.charge_quota("stored-key", "free", 5).remaining == 0
+    assert quotas.charge_quota("stored-key", "free", 1).exceeded == "quota"
+    assert len(reads) == 1
+
+
+def test_failed_usage_reads_back_off(monkeypatch):
+    reads = []
+
+    def read_usage(key, periods):
+        reads.append(periods)
+        raise ConnectionError("database down")
+
+    monkeypatch.setattr(quotas, "_USAGE", {})
+    monkeypatch.setattr(quotas, "_LOAD_RETRY_AT", 0.0)
+    monkeypatch.setattr(quotas, "_read_usage", read_usage)
+
+    for _ in range(3):
+        assert quotas.charge_quota("outage-key", "free", 1).exceeded is None
+    assert len(reads) == 1
+
+    monkeypatch.setattr(quotas, "_LOAD_RETRY_AT", 0.0)
+    quotas.charge_quota("outage-key", "free", 1)
+    assert len(reads) == 2
+
+
+def test_refused_requests_use_neither_quota_nor_tokens(monkeypatch):
+    monkeypatch.setattr(quotas, "_USAGE", {})
+    monkeypatch.setattr(quotas, "PLAN_QUOTAS", {"free": quotas.QuotaConfig(1, 0, 0, 0)})
+    monkeypatch.setattr(rate_limit, "get_rate_limit_backend", lambda backend=MemoryBackend(): backend)
+    monkeypatch.setattr(rate_limit, "PLAN_LIMITS", {"free": rate_limit.RateLimitConfig(1, 2)})
+
+    rate_limit.enforce_rate_limit("refund-key", "free")
+    with pytest.raises(HTTPException) as exc:
+        rate_limit.enforce_rate_limit("refund-key", "free")
+    assert "quota" in exc.value.detail
+
+    # The quota refusal left the second token in the bucket.
+    monkeypatch.setattr(quotas, "PLAN_QUOTAS", {"free": quotas.QuotaConfig(5, 0, 0, 0)})
+    assert rate_limit.enforce_rate_limit("refund-key", "free").remaining == 0
+
+    # And the rate limit refusal gives its quota units back.
+    with pytest.raises(HTTPException) as exc:
+        rate_limit.enforce_rate_limit("refund-key", "free")
+    assert "Rate limit" in exc.value.detail
+    assert quotas.charge_quota(rate_limit._limiter_key("refund-key"), "free", 0).remaining == 3
+
+
+def test_ai_token_budget_refuses_requests_once_spent(monkeypatch):
+    monkeypatch.setattr(quotas, "_USAGE", {})
+    monkeypatch.setattr(quotas, "_FLUSHER_STARTED", True)
+    monkeypatch.setattr(quotas, "PLAN_QUOTAS", {"pro": quotas.QuotaConfig(0, 0, 0, 1000)})
+
+    key = "ai-budget-key"
+    assert quotas.charge_quota(key, "pro", 10, ai=True).exceeded is None
+    assert quotas.record_ai_tokens(key, "pro", 1200).ai_tokens_remaining == 0
+    assert quotas.charge_quota(key, "pro", 10, ai=True).exceeded == "ai_tokens"
+    # Non-AI requests only draw on unit quotas.
+    assert quotas.charge_quota(key, "pro", 10).exceeded is None
+
+
+def test_login_throttle_limits_each_account(monkeypatch):
+    monkeypatch.setattr(rate_limit, "get_rate_limit_backend", lambda backend=MemoryBackend(): backend)
+
+    for _ in range(rate_limit.LOGIN_EMAIL_LIMIT.burst):
+        rate_limit.enforce_login_throttle("10.0.0.1", "victim@example.com")
+
+    with pytest.raises(HTTPException) as exc:
+        rate_limit.enforce_login_throttle("10.0.0.2", " Victim@Example.com")
+    assert exc.value.status_code == 429
+    assert "Retry-After" in exc.value.headers
+
+    # Other accounts are unaffected.
+    rate_limit.enforce_login_throttle("10.0.0.2", "someone@example.com")
@@ -0,0 +1,89 @@
+import json
+import os
+
+from app import partner_catalog
+from app.catalog_index import CatalogIndex, compile_catalog_index
+from app.partner_catalog import catalog_index_stats, impacted_partners_for_scopes
+from app.scope_index import ScopeIndex
+
+
+def test_scope_index_lookup_is_normalized_and_ordered():
+    index = ScopeIndex.build([
+        ["auth:legacy", "payments:read"],
+        ["Auth:Token.Rotate"],
+        [" auth:legacy ", "AUTH:LEGACY"],
+    ])
+
+    assert index.lookup(["auth:token.rotate", "auth:legacy"]) == [0, 1, 2]
+    assert index.lookup(["orders:read"]) == []
+    assert index.stats()["postings"] == 4
+
+
+def test_scope_index_matches_wildcards_in_both_directions():
+    index = ScopeIndex.build([
+        ["auth:*"],
+        ["billing:invoices.read"],
+        ["billing:invoices.*"],
+        ["auth:token.rotate"],
+        ["billing:payouts.write"],
+    ])
+
+    assert index.lookup(["auth:legacy"]) == [0]
+    assert index.lookup(["auth:token.rotate"]) == [0, 3]
+    assert index.lookup(["billing:*"]) == [1, 2, 4]
+    assert index.lookup(["billing:invoices.void"]) == [2]
+    assert index.lookup(["orders:*"]) == []
+
+
+def test_catalog_lookup_uses_index():
+    assert impacted_partners_for_scopes(["AUTH:LEGACY"]) == ["Northstar Bank", "Orbit HR"]
+    assert impacted_partners_for_scopes([]) == []
+    assert catalog_index_stats()["entries"] == 4
+
+
+def test_compiled_catalog_index_matches_scope_trie(tmp_path):
+    partners = [
+        {"name": "A", "scopes": ["auth:*", "billing:invoices.read"]},
+        {"name": "B", "scopes": ["billing:invoices.*", "Auth:Token.Rotate"]},
+        {"name": "C", "scopes": ["billing:payouts.write"]},
+    ]
+    compile_catalog_index(partners, tmp_path / "catalog.pcidx", b"\0" * 32, 0, 0)
+    compiled = CatalogIndex(tmp_path / "catalog.pcidx")
+    trie = ScopeIndex.build(partner["scopes"] for partner in partners)
+
+    for query in (["auth:legacy"], ["auth:token.rotate"], ["billing:*"], ["billing:invoices.void"], ["orders:*"]):
+        assert compiled.lookup(query) == trie.lookup(query)
+    assert compiled.partner_name(1) == "B"
+    assert compiled.stats()["scopes"] == trie.stats()["scopes"]
+
+
+def test_catalog_reloads_when_source_changes(tmp_path, monkeypatch):
+    source = tmp_path / "partners.json"
+    source.write_text(json.dumps({"partners": [{"name": "Old", "scopes": ["auth:legacy"]}]}))
+
+    monkeypatch.setattr(partner_catalog, "CATALOG_PATH", source)
+    monkeypatch.setattr(partner_catalog, "CATALOG_INDEX_PATH", tmp_path / "partners.pcidx")
+    monkeypatch.setattr(partner_catalog, "CATALOG_CHECK_INTERVAL_SECONDS", 0)
+    monkeypatch.setattr(partner_catalog, "_INDEX", None)
+
+    assert impacted_partners_for_scopes(["auth:legacy"]) == ["Old"]
+
+    source.write_text(json.dumps({"partners": [{"name": "New", "scopes": ["auth:*"]}]}))
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert impacted_partners_for_scopes(["auth:legacy"]) == ["New"]
+
+
+def test_default_index_dir_is_private(tmp_path, monkeypatch):
+    monkeypatch.setattr(partner_catalog.tempfile, "gettempdir", lambda: str(tmp_path))
+
+    private = partner_catalog._private_index_dir()
+    assert private == tmp_path / f"partner-catalog-{os.getuid()}"
+    assert private.stat().st_mode & 0o777 == 0o700
+
+    # Someone made the shared name writable for others: do not use it.
+    private.chmod(0o777)
+    fallback = partner_catalog._private_index_dir()
+    assert fallback != private
+    assert fallback.stat().st_mode & 0o777 == 0o700
@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import sessions
+from app.main import app
+
+
+@pytest.fixture(autouse=True)
+def no_listener(monkeypatch):
+    monkeypatch.setattr(sessions, "_LISTENER_STARTED", True)
+    monkeypatch.setattr(sessions, "_REVOKED", {})
+
+
+def test_access_token_round_trip_and_rejections(monkeypatch):
+    tokens = sessions.issue_tokens(3, "ada@example.com", [7, 9])
+
+    claims = sessions.verify_access_token(tokens["access_token"])
+    assert (claims.user_id, claims.workspace_id, claims.workspace_ids) == (3, 7, (7, 9))
+
+    with pytest.raises(sessions.InvalidToken):
+        sessions.verify_access_token(tokens["refresh_token"])
+
+    payload, signature = tokens["access_token"].split(".")
+    with pytest.raises(sessions.InvalidToken):
+        sessions.verify_access_token(f"{payload}.{signature[:-2]}AA")
+
+    # Non-ASCII in either part must not reach the HMAC or compare_digest.
+    for forged in (f"{payload}é.{signature}", f"{payload}.{signature[:-1]}é"):
+        with pytest.raises(sessions.InvalidToken):
+            sessions.verify_access_token(forged)
+
+    sessions._remember_revoked(claims.session_id, claims.expires_at + 60)
+    with pytest.raises(sessions.InvalidToken):
+        sessions.verify_access_token(tokens["access_token"])
+
+    monkeypatch.setattr(sessions, "ACCESS_TOKEN_TTL_SECONDS", -1)
+    expired = sessions.issue_tokens(3, "ada@example.com", [7])["access_token"]
+    with pytest.raises(sessions.InvalidToken):
+        sessions.verify_access_token(expired)
+
+
+def test_previous_secret_still_verifies(monkeypatch):
+    token = sessions.issue_tokens(3, "ada@example.com", [7])["access_token"]
+
+    monkeypatch.setattr(sessions, "SESSION_SECRETS", [b"rotated-secret", *sessions.SESSION_SECRETS])
+
+    assert sessions.verify_access_token(token).user_id == 3
+
+
+def test_me_and_workspace_scoping_use_the_token_only():
+    client = TestClient(app)
+    tokens = sessions.issue_tokens(3, "ada@example.com", [7])
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+
+    r = client.get("/app-auth/me", headers=headers)
+    assert r.status_code == 200
+    assert r.json()["user"]["workspace_id"] == 7
+
+    assert client.get("/app-auth/me").status_code == 401
+
+    r = client.post("/partners/impact/9", json={"raw_text": "Fixed auth:read"}, headers=headers)
+    assert r.status_code == 403
+
+
+class _RevokedSessionsCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, query, params=()):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_startup_waits_for_the_revocation_list(monkeypatch):
+    tokens = sessions.issue_tokens(3, "ada@example.com", [7])
+    revoked = sessions.decode_token(tokens["access_token"], "access")
+    started = []
+
+    def slow_listener():
+        # The listener's first load arrives after startup has begun.
+        if not started:
+            started.append(True)
+            rows = [{"session_id": revoked.session_id, "expires_at": revoked.expires_at + 60}]
+            timer = threading.Timer(0.2, sessions._load_revocations, (_RevokedSessionsCursor(rows),))
+            timer.start()
+
+    monkeypatch.setattr(sessions, "_REVOCATIONS_LOADED", threading.Event())
+    monkeypatch.setattr(sessions, "_ensure_listener", slow_listener)
+
+    with TestClient(app) as client:
+        r = client.get("/app-auth/me", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+
+    assert r.status_code == 401
+
+
+def test_startup_fails_if_the_revocation_list_cannot_be_loaded(monkeypatch):
+    monkeypatch.setattr(sessions, "_REVOCATIONS_LOADED", threading.Event())
+
+    with pytest.raises(RuntimeError):
+        sessions.start_revocation_listener(timeout=0.01)
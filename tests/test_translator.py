@@ -1,5 +1,5 @@
 from app.models import TranslateRequest
-from app.translator import translate
+from app.translator import translate, TranslationTimings
 
 
 def test_deterministic_translate_extracts_risk_and_impact():
@@ -65,3 +65,18 @@ def test_basic_mode_stays_deterministic_without_ai_draft():
 
     assert res.ai_enhancement is None
     assert any("auth:legacy" in q for q in res.follow_up_questions)
+
+
+def test_translate_records_stage_timings():
+    req = TranslateRequest(
+        raw_text="Changed OAuth token rotation policy for auth:legacy.",
+        audience=["cs"],
+        mode="ai",
+    )
+    timings = TranslationTimings()
+
+    translate(req, timings)
+
+    assert timings.translate_ms is not None and timings.translate_ms >= 0
+    assert timings.ai_ms is not None and timings.ai_ms >= 0
+    assert timings.ai_total_tokens is None
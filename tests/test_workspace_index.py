@@ -0,0 +1,37 @@
+from app import workspace_index
+from app.workspace_index import WorkspacePartnerIndex
+
+
+def _fake_loader(loads):
+    def load(workspace_id):
+        loads.append(workspace_id)
+        return WorkspacePartnerIndex.from_rows(workspace_id, [
+            {"id": 1, "partner_name": "Northstar Bank", "scopes": ["auth:*"], "area": "Auth", "status": "mapped"},
+            {"id": 2, "partner_name": "Northstar Bank", "scopes": ["auth:legacy"], "area": "Billing", "status": "mapped"},
+            {"id": 3, "partner_name": "Orbit HR", "scopes": ["employees:read"], "area": "Auth", "status": "mapped"},
+        ])
+    return load
+
+
+def test_workspace_index_is_cached_invalidated_and_bounded(monkeypatch):
+    loads: list[int] = []
+    monkeypatch.setattr(workspace_index, "_load_workspace_index", _fake_loader(loads))
+    monkeypatch.setattr(workspace_index, "_ensure_listener", lambda: None)
+    monkeypatch.setattr(workspace_index, "WORKSPACE_INDEX_CACHE_SIZE", 2)
+    workspace_index.clear_workspace_indexes()
+
+    index = workspace_index.get_workspace_index(1)
+    assert index.impacted_partner_names(["auth:legacy"]) == ["Northstar Bank"]
+    workspace_index.get_workspace_index(1)
+    assert loads == [1]
+
+    workspace_index.invalidate_workspace_index(1)
+    workspace_index.get_workspace_index(1)
+    assert loads == [1, 1]
+
+    workspace_index.get_workspace_index(2)
+    workspace_index.get_workspace_index(3)
+    assert workspace_index.workspace_index_stats()["cached_workspaces"] == 2
+
+    workspace_index.get_workspace_index(1)
+    assert loads == [1, 1, 2, 3, 1]